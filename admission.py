@@ -0,0 +1,112 @@
+"""
+Admission Control
+Bounds in-flight and queued predictions and enforces per-request deadlines
+"""
+
+import time
+import threading
+import contextlib
+
+
+class AdmissionRejected(Exception):
+    """Raised when the server is at capacity and the request is shed"""
+
+    def __init__(self, retry_after):
+        super().__init__('Server busy, please retry shortly')
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes before its prediction runs"""
+
+    def __init__(self, message='Request deadline exceeded'):
+        super().__init__(message)
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight=16, max_queued=32, retry_after=2):
+        """
+        Initialize the admission controller
+
+        Args:
+            max_in_flight (int): Requests allowed to decode/predict at once
+            max_queued (int): Requests allowed to wait for an in-flight slot;
+                anything beyond this is rejected immediately
+            retry_after (int): Seconds suggested to rejected clients
+        """
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_queued = max(0, int(max_queued))
+        self.retry_after = int(retry_after)
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+
+        # Counters
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def acquire(self, deadline=None):
+        """
+        Take an in-flight slot, waiting in the bounded queue if needed
+
+        Args:
+            deadline (float): time.monotonic() value after which to give up
+
+        Raises:
+            AdmissionRejected: The queue is full
+            DeadlineExceeded: The deadline passed while waiting
+        """
+        with self._cond:
+            if self._in_flight >= self.max_in_flight:
+                if self._waiting >= self.max_queued:
+                    self.rejected += 1
+                    raise AdmissionRejected(self.retry_after)
+
+                self._waiting += 1
+                try:
+                    while self._in_flight >= self.max_in_flight:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self.expired += 1
+                            raise DeadlineExceeded('Request deadline exceeded while queued')
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._in_flight += 1
+            self.admitted += 1
+
+    def release(self):
+        """Give back an in-flight slot"""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def admit(self, deadline=None):
+        """Hold an in-flight slot for the duration of the block"""
+        self.acquire(deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        """
+        Snapshot of admission state
+
+        Returns:
+            dict: Limits, current occupancy and counters
+        """
+        with self._cond:
+            return {
+                'max_in_flight': self.max_in_flight,
+                'max_queued': self.max_queued,
+                'in_flight': self._in_flight,
+                'queued': self._waiting,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'expired': self.expired
+            }
@@ -3,70 +3,936 @@ MyPadiCare - Flask API Server
 Free hosting compatible version
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Request, request, jsonify, g, send_file, stream_with_context
 from flask_cors import CORS
 import os
+import io
 import sys
 import json
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 import threading
+import time
+import hmac
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from cpu_tuning import apply_profile, available_cpus
 
 # Suppress TensorFlow logging BEFORE importing TensorFlow
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+# Tuned oneDNN, thread and batch settings (results/cpu_profile.json); explicit env vars still win
+cpu_profile = apply_profile()
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
 
 # Import predictor class
-from predict_paddy_disease import PaddyDiseasePredictor
+from predict_paddy_disease import PaddyDiseasePredictor, configure_tf_threads
+from batch_scheduler import MicroBatchScheduler
+from prediction_cache import PredictionCache, make_cache_key
+from admission import AdmissionController, AdmissionRejected, DeadlineExceeded
+from treatments import TreatmentIndex
+from metrics import MetricsRegistry, PROMETHEUS_CONTENT_TYPE
+from prediction_log import PredictionLog, image_digest
+from model_registry import ModelRegistry
+from static_assets import AssetStore
+from request_profiler import RequestProfiler
+from vector_index import VectorIndex
+
+class InMemoryRequest(Request):
+    """Keep multipart uploads in memory instead of spooling them to temp files"""
+    
+    @property
+    def max_content_length(self):
+        # Survey uploads carry many photos; everything else keeps the single-image limit
+        if self.path == BATCH_ENDPOINT:
+            return BATCH_UPLOAD_MAX_SIZE
+        return super().max_content_length
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.path == BATCH_ENDPOINT:
+            # Hundreds of photos would not fit comfortably in memory; spool them to disk
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        # Bounded by MAX_CONTENT_LENGTH, so this never grows past the upload limit
+        return io.BytesIO()
 
-app = Flask(__name__, static_folder='.', static_url_path='')
+# Static files are served by serve_static() from the asset directory only
+app = Flask(__name__, static_folder=None)
+app.request_class = InMemoryRequest
 CORS(app)
 
 # Configuration
-UPLOAD_DIR = 'uploads'
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+MULTIPART_OVERHEAD = 64 * 1024  # Room for multipart boundaries and form fields
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp'}
+# Output of "python static_assets.py build"; without it the frontend files are served from the repo
+ASSET_DIR = os.environ.get('ASSET_DIR') or ('dist' if os.path.isdir('dist') else '.')
 MODEL_PATH = 'results/model.hdf5'
+# Versioned models (see model_registry.py); MODEL_PATH is served until a version is activated
+MODEL_REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', 'models')
+# How often each worker checks the registry for a newly activated version (0 = never)
+MODEL_WATCH_SECONDS = float(os.environ.get('MODEL_WATCH_SECONDS', 10))
+# After a failed startup load, requests retry it no sooner than this, doubling per failure up to 5 minutes
+MODEL_RETRY_SECONDS = float(os.environ.get('MODEL_RETRY_SECONDS', 5))
+MODEL_RETRY_MAX_SECONDS = 300
+# Bearer token for /admin/model (unset disables the endpoint)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN') or None
+PREPROCESS_MODE = os.environ.get('PREPROCESS_MODE', 'fast')  # 'fast' or 'legacy'
+MODEL_BACKEND = os.environ.get('MODEL_BACKEND', 'keras')  # 'keras' or 'tflite'
+TFLITE_VARIANT = os.environ.get('TFLITE_VARIANT', 'float16')  # 'float16' or 'int8'
+# Serve the frozen graph built by compiled_model.py when one matches the model file
+COMPILED_MODEL = os.environ.get('COMPILED_MODEL', '1') == '1'
+
+# TensorFlow thread pools (gunicorn.conf.py sizes these per worker from the CPU count)
+TF_INTRA_OP_THREADS = int(os.environ.get('TF_INTRA_OP_THREADS', 0))
+TF_INTER_OP_THREADS = int(os.environ.get('TF_INTER_OP_THREADS', 0))
+# Load the model when this module is imported. The pre-fork server turns this off
+# for the Keras backend, whose TF runtime does not survive fork(), and loads per worker instead
+PRELOAD_MODEL = os.environ.get('PRELOAD_MODEL', '1') == '1'
+# Load in a background thread so the server answers liveness probes during a cold start
+BACKGROUND_LOAD = os.environ.get('BACKGROUND_LOAD', '1') == '1'
+
+# Micro-batching: concurrent requests are stacked into one model call
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 8))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 5))
 
-# Global model predictor (loaded once at startup)
-predictor = None
+# Admission control: at most MAX_IN_FLIGHT images are decoded/predicted at once and
+# MAX_QUEUED more may wait; the rest get a fast 503 with Retry-After. gunicorn.conf.py
+# derives both from the worker's thread count, since no more requests than that reach the app
+MAX_IN_FLIGHT = int(os.environ.get('MAX_IN_FLIGHT', 16))
+MAX_QUEUED = int(os.environ.get('MAX_QUEUED', 32))
+RETRY_AFTER_SECONDS = int(os.environ.get('RETRY_AFTER_SECONDS', 2))
+# Per-request deadline; clients may ask for less with an X-Request-Timeout header (seconds)
+PREDICTION_TIMEOUT = float(os.environ.get('PREDICTION_TIMEOUT', 30))
+
+# Prediction cache keyed by image content hash (CACHE_MAX_ENTRIES=0 disables it)
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', 3600))
+CACHE_DIR = os.environ.get('CACHE_DIR') or None  # Optional disk tier that survives restarts
+CACHE_DISK_MAX_ENTRIES = int(os.environ.get('CACHE_DISK_MAX_ENTRIES', 100000))  # 0 = no limit
+TOP_K = 5
+# Multi-image survey uploads (many files or a zip archive in one request)
+BATCH_ENDPOINT = '/api/predict_batch'
+BATCH_UPLOAD_MAX_IMAGES = int(os.environ.get('BATCH_UPLOAD_MAX_IMAGES', 200))
+BATCH_UPLOAD_MAX_SIZE = int(os.environ.get('BATCH_UPLOAD_MAX_MB', 512)) * 1024 * 1024
+BATCH_CHUNK_SIZE = int(os.environ.get('BATCH_CHUNK_SIZE', 16))  # Images per model call
+BATCH_DECODE_WORKERS = int(os.environ.get('BATCH_DECODE_WORKERS', min(4, os.cpu_count() or 1)))
+# Predictions below this confidence are counted as low-confidence
+LOW_CONFIDENCE_THRESHOLD = float(os.environ.get('LOW_CONFIDENCE_THRESHOLD', 0.5))
+# Directory shared by all workers so /metrics reports the whole server (gunicorn.conf.py sets it)
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+# Audit log of served predictions in SQLite (unset disables it); writes happen off the request path
+PREDICTION_LOG_DB = os.environ.get('PREDICTION_LOG_DB') or None
+PREDICTION_LOG_QUEUE = int(os.environ.get('PREDICTION_LOG_QUEUE', 10000))
+# Opt-in request profiling: admins send "X-Profile: 1" ("tf" adds a TensorFlow trace) or ?profile=1,
+# and PROFILE_SAMPLE_RATE captures a fraction of all predictions. Captures are listed at /admin/profiles
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')  # Empty disables profiling
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_MAX_COUNT = int(os.environ.get('PROFILE_MAX_COUNT', 50))
+PROFILE_MAX_MB = int(os.environ.get('PROFILE_MAX_MB', 200))
+PROFILED_ENDPOINTS = ('predict_api', 'predict_batch_api')
+# Similar-case search over embeddings added by "predict_paddy_disease.py --batch --jsonl --index"
+# (see vector_index.py); an index built after startup is picked up without a restart (empty disables
+# search). Servers only read the index
+VECTOR_INDEX_DIR = os.environ.get('VECTOR_INDEX_DIR', 'vector_index')
+SIMILAR_MAX_K = 50
+# Matches at or above this cosine similarity are reported as near-duplicates of the upload
+NEAR_DUPLICATE_SIMILARITY = float(os.environ.get('NEAR_DUPLICATE_SIMILARITY', 0.98))
+
+# Reject oversized bodies from Content-Length before reading them
+app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE + MULTIPART_OVERHEAD
+
+class ServedModel:
+    """A loaded predictor and its micro-batch queue, swapped in as one unit"""
+    
+    def __init__(self, predictor, registry_version=None):
+        self.predictor = predictor
+        self.registry_version = registry_version
+        self.scheduler = MicroBatchScheduler(lambda image_batch: run_model_batch(predictor, image_batch),
+                                             max_batch_size=BATCH_MAX_SIZE,
+                                             max_wait_ms=BATCH_MAX_WAIT_MS,
+                                             on_batch=record_batch)
+        # Requests pinned to this model; once it is replaced, the last one out closes the scheduler
+        self._users = 0
+        self._retired = False
+        self._users_lock = threading.Lock()
+    
+    def acquire(self):
+        """Pin for one request; False if the model was already retired and drained"""
+        with self._users_lock:
+            if self._retired and self._users == 0:
+                return False
+            self._users += 1
+            return True
+    
+    def release(self):
+        with self._users_lock:
+            self._users -= 1
+            drained = self._retired and self._users == 0
+        if drained:
+            self.scheduler.close()
+    
+    def retire(self):
+        """Called after a swap: close the scheduler now, or when the last pinned request finishes"""
+        with self._users_lock:
+            self._retired = True
+            drained = self._users == 0
+        if drained:
+            self.scheduler.close()
+
+# The model being served. Each request pins the current one in g.served, so a
+# hot swap only affects requests that start after it
+served = None
 model_lock = threading.Lock()
+model_load_lock = threading.Lock()  # One load or swap at a time
+
+# Model loading state, reported by the readiness probe and health check
+model_ready = threading.Event()
+model_state = {
+    'status': 'not_loaded',  # not_loaded -> loading -> ready | failed
+    'error': None,
+    'model_size': 0,
+    'load_seconds': None,
+    'loaded_at': None,
+    'version': None,
+    'compiled': False,
+    'registry_version': None,
+    'loading_version': None,
+    'failed_version': None,  # Not retried by the watcher until the registry points elsewhere
+    'failures': 0,  # Consecutive failed loads, for the retry backoff
+    'retry_at': 0.0  # time.monotonic() before which a failed startup load is not retried
+}
+model_state_lock = threading.Lock()
+
+# Hot-path instrumentation, served on /metrics
+metrics = MetricsRegistry(multiprocess_dir=METRICS_DIR)
+REQUESTS = metrics.counter('requests_total', 'HTTP requests by endpoint and status', ('endpoint', 'status'))
+REQUEST_SECONDS = metrics.histogram('request_seconds', 'HTTP request latency by endpoint', ('endpoint',))
+STAGE_SECONDS = metrics.histogram('stage_seconds', 'Prediction latency by pipeline stage', ('stage',))
+ERRORS = metrics.counter('errors_total', 'Failed predictions by stage', ('stage',))
+PREDICTIONS = metrics.counter('predictions_total', 'Predictions by top class', ('disease',))
+LOW_CONFIDENCE = metrics.counter('low_confidence_total', 'Predictions below LOW_CONFIDENCE_THRESHOLD')
+BATCH_SIZE = metrics.histogram('batch_size', 'Images per model call', buckets=(1, 2, 4, 8, 16, 32, 64))
+UPLOAD_BYTES = metrics.histogram('upload_bytes', 'Single-image upload size by whether the client shrank it',
+                                 ('client_resized',), buckets=(16384, 65536, 262144, 1048576, 4194304, 16777216))
+
+def run_model_batch(model_predictor, image_batch):
+    """Run one stacked batch through a loaded model"""
+    wait_start = time.perf_counter()
+    with model_lock:
+        STAGE_SECONDS.observe(time.perf_counter() - wait_start, stage='lock_wait')
+        return model_predictor.predict_probabilities(image_batch)
+
+def record_batch(batch_size, queue_waits, inference_seconds):
+    """Micro-batch hook: queue wait per request and inference time per batch"""
+    BATCH_SIZE.observe(batch_size)
+    STAGE_SECONDS.observe(inference_seconds, stage='inference')
+    for wait in queue_waits:
+        STAGE_SECONDS.observe(wait, stage='queue_wait')
+
+admission = AdmissionController(max_in_flight=MAX_IN_FLIGHT,
+                                max_queued=MAX_QUEUED,
+                                retry_after=RETRY_AFTER_SECONDS)
+
+# Only files in the asset manifest (or matching its patterns) are reachable
+asset_store = AssetStore(ASSET_DIR)
+asset_store.load()
 
-# Ensure upload directory exists
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Treatment files are read once and indexed by (language, disease)
+treatment_index = TreatmentIndex()
+treatment_index.load()
 
-def load_model():
-    """Load the model once at startup"""
-    global predictor
+prediction_cache = None
+if CACHE_MAX_ENTRIES > 0:
+    prediction_cache = PredictionCache(max_entries=CACHE_MAX_ENTRIES,
+                                       ttl_seconds=CACHE_TTL_SECONDS,
+                                       disk_dir=CACHE_DIR,
+                                       max_disk_entries=CACHE_DISK_MAX_ENTRIES)
+
+model_registry = None
+if MODEL_REGISTRY_DIR and os.path.isdir(MODEL_REGISTRY_DIR):
+    model_registry = ModelRegistry(MODEL_REGISTRY_DIR)
+model_watcher_pid = None
+
+prediction_log = None
+if PREDICTION_LOG_DB:
+    prediction_log = PredictionLog(PREDICTION_LOG_DB, max_queue=PREDICTION_LOG_QUEUE)
+
+request_profiler = None
+if PROFILE_DIR:
+    request_profiler = RequestProfiler(PROFILE_DIR, sample_rate=PROFILE_SAMPLE_RATE,
+                                       max_profiles=PROFILE_MAX_COUNT, max_bytes=PROFILE_MAX_MB * 1024 * 1024)
+
+vector_index = VectorIndex(VECTOR_INDEX_DIR) if VECTOR_INDEX_DIR else None
+
+# Decode threads for batch uploads (threads start on first use, so after any fork)
+batch_decode_pool = ThreadPoolExecutor(max_workers=max(1, BATCH_DECODE_WORKERS),
+                                       thread_name_prefix='batch-decode')
+
+metrics.gauge('queue_depth', 'Requests waiting for the micro-batch worker',
+              lambda: served.scheduler.queue_depth() if served else 0)
+metrics.gauge('in_flight', 'Predictions holding an admission slot', lambda: admission.stats()['in_flight'])
+metrics.gauge('admission_queued', 'Predictions waiting for an admission slot', lambda: admission.stats()['queued'])
+metrics.gauge('admission_rejected', 'Predictions shed with 503 since start', lambda: admission.stats()['rejected'])
+metrics.gauge('cache_hits', 'Prediction cache hits since start',
+              lambda: prediction_cache.hits + prediction_cache.disk_hits if prediction_cache else 0)
+metrics.gauge('cache_misses', 'Prediction cache misses since start',
+              lambda: prediction_cache.misses if prediction_cache else 0)
+metrics.gauge('prediction_log_queued', 'Prediction log records waiting to be written',
+              lambda: prediction_log.stats()['queued'] if prediction_log else 0)
+metrics.gauge('prediction_log_dropped', 'Prediction log records dropped because the queue was full',
+              lambda: prediction_log.dropped if prediction_log else 0)
+
+def resolve_model_source(version=None):
+    """
+    Pick what to load
+    
+    Returns:
+        tuple: (registry version or None, model path)
+    """
+    if model_registry is not None:
+        version = version or model_registry.active_version()
+        if version:
+            return version, model_registry.model_path(version)
+    return None, MODEL_PATH
+
+def load_model(version=None):
+    """
+    Load a model, warm it up and swap it in (blocking)
+    
+    Loads the given registry version, else the registry's active version,
+    else MODEL_PATH. Requests keep being served by the current model until
+    the new one is warm; requests already in progress finish on the old one.
+    """
+    if not model_load_lock.acquire(blocking=False):
+        return False
     try:
-        print("🔄 Loading AI model...")
-        predictor = PaddyDiseasePredictor(MODEL_PATH)
-        if predictor.load_model():
-            print("✅ Model loaded successfully!")
-            return True
-        else:
+        return load_and_swap(version)
+    finally:
+        model_load_lock.release()
+
+def load_and_swap(version):
+    global served
+    first_load = served is None
+    start = time.perf_counter()
+    registry_version = version
+    try:
+        registry_version, model_path = resolve_model_source(version)
+        with model_state_lock:
+            if first_load:
+                model_state['status'] = 'loading'
+            model_state['loading_version'] = registry_version or model_path
+            model_state['error'] = None
+        
+        print(f"🔄 Loading AI model{f' {registry_version}' if registry_version else ''}...")
+        # The embedding output is only available from a Keras HDF5 model
+        embeddings = vector_index is not None and MODEL_BACKEND == 'keras' and os.path.isfile(model_path)
+        # Model calls are serialized by model_lock, so TFLite gets one interpreter using all
+        # of this worker's cores rather than a pool of single-threaded ones taking turns
+        new_predictor = PaddyDiseasePredictor(model_path, preprocess_mode=PREPROCESS_MODE,
+                                              backend=MODEL_BACKEND, tflite_variant=TFLITE_VARIANT,
+                                              pool_size=1, num_threads=TF_INTRA_OP_THREADS or available_cpus(),
+                                              version_label=registry_version,
+                                              use_compiled=COMPILED_MODEL, embeddings=embeddings)
+        if not new_predictor.load_model():
             print("❌ Failed to load model")
-            return False
+            return mark_model_failed('Failed to load model', registry_version)
+        
+        # Trace the graph now so the first real user does not pay for it
+        print("🔥 Warming up model...")
+        new_predictor.warmup(batch_sizes=sorted({1, BATCH_MAX_SIZE}))
+        
+        # A single reference swap: requests that already pinned the old model finish on it
+        previous = served
+        served = ServedModel(new_predictor, registry_version)
+        if previous is not None:
+            previous.retire()
+        with model_state_lock:
+            model_state['status'] = 'ready'
+            model_state['model_size'] = os.path.getsize(model_path) if os.path.isfile(model_path) else 0
+            model_state['load_seconds'] = round(time.perf_counter() - start, 2)
+            model_state['loaded_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+            model_state['version'] = new_predictor.model_version
+            model_state['compiled'] = new_predictor.compiled
+            model_state['registry_version'] = registry_version
+            model_state['loading_version'] = None
+            model_state['failed_version'] = None
+            model_state['failures'] = 0
+        model_ready.set()
+        print(f"✅ Model {new_predictor.model_version} loaded successfully! ({model_state['load_seconds']}s)")
+        return True
     except Exception as e:
         print(f"❌ Error loading model: {e}")
-        return False
+        return mark_model_failed(str(e), registry_version)
+
+def mark_model_failed(error, version=None):
+    with model_state_lock:
+        if served is None:
+            model_state['status'] = 'failed'
+        # After a failed swap the previous model keeps serving
+        model_state['error'] = error
+        model_state['loading_version'] = None
+        model_state['failed_version'] = version
+        model_state['failures'] += 1
+        backoff = min(MODEL_RETRY_SECONDS * 2 ** (model_state['failures'] - 1), MODEL_RETRY_MAX_SECONDS)
+        model_state['retry_at'] = time.monotonic() + backoff
+    return False
+
+def start_background_load(version=None):
+    """
+    Load in a daemon thread: the startup model unless it is already loading,
+    loaded or backing off after a failure, or a specific registry version to swap in
+    """
+    with model_state_lock:
+        if version is None and (model_state['status'] in ('loading', 'ready') or
+                                model_state['loading_version'] is not None or
+                                time.monotonic() < model_state['retry_at']):
+            return
+    threading.Thread(target=load_model, args=(version,), name='model-loader', daemon=True).start()
+
+def ensure_model_watcher():
+    """Start the registry watcher lazily (and again after a fork)"""
+    global model_watcher_pid
+    if model_registry is None or MODEL_WATCH_SECONDS <= 0 or model_watcher_pid == os.getpid():
+        return
+    with model_state_lock:
+        if model_watcher_pid == os.getpid():
+            return
+        model_watcher_pid = os.getpid()
+    threading.Thread(target=watch_model_registry, name='model-watcher', daemon=True).start()
+
+def watch_model_registry():
+    """Swap in the registry's active version whenever it changes (each worker follows on its own)"""
+    while True:
+        time.sleep(MODEL_WATCH_SECONDS)
+        try:
+            active = model_registry.active_version()
+        except Exception as e:
+            print(f"Error reading model registry: {e}")
+            continue
+        current = served
+        if (not active or current is None or active == current.registry_version or
+                active == model_state['failed_version'] or model_state['loading_version'] is not None):
+            continue
+        print(f"🔁 Model registry switched to {active}")
+        load_model(active)
+
+configure_tf_threads(TF_INTRA_OP_THREADS, TF_INTER_OP_THREADS)
 
 # Load model at startup
-load_model()
+if PRELOAD_MODEL:
+    if BACKGROUND_LOAD:
+        start_background_load()
+    else:
+        load_model()
+
+def model_registry_status():
+    """Registry summary for the health check"""
+    if model_registry is None:
+        return {'enabled': False}
+    with model_state_lock:
+        state = {key: model_state[key] for key in ('registry_version', 'loading_version', 'failed_version')}
+    return {
+        'enabled': True,
+        'active': model_registry.active_version(),
+        'serving': state['registry_version'],
+        'loading': state['loading_version'],
+        'failed': state['failed_version'],
+        'error': model_state['error'] if state['failed_version'] else None
+    }
+
+def warming_up_response():
+    """503 while the model is still loading (or after a failed load, which is retried with backoff)"""
+    if model_state['status'] in ('not_loaded', 'failed'):
+        start_background_load()
+    response = jsonify({
+        'success': False,
+        'status': 'warming_up',
+        'error': 'AI model is warming up. Please try again in a few seconds.'
+    })
+    response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response, 503
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def file_too_large_response():
+    return jsonify({
+        'success': False,
+        'error': f'File too large. Maximum size: {MAX_FILE_SIZE / 1024 / 1024}MB'
+    }), 413
+
+def request_deadline():
+    """Monotonic deadline for this request (client header capped by the server limit)"""
+    timeout = PREDICTION_TIMEOUT
+    try:
+        requested = float(request.headers.get('X-Request-Timeout', timeout))
+        if requested > 0:
+            timeout = min(timeout, requested)
+    except ValueError:
+        pass
+    return time.monotonic() + timeout
+
+def client_presized():
+    """The client says it already oriented and shrank the upload to the model input size"""
+    input_size = g.served.predictor.input_size
+    expected = f'{input_size}x{input_size}'
+    return (request.headers.get('X-Client-Resized') == expected or
+            request.form.get('client_resized') == expected)
+
+def record_prediction(results, image_hash=None, source='single'):
+    """Count a served prediction by class, flag low-confidence ones and queue it for the audit log"""
+    PREDICTIONS.inc(disease=results['top_prediction'])
+    if results['confidence'] < LOW_CONFIDENCE_THRESHOLD:
+        LOW_CONFIDENCE.inc()
+    if prediction_log is not None:
+        # Optional, client-supplied; stored rounded to roughly 11 km
+        prediction_log.record(results,
+                              image_hash=image_hash,
+                              model_version=g.served.predictor.model_version,
+                              latency_ms=(time.perf_counter() - g.request_start) * 1000,
+                              region=request.form.get('region'),
+                              lat=request.form.get('lat'),
+                              lon=request.form.get('lon'),
+                              source=source)
+
+def prediction_payload(results, image_name):
+    """Per-image response fields (compatible with existing frontend)"""
+    return {
+        'success': True,
+        'health_status': results['health_status'],
+        'top_prediction': results['top_prediction'],
+        'confidence': results['confidence'],
+        'predictions': results['predictions'],
+        'image_name': image_name,
+        'model_version': g.served.predictor.model_version
+    }
+
+def collect_batch_uploads():
+    """
+    Gather the images of a batch upload: repeated 'images' file fields
+    and/or zip archives of images
+    
+    The upload streams are detached from the request, because Flask closes
+    request files when the view returns and a streamed response is read
+    after that. The caller closes them with close_streams().
+    
+    Returns:
+        tuple: (list of (image name, zero-argument reader returning the image
+            bytes), list of streams to close)
+        
+    Raises:
+        ValueError: A zip archive is unreadable
+    """
+    uploads = []
+    streams = []
+    for file in request.files.getlist('images') + request.files.getlist('image'):
+        if not file.filename:
+            continue
+        stream, file.stream = file.stream, io.BytesIO()
+        streams.append(stream)
+        if file.filename.lower().endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(stream)
+            except zipfile.BadZipFile:
+                close_streams(streams)
+                raise ValueError(f'Not a valid zip archive: {file.filename}')
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or name.startswith('__MACOSX/') or not allowed_file(name):
+                    continue
+                uploads.append((name, lambda archive=archive, info=info: read_zip_entry(archive, info)))
+        else:
+            uploads.append((secure_filename(file.filename) or 'upload',
+                            lambda stream=stream: stream.read(MAX_FILE_SIZE + 1)))
+    return uploads, streams
+
+def close_streams(streams):
+    for stream in streams:
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+def read_zip_entry(archive, info):
+    # The declared size is checked first so a zip bomb is never inflated
+    if info.file_size > MAX_FILE_SIZE:
+        raise ValueError(f'File too large. Maximum size: {MAX_FILE_SIZE / 1024 / 1024}MB')
+    with archive.open(info) as entry:
+        return entry.read(MAX_FILE_SIZE + 1)
+
+def iter_batch_predictions(uploads, summary, presized=False):
+    """
+    Predict a batch upload chunk by chunk
+    
+    Each chunk of BATCH_CHUNK_SIZE images is read, looked up in the cache and
+    decoded in parallel into this thread's reusable uint8 batch array, then
+    run through the model in a single call while holding one admission slot.
+    
+    Args:
+        uploads (list): Output of collect_batch_uploads()
+        summary (dict): Running summary updated in place
+        presized (bool): The client shrank every image to the input size
+        
+    Yields:
+        dict: One result per image, in upload order
+    """
+    predictor = g.served.predictor
+    chunk_size = max(1, BATCH_CHUNK_SIZE)
+    buffer = predictor.batch_buffer(chunk_size)
+    # A profiled request decodes on its own thread and skips the cache, so the capture sees everything
+    profiling = g.get('profile_session') is not None
+    decode_map = map if profiling else batch_decode_pool.map
+    
+    for start in range(0, len(uploads), chunk_size):
+        chunk = uploads[start:start + chunk_size]
+        digests = [None] * len(chunk)
+        
+        def prepare(row):
+            name, read = chunk[row]
+            try:
+                image_bytes = read()
+            except ValueError as e:
+                return 'error', str(e)
+            except Exception as e:
+                return 'error', f'Could not read image: {e}'
+            if len(image_bytes) > MAX_FILE_SIZE:
+                return 'error', f'File too large. Maximum size: {MAX_FILE_SIZE / 1024 / 1024}MB'
+            if prediction_log is not None:
+                digests[row] = image_digest(image_bytes)
+            
+            cache_key = None
+            if prediction_cache is not None and not profiling:
+                cache_key = make_cache_key(image_bytes, predictor.model_version, TOP_K)
+                cached = prediction_cache.get(cache_key)
+                if cached is not None:
+                    return 'cached', cached
+            
+            with STAGE_SECONDS.time(stage='decode'):
+                decoded = predictor.preprocess_image(image_bytes, out=buffer[row], presized=presized)
+            if decoded is None:
+                return 'error', 'Could not decode image'
+            return 'decoded', cache_key
+        
+        try:
+            admission_start = time.perf_counter()
+            with admission.admit(request_deadline()):
+                STAGE_SECONDS.observe(time.perf_counter() - admission_start, stage='admission_wait')
+                outcomes = list(decode_map(prepare, range(len(chunk))))
+                
+                rows = [row for row, (status, _) in enumerate(outcomes) if status == 'decoded']
+                probabilities = {}
+                if rows:
+                    batch = buffer[:len(chunk)] if len(rows) == len(chunk) else buffer[rows]
+                    inference_start = time.perf_counter()
+                    batch_probs = run_model_batch(predictor, batch)
+                    STAGE_SECONDS.observe(time.perf_counter() - inference_start, stage='inference')
+                    BATCH_SIZE.observe(len(rows))
+                    probabilities = dict(zip(rows, batch_probs))
+        except AdmissionRejected:
+            ERRORS.inc(stage='overload')
+            outcomes = [('retry', 'Server is busy. Please try again shortly.')] * len(chunk)
+            probabilities = {}
+        except DeadlineExceeded:
+            ERRORS.inc(stage='deadline')
+            outcomes = [('retry', 'Prediction timed out. Please try again.')] * len(chunk)
+            probabilities = {}
+        except Exception as e:
+            ERRORS.inc(stage='inference')
+            print(f"❌ Batch prediction failed: {e}")
+            outcomes = [('error', f'Prediction failed: {str(e)}')] * len(chunk)
+            probabilities = {}
+        
+        chunk_results = []
+        for row, (status, value) in enumerate(outcomes):
+            index = start + row
+            name = chunk[row][0]
+            if status in ('error', 'retry'):
+                ERRORS.inc(stage='batch_item')
+                summary['failed'] += 1
+                failure = {'index': index, 'success': False, 'image_name': name, 'error': value}
+                if status == 'retry':
+                    failure['retryable'] = True  # Shed or timed out; sending it again later may work
+                yield failure
+                continue
+            
+            if status == 'cached':
+                results = value
+            else:
+                results = predictor.format_results(probabilities[row], name, top_k=TOP_K)
+                if value is not None:
+                    prediction_cache.put(value, results)
+            
+            record_prediction(results, digests[row], source='batch')
+            chunk_results.append(results)
+            yield {'index': index, **prediction_payload(results, name)}
+        
+        predictor.summarize_results(chunk_results, summary)
+
+def finish_batch_summary(summary, lang):
+    """Attach one treatment entry per detected disease (the per-image results stay lean)"""
+    predictor = g.served.predictor
+    summary['model_version'] = predictor.model_version
+    if lang:
+        treatments = {}
+        for disease in summary['disease_counts']:
+            if predictor.health_status.get(disease) == 'diseased':
+                entry = treatment_index.get_entry(lang, disease)
+                if entry is not None:
+                    treatments[disease] = entry['data']
+        summary['treatments'] = treatments
+    return summary
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.served = pin_served_model()  # Pin the model for the whole request, even across a hot swap
+    g.profile_session = None
+    ensure_model_watcher()
+    metrics.ensure_writer()
+    if request_profiler is not None and request.method == 'POST' and request.endpoint in PROFILED_ENDPOINTS:
+        start_request_profile()
+
+def pin_served_model():
+    """Current model, pinned until the request's teardown releases it"""
+    while True:
+        current = served
+        # Losing a race with a swap that drained the old model just means taking the new one
+        if current is None or current.acquire():
+            return current
+
+def start_request_profile():
+    """Capture this request if an admin asked for it (X-Profile header or ?profile=) or it is sampled"""
+    requested = (request.headers.get('X-Profile') or request.args.get('profile') or '').lower()
+    if requested not in ('', '0', 'false') and admin_denied() is None:
+        trigger = 'header' if request.headers.get('X-Profile') else 'query'
+    elif request_profiler.sampled():
+        trigger, requested = 'sampled', ''
+    else:
+        return
+    try:
+        g.profile_session = request_profiler.start(
+            request.path, trigger, tf_trace=requested in ('tf', 'all'),
+            endpoint=request.endpoint, content_length=request.content_length,
+            model_version=g.served.predictor.model_version if g.served else None)
+    except Exception as e:
+        print(f"Could not start profiling: {e}")
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unmatched'
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    if g.get('profile_session') is not None:
+        response.headers['X-Profile-Id'] = g.profile_session.id
+        g.profile_status = response.status_code
+    return response
+
+@app.teardown_request
+def release_served_model(error=None):
+    """Unpin the model (for streamed responses, after the last line is sent)"""
+    pinned = g.pop('served', None)
+    if pinned is not None:
+        pinned.release()
+
+@app.teardown_request
+def finish_request_profile(error=None):
+    """Save the capture (for streamed responses, after the last line is sent)"""
+    session = g.pop('profile_session', None)
+    if session is None:
+        return
+    try:
+        session.stop(status=g.get('profile_status'), error=str(error) if error else None)
+    except Exception as e:
+        print(f"Could not save profile: {e}")
+
+@app.errorhandler(RequestEntityTooLarge)
+def handle_request_too_large(e):
+    """Oversized uploads are rejected before the body is read"""
+    ERRORS.inc(stage='too_large')
+    return file_too_large_response()
+
 @app.route('/')
 def index():
     """Serve the main HTML file"""
-    return send_from_directory('.', 'index.html')
+    return serve_static('index.html')
 
 @app.route('/<path:path>')
 def serve_static(path):
-    """Serve static files"""
-    return send_from_directory('.', path)
+    """Serve frontend assets (pre-compressed and fingerprinted when built)"""
+    response = asset_store.response(path, request)
+    if response is None:
+        return jsonify({'error': 'Not found'}), 404
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of request, stage and queue metrics"""
+    metrics_text = metrics.render()
+    return app.response_class(metrics_text, mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/healthz')
+def liveness():
+    """Liveness probe: the process is up and serving HTTP"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/readyz')
+def readiness():
+    """Readiness probe: the model is loaded and warmed up"""
+    with model_state_lock:
+        state = dict(model_state)
+    return jsonify(state), (200 if model_ready.is_set() else 503)
+
+@app.route('/api/treatments/<lang>/<disease>')
+def treatment_entry(lang, disease):
+    """Single treatment entry with ETag/304 support"""
+    entry = treatment_index.get_entry(lang, disease)
+    if entry is None:
+        return jsonify({'error': f'Treatment not found for disease: {disease}'}), 404
+    
+    response = app.response_class(entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    response.headers['Content-Language'] = entry['language']
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response.make_conditional(request)
+
+@app.route('/batch_stats')
+def batch_stats():
+    """Micro-batching queue depth and batch-size statistics (of the current model)"""
+    return jsonify(served.scheduler.stats() if served else {})
+
+@app.route('/api/prediction_log/<view>')
+def prediction_log_report(view):
+    """
+    Aggregates from the prediction log
+    
+    Views: 'daily' (predictions per disease per day), 'confidence' (top-1
+    confidence histogram) and 'stats' (totals). Query parameters: days,
+    region, disease and, for 'confidence', bins.
+    """
+    if prediction_log is None:
+        return jsonify({'error': 'Prediction log is disabled (set PREDICTION_LOG_DB)'}), 404
+    
+    try:
+        days = int(request.args['days']) if 'days' in request.args else None
+        bins = int(request.args.get('bins', 10))
+    except ValueError:
+        return jsonify({'error': 'days and bins must be integers'}), 400
+    region = request.args.get('region')
+    disease = request.args.get('disease')
+    
+    if view == 'daily':
+        return jsonify({'days': days or 30, 'rows': prediction_log.daily_counts(days or 30, region, disease)})
+    if view == 'confidence':
+        return jsonify(prediction_log.confidence_distribution(days, region, disease, min(bins, 100)))
+    if view == 'stats':
+        return jsonify(prediction_log.totals(days, region))
+    return jsonify({'error': f'Unknown view: {view}. Use daily, confidence or stats'}), 404
+
+def admin_denied():
+    """Error response unless the request carries the admin token (None when it does)"""
+    if ADMIN_TOKEN is None:
+        return jsonify({'error': 'Not found'}), 404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {ADMIN_TOKEN}'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return None
+
+@app.route('/admin/profiles')
+def list_profiles():
+    """Saved request profiles, newest first (Authorization: Bearer $ADMIN_TOKEN)"""
+    denied = admin_denied()
+    if denied is not None:
+        return denied
+    if request_profiler is None:
+        return jsonify({'error': 'Profiling is disabled (PROFILE_DIR is empty)'}), 404
+    return jsonify({**request_profiler.stats(), 'items': request_profiler.list()})
+
+@app.route('/admin/profiles/<profile_id>')
+def get_profile(profile_id):
+    """
+    One capture: metadata, stage split and hottest functions as JSON,
+    ?format=text for a pstats report or ?format=prof for the raw file
+    """
+    denied = admin_denied()
+    if denied is not None:
+        return denied
+    meta = request_profiler.get(profile_id) if request_profiler is not None else None
+    if meta is None:
+        return jsonify({'error': f'Unknown profile: {profile_id}'}), 404
+    
+    output = request.args.get('format', 'json')
+    # The files may be pruned by a newer capture at any point
+    missing = (jsonify({'error': f'Profile data no longer available: {profile_id}'}), 404)
+    if output == 'prof':
+        path = request_profiler.profile_path(profile_id)
+        if path is None:
+            return missing
+        try:
+            return send_file(path, mimetype='application/octet-stream',
+                             as_attachment=True, download_name=f'{profile_id}.prof')
+        except OSError:
+            return missing
+    if output == 'text':
+        try:
+            report = request_profiler.report(profile_id, request.args.get('sort', 'cumulative'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if report is None:
+            return missing
+        return app.response_class(report, mimetype='text/plain')
+    return jsonify(meta)
+
+@app.route('/admin/model', methods=['GET', 'POST'])
+def model_admin():
+    """
+    Model registry admin (Authorization: Bearer $ADMIN_TOKEN)
+    
+    GET lists the versions. POST {"action": "activate", "version": ...},
+    {"action": "rollback"} or {"action": "reload"} moves the registry
+    pointer and starts loading in the background; the response comes back
+    right away (202) and other workers follow within MODEL_WATCH_SECONDS.
+    """
+    denied = admin_denied()
+    if denied is not None:
+        return denied
+    if model_registry is None:
+        return jsonify({'error': f'No model registry (create {MODEL_REGISTRY_DIR}/ with model_registry.py)'}), 404
+    
+    if request.method == 'GET':
+        return jsonify({
+            **model_registry_status(),
+            'history': model_registry.history(),
+            'versions': model_registry.versions()
+        })
+    
+    params = request.get_json(silent=True) or request.form
+    action = params.get('action')
+    previous = model_registry.active_version()
+    try:
+        if action == 'activate':
+            version = params.get('version') or ''
+            model_registry.activate(version)
+        elif action == 'rollback':
+            version = model_registry.rollback()
+        elif action == 'reload':
+            version = previous
+            if not version:
+                return jsonify({'error': 'No active version to reload'}), 409
+        else:
+            return jsonify({'error': 'action must be activate, rollback or reload'}), 400
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 409
+    
+    # An explicit request retries a version that failed before
+    with model_state_lock:
+        model_state['failed_version'] = None
+    start_background_load(version)
+    return jsonify({'status': 'loading', 'version': version, 'previous': previous}), 202
 
 @app.route('/predict_api.php', methods=['GET', 'POST', 'OPTIONS'])
 def predict_api():
@@ -78,15 +944,30 @@ def predict_api():
     
     # Handle health check
     if request.method == 'GET' and request.args.get('action') == 'health':
-        model_exists = os.path.exists(MODEL_PATH)
-        treatments_exist = os.path.exists('data/treatments.json')
-        
         return jsonify({
             'status': 'healthy',
-            'model_loaded': predictor is not None and model_exists,
+            'model_loaded': model_ready.is_set(),
+            'model_status': model_state['status'],
+            'model_version': model_state['version'],
+            'model_registry': model_registry_status(),
             'model_path': MODEL_PATH,
-            'model_size': os.path.getsize(MODEL_PATH) if model_exists else 0,
-            'treatments_loaded': treatments_exist,
+            'model_size': model_state['model_size'],
+            'model_backend': MODEL_BACKEND if MODEL_BACKEND == 'keras' else f'tflite-{TFLITE_VARIANT}',
+            'model_compiled': model_state['compiled'],
+            'cpu': {
+                'tuned_profile': cpu_profile is not None,
+                'onednn': os.environ.get('TF_ENABLE_ONEDNN_OPTS') == '1',
+                'intra_op_threads': TF_INTRA_OP_THREADS,
+                'inter_op_threads': TF_INTER_OP_THREADS,
+                'cores': available_cpus()
+            },
+            'treatments_loaded': treatment_index.loaded,
+            'batching': served.scheduler.stats() if served else {},
+            'admission': admission.stats(),
+            'cache': prediction_cache.stats() if prediction_cache else {'enabled': False},
+            'prediction_log': prediction_log.stats() if prediction_log else {'enabled': False},
+            'profiling': request_profiler.stats() if request_profiler else {'enabled': False},
+            'vector_index': vector_index.stats() if vector_index else {'enabled': False},
             'timestamp': __import__('datetime').datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         })
     
@@ -94,89 +975,297 @@ def predict_api():
     if request.method != 'POST':
         return jsonify({'success': False, 'error': 'Method not allowed'}), 405
     
+    deadline = request_deadline()
+    
     # Check if file is present
     if 'image' not in request.files:
+        ERRORS.inc(stage='bad_request')
         return jsonify({'success': False, 'error': 'No image file provided'}), 400
     
     file = request.files['image']
     
     if file.filename == '':
+        ERRORS.inc(stage='bad_request')
         return jsonify({'success': False, 'error': 'No file selected'}), 400
     
     if not allowed_file(file.filename):
+        ERRORS.inc(stage='bad_request')
         return jsonify({
             'success': False,
             'error': f'Invalid file type. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'
         }), 400
     
     try:
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_DIR, filename)
-        file.save(filepath)
-        
-        # Check file size
-        file_size = os.path.getsize(filepath)
-        if file_size > MAX_FILE_SIZE:
-            os.remove(filepath)
-            return jsonify({
-                'success': False,
-                'error': f'File too large. Maximum size: {MAX_FILE_SIZE / 1024 / 1024}MB'
-            }), 400
+        # Read the upload straight into memory (never more than the limit + 1 byte)
+        image_name = secure_filename(file.filename) or 'upload'
+        with STAGE_SECONDS.time(stage='read'):
+            image_bytes = file.stream.read(MAX_FILE_SIZE + 1)
+        if len(image_bytes) > MAX_FILE_SIZE:
+            ERRORS.inc(stage='too_large')
+            return file_too_large_response()
         
         # Use cached model for prediction (much faster than subprocess)
         try:
-            if predictor is None:
-                # Try to reload model if it's not loaded
-                if not load_model():
-                    os.remove(filepath)
-                    return jsonify({
-                        'success': False,
-                        'error': 'AI model not available. Please try again.'
-                    }), 500
+            if g.served is None:
+                ERRORS.inc(stage='not_ready')
+                return warming_up_response()
+            predictor = g.served.predictor
+            
+            presized = client_presized()
+            UPLOAD_BYTES.observe(len(image_bytes), client_resized='yes' if presized else 'no')
             
-            # Make prediction using cached model
-            with model_lock:
-                results = predictor.predict(filepath, top_k=5)
+            # Re-uploads of the same photo skip decode and inference
+            cache_key = None
+            results = None
+            # Profiled requests always run the whole pipeline
+            if prediction_cache is not None and g.profile_session is None:
+                with STAGE_SECONDS.time(stage='cache_lookup'):
+                    cache_key = make_cache_key(image_bytes, predictor.model_version, TOP_K)
+                    results = prediction_cache.get(cache_key)
+            
+            if results is None:
+                # Only admitted requests hold a decoded image; the rest are shed or time out
+                admission_start = time.perf_counter()
+                with admission.admit(deadline):
+                    STAGE_SECONDS.observe(time.perf_counter() - admission_start, stage='admission_wait')
+                    
+                    # Decode and preprocess outside the lock, then let the scheduler batch the model call
+                    with STAGE_SECONDS.time(stage='decode'):
+                        image_batch = predictor.preprocess_image(image_bytes, presized=presized)
+                    if image_batch is None:
+                        ERRORS.inc(stage='decode')
+                        return jsonify({
+                            'success': False,
+                            'error': 'Prediction failed. Please try again.'
+                        }), 500
+                    
+                    if g.profile_session is not None:
+                        # On this thread, so the capture includes the model call
+                        prediction_probs = run_model_batch(predictor, image_batch)[0]
+                    else:
+                        # Dropped before inference if the client's deadline has passed
+                        prediction_probs = g.served.scheduler.submit(image_batch, deadline=deadline)
+                
+                results = predictor.format_results(prediction_probs, image_name, top_k=TOP_K)
+                
+                if results is not None and cache_key is not None:
+                    prediction_cache.put(cache_key, results)
             
             if results is None:
-                os.remove(filepath)
+                ERRORS.inc(stage='inference')
                 return jsonify({
                     'success': False,
                     'error': 'Prediction failed. Please try again.'
                 }), 500
             
+            record_prediction(results, image_digest(image_bytes) if prediction_log is not None else None)
+            
             # Format response (compatible with existing frontend)
-            prediction_result = {
-                'success': True,
-                'health_status': results['health_status'],
-                'top_prediction': results['top_prediction'],
-                'confidence': results['confidence'],
-                'predictions': results['predictions'],
-                'image_name': os.path.basename(filepath)
-            }
+            prediction_result = prediction_payload(results, image_name)
             
-            # Clean up uploaded file
-            try:
-                os.remove(filepath)
-            except:
-                pass
+            # Embed the treatment entry so the client does not fetch a whole treatment file
+            lang = request.form.get('lang') or request.args.get('lang')
+            if lang and results['health_status'] == 'diseased':
+                entry = treatment_index.get_entry(lang, results['top_prediction'])
+                if entry is not None:
+                    prediction_result['treatments'] = entry['data']
+                    prediction_result['treatments_lang'] = entry['language']
             
-            return jsonify(prediction_result)
+            with STAGE_SECONDS.time(stage='serialize'):
+                response = jsonify(prediction_result)
+            return response
             
+        except AdmissionRejected as e:
+            ERRORS.inc(stage='overload')
+            response = jsonify({
+                'success': False,
+                'error': 'Server is busy. Please try again shortly.'
+            })
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 503
+        except DeadlineExceeded:
+            ERRORS.inc(stage='deadline')
+            return jsonify({
+                'success': False,
+                'error': 'Prediction timed out. Please try again.'
+            }), 504
         except Exception as e:
-            os.remove(filepath)
+            ERRORS.inc(stage='inference')
+            print(f"❌ Prediction failed: {e}")
             return jsonify({
                 'success': False,
                 'error': f'Prediction failed: {str(e)}'
             }), 500
             
+    except RequestEntityTooLarge:
+        ERRORS.inc(stage='too_large')
+        return file_too_large_response()
     except Exception as e:
+        ERRORS.inc(stage='server')
+        print(f"❌ Server error: {e}")
         return jsonify({
             'success': False,
             'error': f'Server error: {str(e)}'
         }), 500
 
+@app.route(BATCH_ENDPOINT, methods=['POST', 'OPTIONS'])
+def predict_batch_api():
+    """
+    Multi-image prediction for field surveys
+    
+    Accepts repeated 'images' file fields and/or zip archives of images.
+    Returns every per-image result plus the healthy/diseased/per-disease
+    summary. With ?stream=1 or "Accept: application/x-ndjson" the results
+    are streamed as NDJSON, one line per image as each chunk finishes,
+    followed by a final {"summary": ...} line.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    if g.served is None:
+        ERRORS.inc(stage='not_ready')
+        return warming_up_response()
+    
+    try:
+        uploads, streams = collect_batch_uploads()
+    except ValueError as e:
+        ERRORS.inc(stage='bad_request')
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if not uploads or len(uploads) > BATCH_UPLOAD_MAX_IMAGES:
+        close_streams(streams)
+    
+    if not uploads:
+        ERRORS.inc(stage='bad_request')
+        return jsonify({
+            'success': False,
+            'error': f'No images provided. Allowed: {", ".join(ALLOWED_EXTENSIONS)} or a .zip of them'
+        }), 400
+    
+    if len(uploads) > BATCH_UPLOAD_MAX_IMAGES:
+        ERRORS.inc(stage='bad_request')
+        return jsonify({
+            'success': False,
+            'error': f'Too many images ({len(uploads)}). Maximum per request: {BATCH_UPLOAD_MAX_IMAGES}'
+        }), 400
+    
+    lang = request.form.get('lang') or request.args.get('lang')
+    summary = g.served.predictor.summarize_results([])
+    summary['failed'] = 0
+    presized = client_presized()
+    
+    stream = request.args.get('stream') == '1' or \
+             'application/x-ndjson' in request.headers.get('Accept', '')
+    if stream:
+        def generate():
+            try:
+                for result in iter_batch_predictions(uploads, summary, presized):
+                    yield json.dumps(result) + '\n'
+                yield json.dumps({'summary': finish_batch_summary(summary, lang)}) + '\n'
+            finally:
+                close_streams(streams)
+        
+        response = app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+        response.headers['X-Accel-Buffering'] = 'no'  # Let reverse proxies pass lines through
+        return response
+    
+    try:
+        results = list(iter_batch_predictions(uploads, summary, presized))
+    finally:
+        close_streams(streams)
+    return jsonify({
+        'success': summary['total'] > 0,
+        'results': results,
+        'summary': finish_batch_summary(summary, lang)
+    })
+
+@app.route('/api/similar', methods=['POST', 'OPTIONS'])
+def similar_cases_api():
+    """
+    Earlier images that look like an uploaded photo
+    
+    Classifies the 'image' upload and returns the k most similar indexed
+    images (k <= 50, optionally only those with a given label) with their
+    stored prediction metadata, plus any near-duplicates of the upload.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    if vector_index is None:
+        return jsonify({'success': False, 'error': 'Similar-case search is not enabled'}), 404
+    if not vector_index.refresh():
+        return jsonify({'success': False, 'error': 'No similar-case index has been built yet'}), 404
+    if g.served is None:
+        ERRORS.inc(stage='not_ready')
+        return warming_up_response()
+    predictor = g.served.predictor
+    if not predictor.embeddings:
+        return jsonify({'success': False, 'error': 'The served model does not provide embeddings'}), 409
+    if not vector_index.built_with(predictor.model_sha256, predictor.model_version):
+        # After a model update the stored embeddings come from another model and cannot be compared
+        ERRORS.inc(stage='search')
+        return jsonify({'success': False,
+                        'error': f"The index was built with model {vector_index.meta.get('model_version')}, "
+                                 f"not the served {predictor.model_version}; rebuild it"}), 409
+    
+    file = request.files.get('image')
+    if file is None or file.filename == '' or not allowed_file(file.filename):
+        ERRORS.inc(stage='bad_request')
+        return jsonify({'success': False, 'error': 'No valid image file provided'}), 400
+    try:
+        k = min(max(int(request.form.get('k') or request.args.get('k') or 10), 1), SIMILAR_MAX_K)
+        min_similarity = request.form.get('min_similarity') or request.args.get('min_similarity')
+        min_similarity = float(min_similarity) if min_similarity else None
+    except ValueError:
+        ERRORS.inc(stage='bad_request')
+        return jsonify({'success': False, 'error': 'k and min_similarity must be numbers'}), 400
+    label = request.form.get('label') or request.args.get('label') or None
+    
+    deadline = request_deadline()
+    try:
+        image_name = secure_filename(file.filename) or 'upload'
+        image_bytes = file.stream.read(MAX_FILE_SIZE + 1)
+        if len(image_bytes) > MAX_FILE_SIZE:
+            ERRORS.inc(stage='too_large')
+            return file_too_large_response()
+        
+        with admission.admit(deadline):
+            with STAGE_SECONDS.time(stage='decode'):
+                image_batch = predictor.preprocess_image(image_bytes, presized=client_presized())
+            if image_batch is None:
+                ERRORS.inc(stage='decode')
+                return jsonify({'success': False, 'error': 'Could not decode image'}), 400
+            # Both outputs come from one forward pass; the scheduler only returns probabilities
+            with model_lock, STAGE_SECONDS.time(stage='inference'):
+                probabilities, embeddings = predictor.predict_with_embeddings(image_batch)
+    except AdmissionRejected as e:
+        ERRORS.inc(stage='overload')
+        response = jsonify({'success': False, 'error': 'Server is busy. Please try again shortly.'})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503
+    except DeadlineExceeded:
+        ERRORS.inc(stage='deadline')
+        return jsonify({'success': False, 'error': 'Search timed out. Please try again.'}), 504
+    except Exception as e:
+        ERRORS.inc(stage='inference')
+        print(f"❌ Prediction failed: {e}")
+        return jsonify({'success': False, 'error': f'Prediction failed: {str(e)}'}), 500
+
+    try:
+        with STAGE_SECONDS.time(stage='search'):
+            matches = vector_index.search(embeddings[0], k=k, label=label, min_similarity=min_similarity)
+    except ValueError as e:
+        # The index was built from a model with a different embedding size
+        ERRORS.inc(stage='search')
+        return jsonify({'success': False, 'error': str(e)}), 409
+    
+    results = predictor.format_results(probabilities[0], image_name, top_k=TOP_K)
+    payload = prediction_payload(results, image_name)
+    payload['similar'] = matches
+    payload['near_duplicate'] = [match for match in matches if match['similarity'] >= NEAR_DUPLICATE_SIMILARITY]
+    payload['index'] = {'count': vector_index.count, 'model_version': (vector_index.meta or {}).get('model_version')}
+    return jsonify(payload)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,252 @@
+"""
+Dynamic Micro-Batching Scheduler
+Collects concurrent prediction requests into a single model call
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+from admission import DeadlineExceeded
+
+_STOP = object()  # Queued by close(): the worker exits after the requests ahead of it
+
+
+class MicroBatchScheduler:
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=5.0, on_batch=None):
+        """
+        Initialize the micro-batching scheduler
+
+        Args:
+            predict_fn (callable): Takes a stacked (N, H, W, C) batch and
+                returns an (N, num_classes) array of probabilities
+            max_batch_size (int): Largest batch handed to predict_fn
+            max_wait_ms (float): How long the worker waits for more requests
+                after the first one arrives before running a partial batch
+            on_batch (callable): Optional hook called after each batch with
+                (batch_size, queue_wait_seconds_per_request, inference_seconds)
+        """
+        self.predict_fn = predict_fn
+        self.on_batch = on_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._batch_buffer = None  # Reused by the worker for stacking requests
+        self._worker = None
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._closed = False
+
+        # Stats
+        self._batches_run = 0
+        self._requests_served = 0
+        self._largest_batch = 0
+        self._batch_size_counts = {}
+        self._last_batch_ms = 0.0
+        self._expired = 0
+
+    def _ensure_worker(self):
+        """Start the worker thread lazily (and again after a fork)"""
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+                return
+            if self._worker_pid != pid:
+                # Threads and queued items do not survive a fork
+                self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, name='micro-batch-worker', daemon=True)
+            self._worker_pid = pid
+            self._worker.start()
+
+    def submit(self, image_batch, timeout=None, deadline=None):
+        """
+        Queue a preprocessed image and wait for its prediction
+
+        Args:
+            image_batch (np.ndarray): Tensor of shape (1, H, W, C)
+            timeout (float): Seconds to wait for the result (None = forever)
+            deadline (float): time.monotonic() value after which the request
+                is dropped instead of being run
+
+        Returns:
+            np.ndarray: Class probabilities for this image
+
+        Raises:
+            DeadlineExceeded: The deadline passed before the prediction ran
+        """
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded()
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
+        future = self.submit_async(image_batch, deadline)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Let the worker skip it if it has not started yet
+            future.cancel()
+            if deadline is not None and time.monotonic() >= deadline:
+                raise DeadlineExceeded()
+            raise
+
+    def submit_async(self, image_batch, deadline=None):
+        """
+        Queue a preprocessed image without waiting
+
+        Returns:
+            concurrent.futures.Future: Resolves to the class probabilities
+        """
+        if self._closed:
+            raise RuntimeError("Scheduler is closed")
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((image_batch, future, deadline, time.monotonic()))
+        return future
+
+    def close(self):
+        """
+        Stop the worker thread once the requests already queued have run
+
+        Later submits raise RuntimeError. The worker drops its reference to
+        predict_fn, so a retired model can be garbage collected.
+        """
+        with self._start_lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+                self._queue.put(_STOP)
+
+    def _collect(self):
+        """
+        Block for the first request, then gather more until full or timed out
+
+        Returns:
+            tuple: (items, stop) where stop is True once close() was called
+        """
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        items = [item]
+        size = len(item[0])
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return items, True
+            items.append(item)
+            size += len(item[0])
+
+        return items, False
+
+    def _run(self):
+        """Worker loop"""
+        stop = False
+        while not stop:
+            items, stop = self._collect()
+
+            # Drop requests whose caller already gave up or whose deadline passed
+            now = time.monotonic()
+            live = []
+            for item in items:
+                image_batch, future, deadline, _ = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if deadline is not None and now >= deadline:
+                    self._expired += 1
+                    future.set_exception(DeadlineExceeded())
+                    continue
+                live.append(item)
+            items = live
+            if not items:
+                continue
+
+            try:
+                start = time.perf_counter()
+                batch = self._stack([item[0] for item in items])
+                probabilities = self.predict_fn(batch)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+            except Exception as e:
+                for _, future, _, _ in items:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for image_batch, future, _, _ in items:
+                count = len(image_batch)
+                rows = probabilities[offset:offset + count]
+                future.set_result(rows[0] if count == 1 else rows)
+                offset += count
+
+            self._record(len(batch), len(items), elapsed_ms)
+            if self.on_batch is not None:
+                try:
+                    self.on_batch(len(batch), [now - item[3] for item in items], elapsed_ms / 1000)
+                except Exception as e:
+                    print(f"Error in batch hook: {e}")
+
+        # Release the model held by predict_fn and the stacking buffer
+        self.predict_fn = None
+        self._batch_buffer = None
+
+    def _stack(self, arrays):
+        """Concatenate request tensors into the reusable batch buffer"""
+        if len(arrays) == 1:
+            return arrays[0]
+        size = sum(len(array) for array in arrays)
+        shape = (max(size, self.max_batch_size),) + arrays[0].shape[1:]
+        buffer = self._batch_buffer
+        if buffer is None or buffer.dtype != arrays[0].dtype or buffer.shape[1:] != shape[1:] or len(buffer) < size:
+            buffer = self._batch_buffer = np.empty(shape, dtype=arrays[0].dtype)
+        return np.concatenate(arrays, axis=0, out=buffer[:size])
+
+    def _record(self, batch_size, request_count, elapsed_ms):
+        with self._stats_lock:
+            self._batches_run += 1
+            self._requests_served += request_count
+            self._largest_batch = max(self._largest_batch, batch_size)
+            self._batch_size_counts[batch_size] = self._batch_size_counts.get(batch_size, 0) + 1
+            self._last_batch_ms = elapsed_ms
+
+    def queue_depth(self):
+        """Number of requests waiting for the worker"""
+        return self._queue.qsize()
+
+    def stats(self):
+        """
+        Snapshot of scheduler statistics
+
+        Returns:
+            dict: Configuration, queue depth and batch-size stats
+        """
+        with self._stats_lock:
+            average = (self._requests_served / self._batches_run) if self._batches_run else 0.0
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': self.queue_depth(),
+                'batches_run': self._batches_run,
+                'requests_served': self._requests_served,
+                'average_batch_size': round(average, 2),
+                'largest_batch_size': self._largest_batch,
+                'last_batch_ms': round(self._last_batch_ms, 2),
+                'expired_before_inference': self._expired,
+                'batch_size_counts': {str(k): v for k, v in sorted(self._batch_size_counts.items())}
+            }
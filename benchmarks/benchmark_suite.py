@@ -0,0 +1,604 @@
+#!/usr/bin/env python3
+"""
+Benchmark and Load-Test Suite
+Offline, reproducible measurements of the predictor and the Flask API:
+single-image latency percentiles, batch throughput, cold start, peak RSS
+and concurrent load on /predict_api.php. Results are written as JSON so
+runs can be compared.
+
+Usage:
+    python benchmarks/benchmark_suite.py predictor --output predictor.json
+    python benchmarks/benchmark_suite.py load --concurrency 8 --requests 200 --output load.json
+    python benchmarks/benchmark_suite.py load --url http://127.0.0.1:5000/predict_api.php
+    python benchmarks/benchmark_suite.py compare old.json new.json
+
+If results/model.hdf5 is missing, a small stand-in Keras model with the same
+256x256x3 -> 10 class signature is built so the suite still runs.
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import uuid
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Suppress TensorFlow logging BEFORE importing TensorFlow
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_MODEL_PATH = os.path.join(REPO_ROOT, 'results', 'model.hdf5')
+
+# Typical phone camera resolutions: 12 MP, a downscaled share, and 48 MP
+DEFAULT_RESOLUTIONS = [(4032, 3024), (1600, 1200), (8000, 6000)]
+DEFAULT_FORMATS = ['JPEG', 'PNG', 'WEBP']
+DEFAULT_BATCH_SIZES = [1, 4, 8, 16, 32]
+PERCENTILES = (50, 90, 95, 99)
+
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+
+def synthetic_image(width, height, fmt='JPEG', seed=0):
+    """Make a leaf-coloured image with some texture so it compresses realistically"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, size=(max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+    small[..., 1] = np.maximum(small[..., 1], 120)  # Mostly green
+    image = Image.fromarray(small).resize((width, height), Image.BILINEAR)
+    buffer = io.BytesIO()
+    if fmt == 'PNG':
+        image.save(buffer, 'PNG', compress_level=6)
+    else:
+        image.save(buffer, fmt, quality=90)
+    return buffer.getvalue()
+
+
+def make_inputs(resolutions, formats, count):
+    """
+    Generate synthetic uploads
+
+    Returns:
+        list: (label, format, bytes) tuples, deterministic for a given argument set
+    """
+    inputs = []
+    seed = 0
+    for width, height in resolutions:
+        for fmt in formats:
+            for _ in range(count):
+                inputs.append((f"{width}x{height}.{FORMAT_EXTENSIONS[fmt]}#{seed}", fmt,
+                               synthetic_image(width, height, fmt, seed=seed)))
+                seed += 1
+    return inputs
+
+
+def parse_resolutions(value):
+    return [tuple(int(part) for part in item.lower().split('x')) for item in value.split(',') if item]
+
+
+def build_stand_in_model(path, input_size=256, num_classes=10):
+    """
+    Save a small untrained Keras model with the production input/output signature
+
+    Its timings are not the real model's, but the surrounding pipeline
+    (decode, batching, serialization, HTTP) is exercised exactly as in production.
+    """
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(0)
+    model = tf.keras.Sequential([
+        tf.keras.Input(shape=(input_size, input_size, 3)),
+        tf.keras.layers.Conv2D(16, 3, strides=2, activation='relu'),
+        tf.keras.layers.Conv2D(32, 3, strides=2, activation='relu'),
+        tf.keras.layers.Conv2D(64, 3, strides=2, activation='relu'),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(num_classes, activation='softmax')
+    ])
+    model.save(path)
+    return path
+
+
+def resolve_model(model_path, work_dir):
+    """
+    Use the real model if it exists, otherwise build the stand-in
+
+    Returns:
+        tuple: (model path, True if the stand-in is used)
+    """
+    if model_path and os.path.exists(model_path):
+        return model_path, False
+    path = os.path.join(work_dir, 'stand_in_model.h5')
+    if not os.path.exists(path):
+        print(f"Model not found at {model_path}; building a stand-in model")
+        build_stand_in_model(path)
+    return path, True
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def summarize_ms(values):
+    """Count, mean, percentiles and max of durations given in seconds"""
+    if not values:
+        return {'count': 0}
+    ms = np.asarray(values) * 1000
+    summary = {'count': int(len(ms)), 'mean_ms': round(float(ms.mean()), 3)}
+    for p in PERCENTILES:
+        summary[f'p{p}_ms'] = round(float(np.percentile(ms, p)), 3)
+    summary['max_ms'] = round(float(ms.max()), 3)
+    return summary
+
+
+def environment_info(model_path, stand_in):
+    info = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'model_path': model_path,
+        'stand_in_model': stand_in
+    }
+    try:
+        import tensorflow as tf
+        info['tensorflow'] = tf.__version__
+    except Exception:
+        info['tensorflow'] = None
+    return info
+
+
+def bench_latency(predictor, inputs, repeat, warmup=2):
+    """
+    Single-image latency (one upload at a time, no batching)
+
+    Returns:
+        dict: Per-stage and end-to-end percentiles, overall and per format
+    """
+    buffer = predictor.batch_buffer(1)
+    for _, _, data in inputs[:warmup]:
+        predictor.predict_probabilities(predictor.preprocess_image(data, out=buffer))
+
+    timings = {'decode': [], 'inference': [], 'total': []}
+    by_format = {}
+    for _, fmt, data in inputs:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            batch = predictor.preprocess_image(data, out=buffer)
+            decoded = time.perf_counter()
+            probs = predictor.predict_probabilities(batch)
+            predictor.format_results(probs[0], 'benchmark', top_k=5)
+            end = time.perf_counter()
+            timings['decode'].append(decoded - start)
+            timings['inference'].append(end - decoded)
+            timings['total'].append(end - start)
+            by_format.setdefault(fmt, []).append(end - start)
+
+    return {
+        'stages': {stage: summarize_ms(values) for stage, values in timings.items()},
+        'by_format': {fmt: summarize_ms(values) for fmt, values in by_format.items()}
+    }
+
+
+def bench_throughput(predictor, inputs, batch_sizes, rounds):
+    """
+    Model throughput for pre-decoded batches of each size
+
+    Returns:
+        dict: Batch size -> images/second and per-batch latency
+    """
+    decoded = np.concatenate([predictor.preprocess_image(data) for _, _, data in inputs])
+    results = {}
+    for batch_size in batch_sizes:
+        index = np.arange(batch_size) % len(decoded)
+        batch = np.ascontiguousarray(decoded[index])
+        predictor.predict_probabilities(batch)  # Trace/allocate for this shape
+        durations = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            predictor.predict_probabilities(batch)
+            durations.append(time.perf_counter() - start)
+        results[str(batch_size)] = {
+            'images_per_second': round(batch_size * rounds / sum(durations), 2),
+            'batch_latency': summarize_ms(durations)
+        }
+    return results
+
+
+def cold_start_child(model_path, backend, compiled=True):
+    """Measured in a fresh interpreter: import, load, first and second prediction"""
+    start = time.perf_counter()
+    from predict_paddy_disease import PaddyDiseasePredictor
+    imported = time.perf_counter()
+
+    predictor = PaddyDiseasePredictor(model_path, backend=backend, use_compiled=compiled)
+    if not predictor.load_model():
+        return {'error': 'Failed to load model'}
+    loaded = time.perf_counter()
+
+    data = synthetic_image(1600, 1200, 'JPEG')
+    predictor.predict(data, image_name='cold_start')
+    first = time.perf_counter()
+    predictor.predict(data, image_name='cold_start')
+    second = time.perf_counter()
+
+    return {
+        'import_seconds': round(imported - start, 3),
+        'load_seconds': round(loaded - imported, 3),
+        'first_prediction_seconds': round(first - loaded, 3),
+        'second_prediction_seconds': round(second - first, 3),
+        'time_to_first_prediction_seconds': round(first - start, 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'compiled': predictor.compiled
+    }
+
+
+def bench_cold_start(model_path, backend, runs, compiled=True):
+    """Run cold_start_child in new processes so nothing is already imported or cached"""
+    samples = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), 'cold-start', '--model', model_path,
+             '--backend', backend] + ([] if compiled else ['--no-compiled']),
+            capture_output=True, text=True, cwd=REPO_ROOT)
+        lines = [line for line in completed.stdout.splitlines() if line.startswith('{')]
+        if completed.returncode != 0 or not lines:
+            return {'error': (completed.stderr or completed.stdout).strip()[-500:]}
+        samples.append(json.loads(lines[-1]))
+
+    if any('error' in sample for sample in samples):
+        return samples[0]
+    keys = [key for key in samples[0] if key not in ('peak_rss_mb', 'compiled')]
+    report = {key: round(float(np.median([s[key] for s in samples])), 3) for key in keys}
+    report['peak_rss_mb'] = samples[-1]['peak_rss_mb']
+    report['compiled'] = samples[-1]['compiled']
+    report['runs'] = runs
+    return report
+
+
+def run_predictor(args):
+    from predict_paddy_disease import PaddyDiseasePredictor
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        model_path, stand_in = resolve_model(args.model, work_dir)
+        results = {'benchmark': 'predictor', 'environment': environment_info(model_path, stand_in)}
+
+        print("Preparing inputs...")
+        inputs = make_inputs(parse_resolutions(args.resolutions), args.formats.split(','), args.count)
+        results['inputs'] = {'images': len(inputs), 'resolutions': args.resolutions,
+                             'formats': args.formats, 'repeat': args.repeat}
+
+        if args.compiled and args.backend == 'keras':
+            from compiled_model import build_artifact
+            print("Building compiled model...")
+            build_artifact(model_path)
+
+        if not args.skip_cold_start:
+            print("Measuring cold start...")
+            results['cold_start'] = bench_cold_start(model_path, args.backend, args.cold_start_runs)
+            if results['cold_start'].get('compiled'):
+                # Before/after for the compiled artifact
+                results['cold_start_uncompiled'] = bench_cold_start(model_path, args.backend,
+                                                                    args.cold_start_runs, compiled=False)
+
+        predictor = PaddyDiseasePredictor(model_path, preprocess_mode=args.preprocess, backend=args.backend)
+        if not predictor.load_model():
+            sys.exit(1)
+
+        print("Measuring single-image latency...")
+        results['latency'] = bench_latency(predictor, inputs, args.repeat)
+        print("Measuring batch throughput...")
+        results['throughput'] = bench_throughput(predictor, inputs,
+                                                 [int(b) for b in args.batch_sizes.split(',')], args.rounds)
+        results['peak_rss_mb'] = peak_rss_mb()
+
+    print_predictor_report(results)
+    return results
+
+
+def print_predictor_report(results):
+    print(f"\n{'='*60}")
+    print("PREDICTOR BENCHMARK")
+    print(f"{'='*60}")
+    if results['environment']['stand_in_model']:
+        print("(stand-in model: pipeline timings are real, model timings are not)")
+
+    for key, label in (('cold_start_uncompiled', 'Cold start (Keras)'), ('cold_start', 'Cold start')):
+        cold = results.get(key)
+        if cold and 'error' not in cold:
+            if cold.get('compiled'):
+                label += ' (compiled)'
+            print(f"{label}: import {cold['import_seconds']}s, load {cold['load_seconds']}s, "
+                  f"first prediction {cold['first_prediction_seconds']}s "
+                  f"(total {cold['time_to_first_prediction_seconds']}s, peak RSS {cold['peak_rss_mb']} MB)")
+        elif cold:
+            print(f"{label} failed: {cold['error']}")
+
+    print(f"\n{'Stage':<12}{'Mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, s in results['latency']['stages'].items():
+        print(f"{stage:<12}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}")
+    for fmt, s in results['latency']['by_format'].items():
+        print(f"{'total ' + fmt:<12}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}")
+
+    print(f"\n{'Batch':<8}{'Images/s':>12}{'p50 ms':>10}")
+    for batch_size, t in results['throughput'].items():
+        print(f"{batch_size:<8}{t['images_per_second']:>12.1f}{t['batch_latency']['p50_ms']:>10.2f}")
+    print(f"\nPeak RSS: {results['peak_rss_mb']} MB")
+
+
+def with_unique_suffix(data, token):
+    """
+    Append bytes after the image data so each upload has a distinct hash
+
+    Decoders stop at the end-of-image marker, so the pixels are unchanged but
+    the prediction cache cannot answer the request.
+    """
+    return data + b'\0' + token.encode()
+
+
+def encode_multipart(fields, files):
+    """Build a multipart/form-data body for urllib"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                     f'filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n'.encode())
+        parts.append(data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class TestClientTarget:
+    """Drive the Flask app in-process through its test client"""
+
+    def __init__(self, model_path, cache):
+        # Configure the app before it is imported; the model is loaded explicitly below
+        os.environ['PRELOAD_MODEL'] = '0'
+        os.environ['MODEL_REGISTRY_DIR'] = ''  # Always serve the model given here
+        if not cache:
+            os.environ['CACHE_MAX_ENTRIES'] = '0'
+        os.chdir(REPO_ROOT)  # Treatment files and static assets are relative paths
+        import app as app_module
+
+        app_module.MODEL_PATH = model_path
+        load_start = time.perf_counter()
+        if not app_module.load_model():
+            raise RuntimeError(app_module.model_state['error'])
+        self.load_seconds = round(time.perf_counter() - load_start, 3)
+        self.app_module = app_module
+        self._local = threading.local()
+
+    def post(self, filename, data, lang):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app_module.app.test_client()
+        response = client.post('/predict_api.php', content_type='multipart/form-data',
+                               data={'image': (io.BytesIO(data), filename), 'lang': lang})
+        return response.status_code
+
+    def server_stats(self):
+        return {
+            'batching': self.app_module.served.scheduler.stats() if self.app_module.served else {},
+            'admission': self.app_module.admission.stats()
+        }
+
+
+class HttpTarget:
+    """Drive a running server (flask run, gunicorn, or XAMPP) over HTTP"""
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.load_seconds = None
+
+    def post(self, filename, data, lang):
+        body, content_type = encode_multipart({'lang': lang}, {'image': (filename, data)})
+        req = urllib.request.Request(self.url, data=body, headers={'Content-Type': content_type})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except OSError:
+            return 'connection_error'
+
+    def server_stats(self):
+        return None
+
+
+def run_load(args):
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.url:
+            target = HttpTarget(args.url, args.timeout)
+            model_path, stand_in = None, None
+        else:
+            model_path, stand_in = resolve_model(args.model, work_dir)
+            print("Loading app...")
+            target = TestClientTarget(model_path, args.cache)
+
+        inputs = make_inputs(parse_resolutions(args.resolutions), args.formats.split(','), 1)
+        print(f"Sending {args.requests} requests with concurrency {args.concurrency}...")
+
+        def send(i):
+            label, fmt, data = inputs[i % len(inputs)]
+            if not args.cache:
+                data = with_unique_suffix(data, str(i))
+            start = time.perf_counter()
+            status = target.post(f"load_{i}.{FORMAT_EXTENSIONS[fmt]}", data, args.lang)
+            return status, time.perf_counter() - start
+
+        # Warm the request path (and the model, for the test client) before timing
+        for i in range(min(args.warmup, args.requests)):
+            send(-1 - i)
+
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes = list(pool.map(send, range(args.requests)))
+        wall = time.perf_counter() - wall_start
+
+        statuses = {}
+        for status, _ in outcomes:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        succeeded = [duration for status, duration in outcomes if status == 200]
+
+        results = {
+            'benchmark': 'load',
+            'environment': environment_info(model_path, stand_in),
+            'target': args.url or 'flask-test-client',
+            'config': {'requests': args.requests, 'concurrency': args.concurrency,
+                       'cache': args.cache, 'resolutions': args.resolutions, 'formats': args.formats},
+            'wall_seconds': round(wall, 3),
+            'requests_per_second': round(args.requests / wall, 2),
+            'successful_per_second': round(len(succeeded) / wall, 2),
+            'status_counts': statuses,
+            'latency': summarize_ms([duration for _, duration in outcomes]),
+            'success_latency': summarize_ms(succeeded),
+            'model_load_seconds': target.load_seconds,
+            'server': target.server_stats(),
+            'peak_rss_mb': peak_rss_mb() if not args.url else None
+        }
+
+    print_load_report(results)
+    return results
+
+
+def print_load_report(results):
+    latency = results['latency']
+    print(f"\n{'='*60}")
+    print("LOAD TEST")
+    print(f"{'='*60}")
+    print(f"Target:       {results['target']}")
+    print(f"Requests:     {results['config']['requests']} (concurrency {results['config']['concurrency']})")
+    print(f"Throughput:   {results['requests_per_second']} req/s "
+          f"({results['successful_per_second']} successful/s)")
+    print(f"Status codes: {results['status_counts']}")
+    print(f"Latency ms:   mean {latency['mean_ms']}, p50 {latency['p50_ms']}, p95 {latency['p95_ms']}, "
+          f"p99 {latency['p99_ms']}, max {latency['max_ms']}")
+    if results['server']:
+        batching = results['server']['batching']
+        print(f"Batching:     {batching}")
+    if results['peak_rss_mb'] is not None:
+        print(f"Peak RSS:     {results['peak_rss_mb']} MB")
+
+
+def flatten(report, prefix=''):
+    """Numeric leaves of a result file keyed by dotted path"""
+    values = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, path + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+
+def run_compare(args):
+    """Print the relative change of every shared numeric metric between two runs"""
+    with open(args.baseline) as f:
+        baseline = flatten(json.load(f))
+    with open(args.candidate) as f:
+        candidate = flatten(json.load(f))
+
+    print(f"{'Metric':<55}{'Baseline':>12}{'Candidate':>12}{'Change':>9}")
+    for key in sorted(set(baseline) & set(candidate)):
+        if key.startswith(('environment.', 'config.', 'inputs.')):
+            continue
+        old, new = baseline[key], candidate[key]
+        change = f"{(new - old) / old:+.1%}" if old else 'n/a'
+        print(f"{key:<55}{old:>12.3f}{new:>12.3f}{change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark and load-test suite for MyPadiCare')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(sub):
+        sub.add_argument('--model', default=DEFAULT_MODEL_PATH,
+                         help='Model to benchmark (a stand-in is built if it does not exist)')
+        sub.add_argument('--resolutions', default=','.join(f'{w}x{h}' for w, h in DEFAULT_RESOLUTIONS),
+                         help='Comma-separated WIDTHxHEIGHT list for synthetic inputs')
+        sub.add_argument('--formats', default=','.join(DEFAULT_FORMATS),
+                         help='Comma-separated image formats (JPEG, PNG, WEBP)')
+        sub.add_argument('--output', help='Write results as JSON to this file')
+
+    predictor_parser = subparsers.add_parser('predictor', help='Latency, throughput, cold start and memory')
+    add_common(predictor_parser)
+    predictor_parser.add_argument('--count', type=int, default=2, help='Images per resolution and format')
+    predictor_parser.add_argument('--repeat', type=int, default=5, help='Timed runs per image')
+    predictor_parser.add_argument('--batch-sizes', default=','.join(map(str, DEFAULT_BATCH_SIZES)))
+    predictor_parser.add_argument('--rounds', type=int, default=10, help='Timed model calls per batch size')
+    predictor_parser.add_argument('--preprocess', choices=['fast', 'legacy'], default='fast')
+    predictor_parser.add_argument('--backend', choices=['keras', 'tflite'], default='keras')
+    predictor_parser.add_argument('--cold-start-runs', type=int, default=3)
+    predictor_parser.add_argument('--skip-cold-start', action='store_true')
+    predictor_parser.add_argument('--compiled', action='store_true',
+                                  help='Build the compiled artifact first and report cold start with and without it')
+
+    load_parser = subparsers.add_parser('load', help='Concurrent requests against /predict_api.php')
+    add_common(load_parser)
+    load_parser.add_argument('--url', help='Server endpoint (default: in-process Flask test client)')
+    load_parser.add_argument('--requests', type=int, default=100)
+    load_parser.add_argument('--concurrency', type=int, default=8)
+    load_parser.add_argument('--warmup', type=int, default=4, help='Untimed requests sent first')
+    load_parser.add_argument('--lang', default='en')
+    load_parser.add_argument('--cache', action='store_true',
+                             help='Reuse identical uploads so the prediction cache can answer them')
+    load_parser.add_argument('--timeout', type=float, default=60, help='Per-request timeout for --url')
+
+    cold_parser = subparsers.add_parser('cold-start', help='One cold start in this process (prints JSON)')
+    cold_parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    cold_parser.add_argument('--backend', choices=['keras', 'tflite'], default='keras')
+    cold_parser.add_argument('--no-compiled', action='store_true', help='Ignore the compiled artifact')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+
+    args = parser.parse_args()
+    # The load test changes into the repo root, so pin relative paths first
+    for name in ('model', 'output'):
+        if getattr(args, name, None):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    if args.command == 'cold-start':
+        print(json.dumps(cold_start_child(args.model, args.backend, compiled=not args.no_compiled)))
+        return
+    if args.command == 'compare':
+        run_compare(args)
+        return
+
+    results = run_predictor(args) if args.command == 'predictor' else run_load(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Client-Side Resize Parity Check
+Simulates the browser's upload path (orient, shrink to 256x256, re-encode as
+JPEG) and checks that predictions on the pre-shrunk upload match the
+server's full-size path. Exits non-zero below --min-agreement.
+
+Usage:
+    python benchmarks/client_resize_check.py --images path/to/field_photos
+    python benchmarks/client_resize_check.py --quality 80 --resample bilinear
+"""
+
+import os
+import sys
+import io
+import json
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from benchmark_suite import DEFAULT_MODEL_PATH, make_inputs, resolve_model
+from predict_paddy_disease import PaddyDiseasePredictor, IMAGE_EXTENSIONS, normalize_batch
+
+# Closest PIL filters to the browsers' resizeQuality settings
+RESAMPLE_FILTERS = {
+    'lanczos': Image.LANCZOS,  # 'high' in Chromium and Firefox
+    'bicubic': Image.BICUBIC,  # 'medium'
+    'bilinear': Image.BILINEAR  # 'low' / plain canvas drawImage
+}
+
+
+def client_shrink(data, size, quality, resample):
+    """What app_xampp.js uploads: EXIF-oriented, squashed to size x size, JPEG re-encoded"""
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    image = image.convert('RGB').resize((size, size), RESAMPLE_FILTERS[resample])
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def load_images(folder, limit):
+    inputs = []
+    for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+        if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS + ('.webp',)):
+            with open(entry.path, 'rb') as f:
+                inputs.append((entry.name, f.read()))
+    return inputs[:limit] if limit else inputs
+
+
+def check_parity(predictor, inputs, quality, resample):
+    """
+    Compare the full-size and pre-shrunk paths image by image
+
+    Returns:
+        dict: Agreement, probability and pixel differences and upload sizes
+    """
+    agreements = 0
+    prob_diffs = []
+    pixel_diffs = []
+    original_bytes = 0
+    shrunk_bytes = 0
+    disagreements = []
+
+    for name, data in inputs:
+        shrunk = client_shrink(data, predictor.input_size, quality, resample)
+        full = predictor.preprocess_image(data)
+        small = predictor.preprocess_image(shrunk, presized=True)
+        if full is None or small is None:
+            continue
+
+        probs = predictor.predict_probabilities(np.concatenate([full, small]))
+        top_full, top_small = int(np.argmax(probs[0])), int(np.argmax(probs[1]))
+        agreements += int(top_full == top_small)
+        if top_full != top_small:
+            disagreements.append({'image': name,
+                                  'full_size': predictor.class_names[top_full],
+                                  'client_resized': predictor.class_names[top_small]})
+
+        prob_diffs.append(float(np.abs(probs[0] - probs[1]).max()))
+        pixel_diffs.append(float(np.abs(normalize_batch(full) - normalize_batch(small)).mean()))
+        original_bytes += len(data)
+        shrunk_bytes += len(shrunk)
+
+    checked = len(prob_diffs)
+    return {
+        'images': checked,
+        'top1_agreement': agreements / checked if checked else None,
+        'max_probability_diff': max(prob_diffs) if checked else None,
+        'mean_probability_diff': float(np.mean(prob_diffs)) if checked else None,
+        'mean_abs_pixel_diff': float(np.mean(pixel_diffs)) if checked else None,
+        'mean_original_kb': original_bytes / checked / 1024 if checked else None,
+        'mean_upload_kb': shrunk_bytes / checked / 1024 if checked else None,
+        'disagreements': disagreements
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check predictions on client-resized uploads against full size')
+    parser.add_argument('--images', help='Folder of real photos (default: synthetic phone-size images)')
+    parser.add_argument('--limit', type=int, help='Only check the first N images')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH,
+                        help='Model to check (a stand-in is built if it does not exist)')
+    parser.add_argument('--quality', type=int, default=92, help='JPEG quality used by the client (0-100)')
+    parser.add_argument('--resample', choices=list(RESAMPLE_FILTERS), default='lanczos')
+    parser.add_argument('--min-agreement', type=float, default=0.98,
+                        help='Exit non-zero below this top-1 agreement (default: 0.98)')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    args = parser.parse_args()
+
+    if args.images:
+        inputs = load_images(args.images, args.limit)
+    else:
+        inputs = [(label, data) for label, _, data in make_inputs([(4032, 3024), (1600, 1200)], ['JPEG'], 4)]
+    if not inputs:
+        print("No images to check")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        model_path, stand_in = resolve_model(args.model, work_dir)
+        predictor = PaddyDiseasePredictor(model_path)
+        if not predictor.load_model():
+            sys.exit(1)
+        report = check_parity(predictor, inputs, args.quality, args.resample)
+    report.update({'quality': args.quality, 'resample': args.resample, 'stand_in_model': stand_in})
+
+    print(f"\n{'='*60}")
+    print("CLIENT RESIZE PARITY")
+    print(f"{'='*60}")
+    if stand_in:
+        print("(stand-in model: agreement is only meaningful with the trained model)")
+    if report['images'] == 0:
+        print("No image could be decoded")
+        sys.exit(1)
+    print(f"Images checked:        {report['images']}")
+    print(f"Top-1 agreement:       {report['top1_agreement']:.2%}")
+    print(f"Max probability diff:  {report['max_probability_diff']:.4f}")
+    print(f"Mean abs pixel diff:   {report['mean_abs_pixel_diff']:.4f}")
+    print(f"Upload size:           {report['mean_original_kb']:.0f} KB -> {report['mean_upload_kb']:.0f} KB")
+    for item in report['disagreements']:
+        print(f"  {item['image']}: {item['full_size']} (full size) vs {item['client_resized']} (resized)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to: {args.output}")
+
+    sys.exit(0 if report['top1_agreement'] >= args.min_agreement else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+uint8 Input Parity Check
+Compares the uint8 input path (pixels rescaled inside the model) with the
+previous float32 path (pixels divided by 255 in NumPy) on the same images,
+and reports the memory each batch buffer needs. Exits non-zero if top-1
+predictions differ or probabilities drift beyond --max-diff.
+
+Usage:
+    python benchmarks/input_dtype_check.py --images path/to/field_photos
+    python benchmarks/input_dtype_check.py --batch-size 64
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from benchmark_suite import DEFAULT_MODEL_PATH, make_inputs, resolve_model
+from client_resize_check import load_images
+from predict_paddy_disease import PaddyDiseasePredictor, normalize_batch
+
+
+def check_parity(uint8_predictor, float_predictor, inputs, batch_size):
+    """
+    Run both paths batch by batch
+
+    Returns:
+        dict: Agreement, probability differences, buffer sizes and timings
+    """
+    agreements = 0
+    checked = 0
+    max_diff = 0.0
+    timings = {'uint8': [], 'float32': []}
+
+    for start in range(0, len(inputs), batch_size):
+        chunk = inputs[start:start + batch_size]
+        buffer = uint8_predictor.batch_buffer(len(chunk))
+        rows = [row for row, (_, data) in enumerate(chunk)
+                if uint8_predictor.preprocess_image(data, out=buffer[row]) is not None]
+        if not rows:
+            continue
+        pixels = buffer[rows]
+
+        stage_start = time.perf_counter()
+        fused = uint8_predictor.predict_probabilities(pixels)
+        timings['uint8'].append(time.perf_counter() - stage_start)
+
+        stage_start = time.perf_counter()
+        reference = float_predictor.predict_probabilities(normalize_batch(pixels))
+        timings['float32'].append(time.perf_counter() - stage_start)
+
+        agreements += int(np.sum(np.argmax(fused, axis=1) == np.argmax(reference, axis=1)))
+        max_diff = max(max_diff, float(np.max(np.abs(fused - reference))))
+        checked += len(rows)
+
+    image_bytes = uint8_predictor.input_size ** 2 * 3
+    return {
+        'images': checked,
+        'top1_agreement': agreements / checked if checked else None,
+        'max_probability_diff': max_diff,
+        'batch_buffer_mb': {
+            'uint8': round(batch_size * image_bytes / 1024 / 1024, 2),
+            'float32': round(batch_size * image_bytes * 4 / 1024 / 1024, 2)
+        },
+        'model_seconds': {path: round(sum(values), 3) for path, values in timings.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the uint8 input path against the float32 path')
+    parser.add_argument('--images', help='Folder of real photos (default: synthetic phone-size images)')
+    parser.add_argument('--limit', type=int, help='Only check the first N images')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH,
+                        help='Model to check (a stand-in is built if it does not exist)')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--max-diff', type=float, default=1e-4,
+                        help='Exit non-zero above this max probability difference (default: 1e-4)')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    args = parser.parse_args()
+
+    if args.images:
+        inputs = load_images(args.images, args.limit)
+    else:
+        inputs = [(label, data) for label, _, data in make_inputs([(1600, 1200), (640, 480)], ['JPEG'], 8)]
+    if not inputs:
+        print("No images to check")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        model_path, stand_in = resolve_model(args.model, work_dir)
+        # Keras model on both sides, so only the input path differs
+        uint8_predictor = PaddyDiseasePredictor(model_path, use_compiled=False)
+        float_predictor = PaddyDiseasePredictor(model_path, use_compiled=False, fuse_normalization=False)
+        if not (uint8_predictor.load_model() and float_predictor.load_model()):
+            sys.exit(1)
+        report = check_parity(uint8_predictor, float_predictor, inputs, max(1, args.batch_size))
+    report['stand_in_model'] = stand_in
+
+    print(f"\n{'='*60}")
+    print("UINT8 INPUT PARITY")
+    print(f"{'='*60}")
+    if report['images'] == 0:
+        print("No image could be decoded")
+        sys.exit(1)
+    print(f"Images checked:        {report['images']}")
+    print(f"Top-1 agreement:       {report['top1_agreement']:.2%}")
+    print(f"Max probability diff:  {report['max_probability_diff']:.2e}")
+    print(f"Batch buffer:          {report['batch_buffer_mb']['float32']} MB float32 -> "
+          f"{report['batch_buffer_mb']['uint8']} MB uint8 ({args.batch_size} images)")
+    print(f"Model time:            {report['model_seconds']['float32']}s float32 -> "
+          f"{report['model_seconds']['uint8']}s uint8")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to: {args.output}")
+
+    ok = report['top1_agreement'] == 1.0 and report['max_probability_diff'] <= args.max_diff
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Preprocessing Microbenchmark
+Compares the fast (draft decode + reducing resize) and legacy preprocessing
+paths of PaddyDiseasePredictor: ms per image and output agreement
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from predict_paddy_disease import PaddyDiseasePredictor, PREPROCESS_MODES, normalize_batch
+
+# Typical phone camera resolutions (12 MP and 48 MP)
+DEFAULT_RESOLUTIONS = [(4032, 3024), (8000, 6000)]
+
+
+def synthetic_jpeg(width, height, seed=0, quality=90):
+    """Make a leaf-coloured JPEG with some texture so it compresses realistically"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, size=(height // 16, width // 16, 3), dtype=np.uint8)
+    small[..., 1] = np.maximum(small[..., 1], 120)  # Mostly green
+    image = Image.fromarray(small).resize((width, height), Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def load_inputs(image_folder, resolutions, count):
+    """Return a list of (label, bytes) pairs to benchmark"""
+    if image_folder:
+        inputs = []
+        for entry in sorted(os.scandir(image_folder), key=lambda e: e.name):
+            if entry.is_file() and entry.name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
+                with open(entry.path, 'rb') as f:
+                    inputs.append((entry.name, f.read()))
+        return inputs[:count] if count else inputs
+
+    return [(f"synthetic_{w}x{h}_{i}", synthetic_jpeg(w, h, seed=i))
+            for w, h in resolutions for i in range(count or 1)]
+
+
+def time_mode(predictor, inputs, mode, repeat):
+    """Median ms per image for one preprocessing mode"""
+    buffer = np.empty((predictor.input_size, predictor.input_size, 3), dtype=np.uint8)
+    per_image = {}
+    for label, data in inputs:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            predictor.preprocess_image(data, out=buffer, mode=mode)
+            timings.append((time.perf_counter() - start) * 1000)
+        per_image[label] = float(np.median(timings))
+    return per_image
+
+
+def compare_outputs(predictor, inputs):
+    """Pixel-level and (optionally) top-1 agreement between the two paths"""
+    report = {'mean_abs_diff': [], 'max_abs_diff': []}
+    agreements = 0
+    for _, data in inputs:
+        fast = predictor.preprocess_image(data, mode='fast')
+        legacy = predictor.preprocess_image(data, mode='legacy')
+        diff = np.abs(normalize_batch(fast) - normalize_batch(legacy))
+        report['mean_abs_diff'].append(float(diff.mean()))
+        report['max_abs_diff'].append(float(diff.max()))
+        if predictor.model is not None:
+            probs = predictor.predict_probabilities(np.concatenate([fast, legacy]))
+            agreements += int(np.argmax(probs[0]) == np.argmax(probs[1]))
+
+    summary = {
+        'mean_abs_diff': float(np.mean(report['mean_abs_diff'])),
+        'max_abs_diff': float(np.max(report['max_abs_diff']))
+    }
+    if predictor.model is not None:
+        summary['top1_agreement'] = agreements / len(inputs)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fast vs legacy image preprocessing')
+    parser.add_argument('--images', help='Folder of real images (default: synthetic phone-size JPEGs)')
+    parser.add_argument('--count', type=int, default=3,
+                       help='Images per resolution (synthetic) or total images (folder)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per image')
+    parser.add_argument('--model', help='Also report top-1 agreement using this model')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    predictor = PaddyDiseasePredictor(args.model or "results/model.hdf5")
+    if args.model and not predictor.load_model():
+        sys.exit(1)
+
+    print("Preparing inputs...")
+    inputs = load_inputs(args.images, DEFAULT_RESOLUTIONS, args.count)
+    if not inputs:
+        print("No images to benchmark")
+        sys.exit(1)
+
+    results = {'images': len(inputs), 'repeat': args.repeat, 'modes': {}}
+    for mode in PREPROCESS_MODES:
+        per_image = time_mode(predictor, inputs, mode, args.repeat)
+        results['modes'][mode] = {
+            'ms_per_image': float(np.mean(list(per_image.values()))),
+            'per_image_ms': per_image
+        }
+    results['agreement'] = compare_outputs(predictor, inputs)
+
+    print(f"\n{'='*60}")
+    print("PREPROCESSING BENCHMARK")
+    print(f"{'='*60}")
+    for mode in PREPROCESS_MODES:
+        print(f"{mode:>8}: {results['modes'][mode]['ms_per_image']:8.2f} ms/image")
+    fast_ms = results['modes']['fast']['ms_per_image']
+    legacy_ms = results['modes']['legacy']['ms_per_image']
+    if fast_ms > 0:
+        print(f" speedup: {legacy_ms / fast_ms:8.2f}x")
+    agreement = results['agreement']
+    print(f"\nMean abs pixel diff: {agreement['mean_abs_diff']:.4f}")
+    print(f"Max abs pixel diff:  {agreement['max_abs_diff']:.4f}")
+    if 'top1_agreement' in agreement:
+        print(f"Top-1 agreement:     {agreement['top1_agreement']:.2%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Service Worker Precache Manifest
+Hashes the app shell, models and treatment files and writes
+static/precache-manifest.js, which the service worker uses to cache every
+file under a content-hashed key. Run it after changing any of these files.
+
+Usage:
+    python build_precache.py          # write static/precache-manifest.js
+    python build_precache.py --check  # exit non-zero if the manifest is stale
+"""
+
+import os
+import sys
+import glob
+import json
+import hashlib
+import argparse
+
+MANIFEST_PATH = 'static/precache-manifest.js'
+
+# Everything the app needs to start and diagnose offline
+PRECACHE_PATTERNS = [
+    'index.html',
+    'static/manifest.json',
+    'static/css/*.css',
+    'static/js/*.js',
+    'static/libs/*.js',
+    'static/icons/*.png',
+    'static/models/*.json',
+    'static/models/*.bin',
+    'data/treatments*.json'
+]
+
+# The worker scripts are update-checked by the browser itself
+EXCLUDED = {'static/sw.js', MANIFEST_PATH}
+
+
+def file_revision(path):
+    """Short SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def build_manifest(root='.'):
+    """
+    Collect precache entries
+
+    Returns:
+        tuple: (version, list of {'url', 'revision'} sorted by url)
+    """
+    paths = set()
+    for pattern in PRECACHE_PATTERNS:
+        for path in glob.glob(os.path.join(root, pattern)):
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            if relative not in EXCLUDED and os.path.isfile(path):
+                paths.add(relative)
+
+    entries = [{'url': path, 'revision': file_revision(os.path.join(root, path))} for path in sorted(paths)]
+    version = hashlib.sha256(json.dumps(entries).encode()).hexdigest()[:12]
+    return version, entries
+
+
+def render_manifest(version, entries):
+    lines = [
+        '// Generated by build_precache.py - do not edit by hand',
+        f"self.PRECACHE_VERSION = '{version}';",
+        'self.PRECACHE_MANIFEST = ['
+    ]
+    lines.append(',\n'.join(f"  {json.dumps(entry)}" for entry in entries))
+    lines.append('];')
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the service worker precache manifest')
+    parser.add_argument('--check', action='store_true', help='Only report whether the manifest is up to date')
+    args = parser.parse_args()
+
+    version, entries = build_manifest()
+    content = render_manifest(version, entries)
+
+    current = None
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            current = f.read()
+
+    if args.check:
+        if current != content:
+            print(f"{MANIFEST_PATH} is stale; run: python build_precache.py")
+            sys.exit(1)
+        print(f"{MANIFEST_PATH} is up to date (version {version})")
+        return
+
+    with open(MANIFEST_PATH, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(content)
+    total = sum(os.path.getsize(entry['url']) for entry in entries)
+    print(f"Wrote {MANIFEST_PATH}: {len(entries)} files, {total / 1024 / 1024:.2f} MB (version {version})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Compiled Inference Artifact
+Turns the Keras HDF5 model into a frozen, constant-folded inference graph
+with a fixed uint8 input signature (rescaling to [0, 1] happens inside the
+graph) and the penultimate-layer embedding as a second output, cached on
+disk under the source file's content hash. Loading it skips Keras model deserialization and graph
+tracing, which dominate cold start.
+
+Usage:
+    python compiled_model.py build --model results/model.hdf5
+    python compiled_model.py check --model results/model.hdf5
+"""
+
+import os
+# Suppress TensorFlow logging BEFORE importing TensorFlow
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+GRAPH_FILE = 'frozen_graph.pb'
+META_FILE = 'meta.json'
+INDEX_FILE = 'index.json'
+# Grappler passes applied at build time instead of at every process start
+OPTIMIZERS = ['constfold', 'arithmetic', 'dependency', 'function', 'remap', 'layout', 'pruning']
+
+_index_lock = threading.Lock()
+
+
+def default_cache_dir(model_path):
+    """results/model.hdf5 -> results/compiled"""
+    return os.path.join(os.path.dirname(os.path.abspath(model_path)), 'compiled')
+
+
+def source_hash(model_path, cache_dir=None):
+    """
+    Content hash of the source model
+
+    The hash is remembered in the cache's index.json against the file's size
+    and mtime, so a large model is only read again after it changes.
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    cache_dir = cache_dir or default_cache_dir(model_path)
+    stat = os.stat(model_path)
+    stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    key = os.path.abspath(model_path)
+
+    with _index_lock:
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        entry = index.get(key)
+        if entry and entry.get('stamp') == stamp:
+            return entry['sha256']
+
+        digest = hashlib.sha256()
+        with open(model_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        index[key] = {'stamp': stamp, 'sha256': digest.hexdigest()}
+
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = f"{index_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, indent=2)
+            os.replace(temp_path, index_path)
+        except OSError:
+            pass  # Read-only deploys just hash again next time
+        return index[key]['sha256']
+
+
+def artifact_path(model_path, cache_dir=None):
+    """Directory the artifact for this exact model content lives in"""
+    cache_dir = cache_dir or default_cache_dir(model_path)
+    return os.path.join(cache_dir, source_hash(model_path, cache_dir)[:16])
+
+
+def find_artifact(model_path, cache_dir=None):
+    """
+    Look up a usable artifact for a model file
+
+    Returns:
+        str or None: Artifact directory, or None if missing or built by
+            another TensorFlow version
+    """
+    cache_dir = cache_dir or default_cache_dir(model_path)
+    if not os.path.isfile(model_path) or not os.path.isdir(cache_dir):
+        return None
+    directory = artifact_path(model_path, cache_dir)
+    try:
+        with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('tf_version') != tf.__version__:
+        print(f"Ignoring compiled model built with TensorFlow {meta.get('tf_version')} "
+              f"(running {tf.__version__}); rebuild it with compiled_model.py build")
+        return None
+    return directory
+
+
+def optimize_graph(graph_def, input_names, output_names):
+    """Run grappler's constant folding and friends once, at build time"""
+    from tensorflow.core.protobuf import config_pb2, meta_graph_pb2
+    from tensorflow.python.grappler import tf_optimizer
+
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.compat.v1.import_graph_def(graph_def, name='')
+        meta_graph = tf.compat.v1.train.export_meta_graph(graph_def=graph.as_graph_def(), graph=graph)
+    # Grappler keeps anything listed in the train_op collection
+    fetch_collection = meta_graph_pb2.CollectionDef()
+    fetch_collection.node_list.value.extend(input_names + output_names)
+    meta_graph.collection_def['train_op'].CopyFrom(fetch_collection)
+
+    config = config_pb2.ConfigProto()
+    rewriter = config.graph_options.rewrite_options
+    rewriter.optimizers.extend(OPTIMIZERS)
+    rewriter.meta_optimizer_iterations = 2
+    return tf_optimizer.OptimizeGraph(config, meta_graph)
+
+
+def build_artifact(model_path='results/model.hdf5', cache_dir=None, input_size=256, force=False):
+    """
+    Freeze and optimize the Keras model (skipped when already built)
+
+    Args:
+        model_path (str): Keras HDF5 model
+        cache_dir (str): Artifact cache (default: 'compiled' next to the model)
+        input_size (int): Model input size; the batch dimension stays dynamic
+        force (bool): Rebuild even if an artifact for this content exists
+
+    Returns:
+        str: Artifact directory
+    """
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    if not os.path.isfile(model_path):
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+    cache_dir = cache_dir or default_cache_dir(model_path)
+    directory = artifact_path(model_path, cache_dir)
+    if not force and find_artifact(model_path, cache_dir) == directory:
+        with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('input_dtype') == 'uint8' and 'embedding_output' in meta:
+            print(f"Up to date: {directory}")
+            return directory
+        print(f"Rebuilding {directory} with a uint8 input signature and embedding output")
+
+    from predict_paddy_disease import with_embedding_output
+
+    start = time.perf_counter()
+    model = tf.keras.models.load_model(model_path, compile=False)
+    try:
+        # Outputs [probabilities, embedding]; the embedding costs nothing extra to expose
+        model = with_embedding_output(model)
+        has_embedding = True
+    except Exception as e:
+        print(f"Embedding output skipped: {e}")
+        has_embedding = False
+
+    # Fixed signature: uint8 NHWC pixels, any batch size; the [0, 1] rescale is part of the graph
+    signature = tf.TensorSpec([None, input_size, input_size, 3], tf.uint8, name='images')
+    inference = tf.function(lambda images: model(tf.cast(images, tf.float32) / 255.0, training=False),
+                            input_signature=[signature])
+    frozen = convert_variables_to_constants_v2(inference.get_concrete_function())
+    graph_def = frozen.graph.as_graph_def()
+    input_names = [tensor.name.split(':')[0] for tensor in frozen.inputs]
+    output_names = [tensor.name.split(':')[0] for tensor in frozen.outputs]
+
+    try:
+        graph_def = optimize_graph(graph_def, input_names, output_names)
+        optimized = True
+    except Exception as e:
+        # Still frozen; grappler then folds constants when the graph is first run
+        print(f"Graph optimization skipped: {e}")
+        optimized = False
+
+    meta = {
+        'source': os.path.abspath(model_path),
+        'source_sha256': source_hash(model_path, cache_dir),
+        'tf_version': tf.__version__,
+        'input': frozen.inputs[0].name,
+        'output': frozen.outputs[0].name,
+        'embedding_output': frozen.outputs[1].name if has_embedding else None,
+        'embedding_dim': int(frozen.outputs[1].shape[-1]) if has_embedding else None,
+        'input_shape': [None, input_size, input_size, 3],
+        'input_dtype': 'uint8',
+        'optimized': optimized,
+        'nodes': len(graph_def.node),
+        'build_seconds': round(time.perf_counter() - start, 2),
+        'built_at': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+    # Write into a staging directory and rename, so a partial build is never picked up
+    staging_dir = f"{directory}.{os.getpid()}.staging"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    with open(os.path.join(staging_dir, GRAPH_FILE), 'wb') as f:
+        f.write(graph_def.SerializeToString())
+    with open(os.path.join(staging_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging_dir, directory)
+
+    size = os.path.getsize(os.path.join(directory, GRAPH_FILE))
+    print(f"Wrote {directory} ({size / 1024 / 1024:.1f}MB, {meta['nodes']} nodes, {meta['build_seconds']}s)")
+    return directory
+
+
+class FrozenGraphModel:
+    def __init__(self, directory, embeddings=False):
+        """
+        Load a compiled artifact
+
+        Args:
+            directory (str): Output of build_artifact()
+            embeddings (bool): predict() returns [probabilities, embeddings],
+                like the two-output Keras model
+
+        Raises:
+            ValueError: Embeddings were asked for but the artifact has none
+        """
+        with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        graph_def = tf.compat.v1.GraphDef()
+        with open(os.path.join(directory, GRAPH_FILE), 'rb') as f:
+            graph_def.ParseFromString(f.read())
+
+        wrapped = tf.compat.v1.wrap_function(
+            lambda: tf.compat.v1.import_graph_def(graph_def, name=''), [])
+        self.directory = directory
+        # Artifacts from before the uint8 signature take float32 in [0, 1]
+        self.input_dtype = np.dtype(self.meta.get('input_dtype', 'float32')).type
+        outputs = wrapped.graph.as_graph_element(self.meta['output'])
+        self.embeddings = embeddings
+        if embeddings:
+            if not self.meta.get('embedding_output'):
+                raise ValueError('artifact has no embedding output; rebuild it with compiled_model.py build')
+            outputs = [outputs, wrapped.graph.as_graph_element(self.meta['embedding_output'])]
+        self._function = wrapped.prune(wrapped.graph.as_graph_element(self.meta['input']), outputs)
+
+    def predict(self, image_batch, verbose=0):
+        """
+        Run a batch through the frozen graph (same call as keras.Model.predict)
+
+        Returns:
+            np.ndarray or list: Output of shape (N, num_classes), or
+                [probabilities, embeddings (N, D)] with embeddings=True
+        """
+        batch = tf.convert_to_tensor(np.asarray(image_batch, dtype=self.input_dtype))
+        if self.embeddings:
+            return [output.numpy() for output in self._function(batch)]
+        return self._function(batch).numpy()
+
+
+def check_parity(model_path, cache_dir=None, samples=8, input_size=256):
+    """
+    Compare the artifact with the Keras model on random inputs
+
+    Returns:
+        dict: Samples, top-1 agreement and max probability difference
+    """
+    directory = find_artifact(model_path, cache_dir)
+    if directory is None:
+        raise FileNotFoundError(f"No compiled model for {model_path}; run: python compiled_model.py build")
+    reference = tf.keras.models.load_model(model_path, compile=False)
+    compiled = FrozenGraphModel(directory)
+
+    pixels = np.random.default_rng(0).integers(0, 256, (samples, input_size, input_size, 3), dtype=np.uint8)
+    expected = np.asarray(reference.predict(pixels.astype(np.float32) / 255.0, verbose=0))
+    actual = compiled.predict(pixels if compiled.input_dtype == np.uint8 else pixels / np.float32(255.0))
+    return {
+        'samples': samples,
+        'top1_agreement': float(np.mean(np.argmax(expected, axis=1) == np.argmax(actual, axis=1))),
+        'max_probability_diff': float(np.max(np.abs(expected - actual)))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and verify the compiled inference artifact')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(sub):
+        sub.add_argument('--model', default='results/model.hdf5', help='Keras HDF5 model')
+        sub.add_argument('--cache-dir', help='Artifact cache (default: compiled/ next to the model)')
+
+    build_parser = subparsers.add_parser('build', help='Freeze and optimize the model')
+    add_common(build_parser)
+    build_parser.add_argument('--force', action='store_true', help='Rebuild even if up to date')
+
+    check_parser = subparsers.add_parser('check', help='Compare the artifact with the Keras model')
+    add_common(check_parser)
+    check_parser.add_argument('--samples', type=int, default=8)
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            build_artifact(args.model, args.cache_dir, force=args.force)
+            return
+        report = check_parity(args.model, args.cache_dir, args.samples)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Top-1 agreement {report['top1_agreement']:.2%} over {report['samples']} inputs "
+          f"(max prob diff {report['max_probability_diff']:.6f})")
+    sys.exit(0 if report['top1_agreement'] == 1.0 else 1)
+
+
+if __name__ == "__main__":
+    main()
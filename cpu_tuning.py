@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+CPU Threading Autotuner
+Benchmarks oneDNN on/off, TensorFlow intra/inter-op threads, worker process
+count, core pinning and batch size on this host with the real model, and
+writes the fastest combination to a profile that app.py, gunicorn.conf.py
+and the prediction CLIs apply at startup.
+
+Every trial runs its workers as separate processes at the same time, as the
+pre-fork server would, and no combination gives the workers more compute
+threads than the cores this process may use.
+
+Usage:
+    python cpu_tuning.py tune --model results/model.hdf5
+    python cpu_tuning.py tune --max-latency-ms 300 --batch-sizes 1,4,8
+    python cpu_tuning.py show
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import platform
+import multiprocessing
+
+# Nothing here imports TensorFlow: apply_profile() must run before it is loaded
+
+DEFAULT_PROFILE_PATH = 'results/cpu_profile.json'
+DEFAULT_BATCH_SIZES = (1, 8, 16)
+TRIAL_LOAD_TIMEOUT = 300  # Seconds a trial worker may take to load and warm up
+
+_applied = None
+
+
+def profile_path():
+    """Profile location ($CPU_PROFILE, or results/cpu_profile.json; empty disables it)"""
+    return os.environ.get('CPU_PROFILE', DEFAULT_PROFILE_PATH)
+
+
+def available_cpus():
+    """
+    Cores this process may actually run on
+
+    Honours the CPU affinity mask (taskset, cpusets) and a cgroup v2 CPU
+    quota, both of which containers use to hand out fewer cores than
+    os.cpu_count() reports.
+
+    Returns:
+        int: Usable core count (at least 1)
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max', 'r') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def worker_cores(slot, workers, cores=None):
+    """
+    The block of cores worker number `slot` is pinned to
+
+    Returns:
+        list: Core ids, disjoint between slots while workers <= cores
+    """
+    cores = sorted(cores if cores is not None else os.sched_getaffinity(0))
+    share = max(1, len(cores) // max(1, workers))
+    start = (slot * share) % len(cores)
+    return cores[start:start + share]
+
+
+def pin_worker(slot, workers):
+    """
+    Restrict the calling process to its block of cores (Linux only)
+
+    Returns:
+        list or None: The cores, or None where affinity is not supported
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        return None
+    cores = worker_cores(slot, workers)
+    os.sched_setaffinity(0, cores)
+    return cores
+
+
+def fit_to_cores(settings, workers, cpus=None):
+    """
+    Cap a profile's thread counts for the number of workers actually running
+
+    Args:
+        settings (dict): Profile settings
+        workers (int): Worker processes sharing the host
+        cpus (int): Usable cores (default: available_cpus())
+
+    Returns:
+        dict: Copy of the settings with workers * intra_op_threads <= cpus
+    """
+    cpus = cpus or available_cpus()
+    workers = max(1, int(workers))
+    fitted = dict(settings, workers=workers)
+    fitted['intra_op_threads'] = max(1, min(int(settings['intra_op_threads']), cpus // workers))
+    fitted['inter_op_threads'] = max(1, int(settings['inter_op_threads']))
+    # Pinning needs a whole core per worker
+    fitted['pin_workers'] = bool(settings.get('pin_workers')) and workers <= cpus
+    return fitted
+
+
+def load_profile(path=None):
+    """
+    Read a tuning profile
+
+    Returns:
+        dict or None: The profile, or None if there is none (or it is unreadable)
+    """
+    path = profile_path() if path is None else path
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+        if 'intra_op_threads' not in profile['settings']:
+            raise ValueError('no tuned settings')
+        return profile
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring CPU profile {path}: {e}")
+        return None
+
+
+def apply_profile(workers=None, path=None):
+    """
+    Export the tuned settings as environment defaults (before TensorFlow is imported)
+
+    Variables that are already set win, so TF_INTRA_OP_THREADS=4 still
+    overrides the profile. Repeated calls return the first result.
+
+    Args:
+        workers (int): Worker processes on this host (default: $WEB_CONCURRENCY,
+            else the profile's worker count)
+        path (str): Profile file (default: profile_path())
+
+    Returns:
+        dict or None: Effective settings, or None without a profile
+    """
+    global _applied
+    if _applied is not None:
+        return _applied
+
+    profile = load_profile(path)
+    if profile is None:
+        return None
+
+    cpus = available_cpus()
+    tuned_cpus = profile.get('host', {}).get('cpus')
+    if tuned_cpus and tuned_cpus != cpus:
+        print(f"CPU profile was tuned on {tuned_cpus} cores but {cpus} are available; "
+              f"rerun: python cpu_tuning.py tune")
+    workers = workers or int(os.environ.get('WEB_CONCURRENCY', 0)) or profile['settings'].get('workers', 1)
+    settings = fit_to_cores(profile['settings'], workers, cpus)
+
+    os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '1' if settings.get('onednn') else '0')
+    os.environ.setdefault('TF_INTRA_OP_THREADS', str(settings['intra_op_threads']))
+    os.environ.setdefault('TF_INTER_OP_THREADS', str(settings['inter_op_threads']))
+    os.environ.setdefault('PIN_WORKERS', '1' if settings['pin_workers'] else '0')
+    if settings.get('batch_size'):
+        os.environ.setdefault('BATCH_MAX_SIZE', str(settings['batch_size']))
+    _applied = settings
+    return settings
+
+
+def candidate_configs(cpus, worker_counts=None, onednn_options=(False, True), inter_options=(1, 2)):
+    """
+    Process-level combinations to try (batch sizes are swept inside each trial)
+
+    Returns:
+        list: Settings dicts, none of which oversubscribes `cpus`
+    """
+    worker_counts = worker_counts or sorted({1, max(1, cpus // 2), cpus})
+    can_pin = hasattr(os, 'sched_setaffinity')
+    configs = []
+    for workers in worker_counts:
+        per_worker = cpus // workers
+        if per_worker < 1:
+            continue
+        for onednn, intra, inter in itertools.product(onednn_options, sorted({per_worker, max(1, per_worker // 2)}),
+                                                      inter_options):
+            for pin in ((False, True) if can_pin and workers > 1 else (False,)):
+                configs.append({'onednn': onednn, 'workers': workers, 'intra_op_threads': intra,
+                                'inter_op_threads': inter, 'pin_workers': pin})
+    return configs
+
+
+def _trial_worker(slot, config, model_path, batch_sizes, duration, barrier, results):
+    """One server worker: load the model with the config, then time each batch size"""
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+    os.environ['TF_ENABLE_ONEDNN_OPTS'] = '1' if config['onednn'] else '0'
+    os.environ['CPU_PROFILE'] = ''  # Measure this config, not the saved profile
+    try:
+        if config['pin_workers']:
+            pin_worker(slot, config['workers'])
+
+        import numpy as np
+        import tensorflow as tf
+        from predict_paddy_disease import PaddyDiseasePredictor, configure_tf_threads
+
+        configure_tf_threads(config['intra_op_threads'], config['inter_op_threads'])
+        predictor = PaddyDiseasePredictor(model_path)
+        if not predictor.load_model():
+            raise RuntimeError(f"Could not load {model_path}")
+        predictor.warmup(batch_sizes)
+
+        rng = np.random.default_rng(slot)
+        latencies = {}
+        for batch_size in batch_sizes:
+            batch = predictor.batch_buffer(batch_size)
+            batch[...] = rng.integers(0, 256, batch.shape, dtype=np.uint8)
+            # All workers start each measurement together, as under real load
+            barrier.wait(TRIAL_LOAD_TIMEOUT)
+            samples = []
+            end = time.perf_counter() + duration
+            while time.perf_counter() < end:
+                start = time.perf_counter()
+                predictor.predict_probabilities(batch)
+                samples.append(time.perf_counter() - start)
+            latencies[batch_size] = samples
+        results.put((slot, {'latencies': latencies, 'tf_version': tf.__version__}))
+    except Exception as e:
+        barrier.abort()
+        results.put((slot, {'error': f"{type(e).__name__}: {e}"}))
+
+
+def run_trial(config, model_path, batch_sizes, duration):
+    """
+    Run one process-level config with all its workers at once
+
+    Returns:
+        list: One result dict per batch size (throughput and latency percentiles),
+            or a single {'error'} dict
+    """
+    context = multiprocessing.get_context('spawn')  # Fresh interpreters: oneDNN is read at TF import
+    barrier = context.Barrier(config['workers'])
+    results = context.Queue()
+    processes = [context.Process(target=_trial_worker, daemon=True,
+                                 args=(slot, config, model_path, batch_sizes, duration, barrier, results))
+                 for slot in range(config['workers'])]
+    for process in processes:
+        process.start()
+
+    reports = {}
+    timeout = TRIAL_LOAD_TIMEOUT + duration * len(batch_sizes) * 2
+    try:
+        for _ in processes:
+            slot, report = results.get(timeout=timeout)
+            reports[slot] = report
+    except Exception:
+        reports.setdefault(-1, {'error': 'Trial timed out'})
+    for process in processes:
+        process.join(5)
+        if process.is_alive():
+            process.terminate()
+
+    errors = [report['error'] for report in reports.values() if 'error' in report]
+    if errors:
+        return [dict(config, error=errors[0])]
+
+    trial = []
+    for batch_size in batch_sizes:
+        samples = sorted(sample for report in reports.values() for sample in report['latencies'][batch_size])
+        images = len(samples) * batch_size
+        trial.append(dict(config,
+                          batch_size=batch_size,
+                          images_per_second=round(images / duration, 2),
+                          p50_ms=round(samples[len(samples) // 2] * 1000, 2),
+                          p95_ms=round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 2),
+                          tf_version=next(iter(reports.values()))['tf_version']))
+    return trial
+
+
+def pick_best(trials, max_latency_ms=None):
+    """
+    Highest throughput among trials within the latency budget
+
+    Returns:
+        dict or None: The winning trial
+    """
+    usable = [trial for trial in trials if 'error' not in trial]
+    if max_latency_ms:
+        usable = [trial for trial in usable if trial['p95_ms'] <= max_latency_ms]
+    if not usable:
+        return None
+    return max(usable, key=lambda trial: (trial['images_per_second'], -trial['p95_ms']))
+
+
+def tune(model_path, output, batch_sizes=DEFAULT_BATCH_SIZES, duration=5.0, worker_counts=None,
+         max_latency_ms=None, onednn_options=(False, True), inter_options=(1, 2)):
+    """
+    Benchmark every candidate and write the profile
+
+    Returns:
+        dict or None: The profile, or None if no trial succeeded
+    """
+    cpus = available_cpus()
+    configs = candidate_configs(cpus, worker_counts, onednn_options, inter_options)
+    print(f"Tuning on {cpus} cores: {len(configs)} process configs x {len(batch_sizes)} batch sizes, "
+          f"{duration:g}s each")
+
+    trials = []
+    for number, config in enumerate(configs, 1):
+        label = (f"oneDNN {'on ' if config['onednn'] else 'off'}  workers {config['workers']:<3}"
+                 f"intra {config['intra_op_threads']:<3}inter {config['inter_op_threads']:<2}"
+                 f"{'pinned' if config['pin_workers'] else '      '}")
+        for result in run_trial(config, model_path, batch_sizes, duration):
+            trials.append(result)
+            if 'error' in result:
+                print(f"[{number}/{len(configs)}] {label}  failed: {result['error']}")
+            else:
+                print(f"[{number}/{len(configs)}] {label}  batch {result['batch_size']:<3}"
+                      f"{result['images_per_second']:>8.1f} img/s  p95 {result['p95_ms']:.1f}ms")
+
+    best = pick_best(trials, max_latency_ms)
+    if best is None:
+        print("No configuration succeeded" + (" within the latency budget" if max_latency_ms else ""))
+        return None
+
+    settings = {key: best[key] for key in ('onednn', 'workers', 'intra_op_threads', 'inter_op_threads',
+                                           'pin_workers', 'batch_size')}
+    profile = {
+        'settings': settings,
+        'images_per_second': best['images_per_second'],
+        'p95_ms': best['p95_ms'],
+        'max_latency_ms': max_latency_ms,
+        'host': {'cpus': cpus, 'cpu_count': os.cpu_count(), 'machine': platform.machine(),
+                 'processor': platform.processor(), 'tf_version': best['tf_version']},
+        'model': os.path.abspath(model_path),
+        'tuned_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'trials': trials
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    temp_path = f"{output}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=2)
+    os.replace(temp_path, output)
+    return profile
+
+
+def print_profile(profile):
+    settings = profile['settings']
+    print(f"oneDNN:            {'on' if settings['onednn'] else 'off'}")
+    print(f"Workers:           {settings['workers']}{' (pinned to cores)' if settings['pin_workers'] else ''}")
+    print(f"Intra-op threads:  {settings['intra_op_threads']}")
+    print(f"Inter-op threads:  {settings['inter_op_threads']}")
+    print(f"Batch size:        {settings['batch_size']}")
+    print(f"Throughput:        {profile['images_per_second']:.1f} images/sec (p95 {profile['p95_ms']:.1f}ms)")
+    print(f"Tuned:             {profile['tuned_at']} on {profile['host']['cpus']} cores")
+
+
+def parse_ints(text):
+    return [int(value) for value in text.split(',') if value.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune CPU threading for this host and model')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    tune_parser = subparsers.add_parser('tune', help='Benchmark configurations and write the profile')
+    tune_parser.add_argument('--model', default='results/model.hdf5', help='Model to tune for')
+    tune_parser.add_argument('--output', default=profile_path() or DEFAULT_PROFILE_PATH,
+                             help=f'Profile to write (default: $CPU_PROFILE or {DEFAULT_PROFILE_PATH})')
+    tune_parser.add_argument('--batch-sizes', type=parse_ints, default=list(DEFAULT_BATCH_SIZES),
+                             help='Comma-separated batch sizes (default: 1,8,16)')
+    tune_parser.add_argument('--workers', type=parse_ints,
+                             help='Comma-separated worker counts (default: 1, half and all cores)')
+    tune_parser.add_argument('--duration', type=float, default=5.0, help='Seconds per measurement (default: 5)')
+    tune_parser.add_argument('--max-latency-ms', type=float,
+                             help='Only pick configurations whose p95 batch latency is below this')
+    tune_parser.add_argument('--onednn', choices=('both', 'on', 'off'), default='both',
+                             help='oneDNN settings to try (default: both)')
+
+    show_parser = subparsers.add_parser('show', help='Print the current profile')
+    show_parser.add_argument('--profile', default=profile_path() or DEFAULT_PROFILE_PATH)
+
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        profile = load_profile(args.profile)
+        if profile is None:
+            print(f"No CPU profile at {args.profile}; run: python cpu_tuning.py tune")
+            sys.exit(1)
+        print_profile(profile)
+        return
+
+    if not os.path.exists(args.model):
+        print(f"Model file not found: {args.model}")
+        sys.exit(1)
+    onednn_options = {'both': (False, True), 'on': (True,), 'off': (False,)}[args.onednn]
+    profile = tune(args.model, args.output, args.batch_sizes, args.duration, args.workers,
+                   args.max_latency_ms, onednn_options)
+    if profile is None:
+        sys.exit(1)
+    print(f"\nWrote {args.output}")
+    print_profile(profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+MyPadiCare - Pre-fork production server configuration
+Run with: gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master process and then forked into
+WEB_CONCURRENCY workers, so Flask, NumPy and the TensorFlow libraries are
+shared copy-on-write. With MODEL_BACKEND=tflite the interpreter (over a
+memory-mapped model file, TF_INTRA_OP_THREADS threads) is also loaded
+before the fork. The Keras runtime starts thread pools that do not
+survive fork(), so with the Keras backend each worker loads the model in a
+background thread right after it is forked; until it is ready, /readyz
+returns 503 and predictions get a "warming up" response.
+
+With a profile from "python cpu_tuning.py tune", the worker count, thread
+pools, oneDNN and core pinning come from it unless set in the environment.
+"""
+
+import os
+import shutil
+import tempfile
+
+from cpu_tuning import apply_profile, available_cpus, pin_worker
+from metrics import retire_worker
+
+# Cores in this container (affinity mask and CPU quota), not the host's
+cpu_count = available_cpus()
+tuned = apply_profile()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', tuned['workers'] if tuned else cpu_count))
+
+# Load shedding. Each thread carries one request into the app, where admission control lets
+# MAX_IN_FLIGHT predictions run and MAX_QUEUED more wait (with their deadline); requests beyond
+# that get a quick 503 from one of the SPARE_THREADS. The limits are per worker and default to
+# what the threads can actually deliver, so the queue and the 503 are reachable
+SPARE_THREADS = 2
+batch_max_size = int(os.environ.get('BATCH_MAX_SIZE', 8))
+threads = int(os.environ.get('GUNICORN_THREADS', 2 * batch_max_size + SPARE_THREADS))
+admitted = max(1, threads - SPARE_THREADS)
+os.environ.setdefault('MAX_IN_FLIGHT', str(min(batch_max_size, admitted)))
+os.environ.setdefault('MAX_QUEUED', str(max(0, admitted - int(os.environ['MAX_IN_FLIGHT']))))
+if int(os.environ['MAX_IN_FLIGHT']) + int(os.environ['MAX_QUEUED']) >= threads:
+    print(f"MAX_IN_FLIGHT + MAX_QUEUED >= {threads} threads per worker; requests will wait in "
+          f"gunicorn instead of getting a 503")
+# The micro-batch scheduler only groups requests that hold an admission slot, so a batch never
+# grows past MAX_IN_FLIGHT; a larger BATCH_MAX_SIZE would only warm up a shape that never runs
+if batch_max_size > int(os.environ['MAX_IN_FLIGHT']):
+    print(f"BATCH_MAX_SIZE={batch_max_size} exceeds MAX_IN_FLIGHT={os.environ['MAX_IN_FLIGHT']} "
+          f"({threads} threads per worker); using {os.environ['MAX_IN_FLIGHT']}")
+    os.environ['BATCH_MAX_SIZE'] = os.environ['MAX_IN_FLIGHT']
+# Stop accepting once every thread is busy (the few extra slots hold idle keep-alive connections),
+# so nothing waits in gunicorn's unbounded thread-pool queue. New connections wait in the listen
+# backlog instead, which the spare threads drain quickly with 503s; beyond it they are refused
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', threads + SPARE_THREADS))
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 4 * workers * threads))
+worker_class = 'gthread'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = True
+
+# Split the cores between workers so N workers never oversubscribe the CPU
+os.environ.setdefault('TF_INTRA_OP_THREADS', str(max(1, cpu_count // workers)))
+os.environ.setdefault('TF_INTER_OP_THREADS', '1')
+if int(os.environ['TF_INTRA_OP_THREADS']) > max(1, cpu_count // workers):
+    print(f"TF_INTRA_OP_THREADS={os.environ['TF_INTRA_OP_THREADS']} x {workers} workers exceeds "
+          f"{cpu_count} cores; using {max(1, cpu_count // workers)}")
+    os.environ['TF_INTRA_OP_THREADS'] = str(max(1, cpu_count // workers))
+# Give each worker its own block of cores (the tuned profile turns this on when it helps)
+pin_workers = os.environ.get('PIN_WORKERS', '0') == '1' and workers <= cpu_count
+os.environ.setdefault('PRELOAD_MODEL', '1' if os.environ.get('MODEL_BACKEND') == 'tflite' else '0')
+# A preload in the master must finish before forking, so it cannot run in a thread
+os.environ.setdefault('BACKGROUND_LOAD', '0')
+# Workers share one socket, so a scrape lands on any of them; each writes its metrics here
+# and /metrics reports the sum over all workers
+metrics_dir = os.environ.setdefault(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), f"mypadicare-metrics-{os.environ.get('PORT', 5000)}"))
+
+
+def on_starting(server):
+    """Start the counters from zero, like a single process would"""
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def pre_fork(server, worker):
+    """Assign the new worker the lowest core block no live worker holds"""
+    taken = {getattr(other, 'cpu_slot', None) for other in server.WORKERS.values()}
+    worker.cpu_slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    if pin_workers:
+        cores = pin_worker(worker.cpu_slot, workers)
+        server.log.info(f"Worker {worker.pid} pinned to cores {cores}")
+
+
+def child_exit(server, worker):
+    """A replaced worker's counters stay in the totals; its gauges no longer count"""
+    retire_worker(metrics_dir, worker.pid)
+
+
+def post_worker_init(worker):
+    """Load the model in each worker when it was not loaded before the fork"""
+    import app
+
+    if not app.model_ready.is_set():
+        # Load in the background so the worker answers /healthz while warming up
+        app.start_background_load()
@@ -0,0 +1,295 @@
+"""
+Metrics
+Minimal thread-safe counters, gauges and histograms rendered in the
+Prometheus text exposition format, plus a timing summary for the CLI
+
+Under a pre-fork server every worker counts on its own. With a shared
+multiprocess_dir each worker writes a snapshot of its metrics there about
+once a second, and /metrics on any worker renders the sum over all of
+them (counters of exited workers included, gauges of live workers only).
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+import contextlib
+
+import numpy as np
+
+# Seconds; covers cache hits (sub-millisecond) up to slow cold inferences
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+SNAPSHOT_SECONDS = 1.0  # How stale other workers' numbers may be in a multiprocess scrape
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merged(self, snapshots):
+        """A copy holding the sum of several workers' snapshots"""
+        total = Counter(self.name, self.documentation, self.labelnames)
+        for snapshot in snapshots:
+            for key, value in snapshot:
+                key = tuple(key)
+                total._values[key] = total._values.get(key, 0) + value
+        return total
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0)]
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, documentation, callback=None):
+        """
+        Args:
+            callback (callable): Called at render time for the current value
+        """
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    def snapshot(self):
+        return self.callback() if self.callback else self._value
+
+    def merged(self, snapshots):
+        total = Gauge(self.name, self.documentation)
+        total.set(sum(snapshots))
+        return total
+
+    def render(self):
+        value = self.snapshot()
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge',
+                f'{self.name} {_format_value(value)}']
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), list(series)] for key, series in self._series.items()]
+
+    def merged(self, snapshots):
+        total = Histogram(self.name, self.documentation, self.labelnames, self.buckets)
+        for snapshot in snapshots:
+            for key, series in snapshot:
+                key = tuple(key)
+                current = total._series.get(key)
+                total._series[key] = series if current is None else [a + b for a, b in zip(current, series)]
+        return total
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = _format_labels(self.labelnames, key, ('le', '+Inf'))
+            lines.append(f'{self.name}_bucket{labels} {series[-1]}')
+            plain = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{plain} {_format_value(float(series[-2]))}')
+            lines.append(f'{self.name}_count{plain} {series[-1]}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, prefix='mypadicare', multiprocess_dir=None):
+        """
+        Args:
+            prefix (str): Prepended to every metric name
+            multiprocess_dir (str): Directory shared by all worker processes;
+                render() then reports the whole server, not one worker
+        """
+        self.prefix = prefix
+        self.multiprocess_dir = multiprocess_dir
+        self._metrics = []
+        self._writer_pid = None
+        self._writer_lock = threading.Lock()
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(f'{self.prefix}_{name}', documentation, labelnames))
+
+    def gauge(self, name, documentation, callback=None):
+        return self._register(Gauge(f'{self.prefix}_{name}', documentation, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(f'{self.prefix}_{name}', documentation, labelnames, buckets))
+
+    def ensure_writer(self):
+        """Start writing this process's snapshots (lazily, and again after a fork)"""
+        if not self.multiprocess_dir or self._writer_pid == os.getpid():
+            return
+        with self._writer_lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+            os.makedirs(self.multiprocess_dir, exist_ok=True)
+            threading.Thread(target=self._write_loop, name='metrics-writer', daemon=True).start()
+            # Counts since the last snapshot survive a graceful worker exit
+            atexit.register(self.write_snapshot)
+
+    def _write_loop(self):
+        while True:
+            time.sleep(SNAPSHOT_SECONDS)
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                print(f"Error writing metrics snapshot: {e}")
+
+    def write_snapshot(self):
+        """Write this process's metrics to worker_<pid>.json in the shared directory"""
+        path = os.path.join(self.multiprocess_dir, f'worker_{os.getpid()}.json')
+        data = {metric.name: metric.snapshot() for metric in self._metrics}
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    def _read_snapshots(self):
+        """(live, metrics) for every worker that wrote a snapshot"""
+        snapshots = []
+        for name in os.listdir(self.multiprocess_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.multiprocess_dir, name), 'r') as f:
+                    snapshots.append((name.startswith('worker_'), json.load(f)))
+            except (OSError, ValueError):
+                continue  # Replaced or removed while listing
+        return snapshots
+
+    def render(self):
+        """
+        Render every metric in Prometheus text format
+
+        Returns:
+            str: Exposition text (summed over all workers with a multiprocess_dir)
+        """
+        metrics = self._metrics
+        if self.multiprocess_dir:
+            self.ensure_writer()
+            # Our own numbers are current; other workers' are at most SNAPSHOT_SECONDS old
+            self.write_snapshot()
+            snapshots = self._read_snapshots()
+            metrics = [metric.merged([data[metric.name] for live, data in snapshots
+                                      if metric.name in data and (live or not isinstance(metric, Gauge))])
+                       for metric in metrics]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def retire_worker(multiprocess_dir, pid):
+    """
+    After a worker exits: keep its counters and histograms in the totals
+    but stop reporting its gauges (gunicorn child_exit hook)
+    """
+    path = os.path.join(multiprocess_dir, f'worker_{pid}.json')
+    try:
+        os.replace(path, os.path.join(multiprocess_dir, f'exited_{pid}_{time.time_ns()}.json'))
+    except OSError:
+        pass
+
+
+def timing_summary(timings):
+    """
+    Format per-stage timings for the CLI
+
+    Args:
+        timings (dict): Stage name -> list of durations in seconds
+
+    Returns:
+        list: Printable lines with total, mean, p50, p95 and max in ms
+    """
+    lines = [f"{'Stage':<14}{'Count':>8}{'Total s':>10}{'Mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'Max ms':>10}"]
+    for stage, values in timings.items():
+        if not values:
+            continue
+        ms = np.asarray(values) * 1000
+        lines.append(f"{stage:<14}{len(ms):>8}{ms.sum() / 1000:>10.2f}{ms.mean():>10.2f}"
+                     f"{np.percentile(ms, 50):>10.2f}{np.percentile(ms, 95):>10.2f}{ms.max():>10.2f}")
+    return lines
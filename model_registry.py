@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Model Registry
+Versioned model artifacts in one directory, with an active-version pointer
+that running servers watch so a new model can be swapped in (or rolled
+back) without a restart.
+
+Layout:
+    models/
+        registry.json           {"active": "v2", "history": ["v1"]}
+        v1/model.hdf5
+        v2/model.hdf5
+
+Usage:
+    python model_registry.py publish results/model.hdf5 --version 2024-06-rice
+    python model_registry.py list
+    python model_registry.py activate 2024-06-rice
+    python model_registry.py rollback
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+
+STATE_FILE = 'registry.json'
+MODEL_EXTENSIONS = ('.hdf5', '.h5', '.keras', '.tflite')
+VERSION_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$')
+MAX_HISTORY = 20
+
+
+class ModelRegistry:
+    def __init__(self, root='models'):
+        """
+        Initialize the registry
+
+        Args:
+            root (str): Directory holding one sub-directory per version
+        """
+        self.root = root
+        self._lock = threading.Lock()
+
+    @property
+    def state_path(self):
+        return os.path.join(self.root, STATE_FILE)
+
+    def exists(self):
+        return os.path.isdir(self.root)
+
+    def _read_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        return {'active': state.get('active'), 'history': list(state.get('history', []))}
+
+    def _write_state(self, state):
+        # Write then rename, so a watching server never reads half a file
+        os.makedirs(self.root, exist_ok=True)
+        temp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, self.state_path)
+
+    def active_version(self):
+        """
+        Returns:
+            str or None: The version servers should run
+        """
+        return self._read_state()['active']
+
+    def history(self):
+        """Previously active versions, most recent last"""
+        return self._read_state()['history']
+
+    def model_path(self, version):
+        """
+        Locate the model artifact of a version
+
+        Returns:
+            str: Model file, or the version directory itself for a SavedModel
+
+        Raises:
+            KeyError: The version does not exist or holds no model
+        """
+        directory = os.path.join(self.root, version)
+        if not VERSION_PATTERN.match(version) or not os.path.isdir(directory):
+            raise KeyError(f"Unknown model version: {version}")
+        if os.path.exists(os.path.join(directory, 'saved_model.pb')):
+            return directory
+        # Prefer the Keras artifact; the .tflite variants converted next to it come second
+        for extension in MODEL_EXTENSIONS:
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(extension) and os.path.isfile(os.path.join(directory, name)):
+                    return os.path.join(directory, name)
+        raise KeyError(f"No model file in version: {version}")
+
+    def versions(self):
+        """
+        List every published version
+
+        Returns:
+            list: {'version', 'path', 'size', 'published_at', 'active'} dicts, oldest first
+        """
+        if not self.exists():
+            return []
+        active = self.active_version()
+        versions = []
+        for name in os.listdir(self.root):
+            if not os.path.isdir(os.path.join(self.root, name)) or name.startswith('.'):
+                continue
+            try:
+                path = self.model_path(name)
+            except KeyError:
+                continue
+            stat = os.stat(path)
+            versions.append({
+                'version': name,
+                'path': path,
+                'size': stat.st_size if os.path.isfile(path) else None,
+                'published_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stat.st_mtime)),
+                'mtime': stat.st_mtime,
+                'active': name == active
+            })
+        versions.sort(key=lambda entry: entry.pop('mtime'))
+        return versions
+
+    def activate(self, version):
+        """
+        Point servers at a version (the current one is kept for rollback)
+
+        Returns:
+            str: The previously active version
+
+        Raises:
+            KeyError: The version does not exist
+        """
+        self.model_path(version)
+        with self._lock:
+            state = self._read_state()
+            previous = state['active']
+            if previous == version:
+                return previous
+            if previous:
+                state['history'] = (state['history'] + [previous])[-MAX_HISTORY:]
+            state['active'] = version
+            self._write_state(state)
+            return previous
+
+    def rollback(self):
+        """
+        Re-activate the version that was active before the current one
+
+        Returns:
+            str: The version now active
+
+        Raises:
+            LookupError: There is nothing to roll back to
+        """
+        with self._lock:
+            state = self._read_state()
+            while state['history']:
+                version = state['history'].pop()
+                try:
+                    self.model_path(version)
+                except KeyError:
+                    continue  # Deleted since; skip it
+                state['active'] = version
+                self._write_state(state)
+                return version
+            raise LookupError('No previous model version to roll back to')
+
+    def publish(self, source_path, version=None, activate=False):
+        """
+        Copy a model artifact into a new version directory
+
+        Args:
+            source_path (str): Model file or SavedModel directory
+            version (str): Version name (default: a timestamp)
+            activate (bool): Make it the active version
+
+        Returns:
+            str: The new version name
+        """
+        if not os.path.exists(source_path):
+            raise FileNotFoundError(f"Model file not found: {source_path}")
+        version = version or time.strftime('%Y%m%d-%H%M%S')
+        if not VERSION_PATTERN.match(version):
+            raise ValueError(f"Invalid version name: {version}")
+
+        target_dir = os.path.join(self.root, version)
+        if os.path.exists(target_dir):
+            raise ValueError(f"Version already exists: {version}")
+
+        # Copy into a staging directory and rename, so a half-copied version is never visible
+        staging_dir = os.path.join(self.root, f".{version}.staging")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        if os.path.isdir(source_path):
+            shutil.copytree(source_path, staging_dir)
+        else:
+            os.makedirs(staging_dir)
+            shutil.copy2(source_path, os.path.join(staging_dir, os.path.basename(source_path)))
+        os.replace(staging_dir, target_dir)
+
+        if activate:
+            self.activate(version)
+        return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage versioned model artifacts')
+    parser.add_argument('--root', default=os.environ.get('MODEL_REGISTRY_DIR', 'models'),
+                        help='Registry directory (default: $MODEL_REGISTRY_DIR or models)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    publish_parser = subparsers.add_parser('publish', help='Add a model as a new version')
+    publish_parser.add_argument('model', help='Model file or SavedModel directory')
+    publish_parser.add_argument('--version', help='Version name (default: timestamp)')
+    publish_parser.add_argument('--activate', action='store_true', help='Serve it right away')
+
+    subparsers.add_parser('list', help='List versions')
+
+    activate_parser = subparsers.add_parser('activate', help='Serve a version')
+    activate_parser.add_argument('version')
+
+    subparsers.add_parser('rollback', help='Serve the previously active version again')
+
+    args = parser.parse_args()
+    registry = ModelRegistry(args.root)
+
+    try:
+        if args.command == 'publish':
+            version = registry.publish(args.model, args.version, activate=args.activate)
+            print(f"Published {version}" + (" (active)" if args.activate else ""))
+        elif args.command == 'list':
+            versions = registry.versions()
+            if not versions:
+                print(f"No versions in {args.root}")
+            for entry in versions:
+                size = f"{entry['size'] / 1024 / 1024:.1f} MB" if entry['size'] is not None else 'SavedModel'
+                marker = '*' if entry['active'] else ' '
+                print(f"{marker} {entry['version']:<28}{size:>12}  {entry['published_at']}")
+        elif args.command == 'activate':
+            previous = registry.activate(args.version)
+            print(f"Active: {args.version} (was {previous})")
+        else:
+            print(f"Active: {registry.rollback()}")
+    except (KeyError, LookupError, ValueError, FileNotFoundError) as e:
+        print(f"Error: {e.args[0] if e.args else e}")
+        sys.exit(1)
+
+    if args.command in ('activate', 'rollback'):
+        print("Running servers pick this up within MODEL_WATCH_SECONDS")
+
+
+if __name__ == "__main__":
+    main()
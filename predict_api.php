@@ -19,12 +19,52 @@ $UPLOAD_DIR = 'uploads/';
 $MAX_FILE_SIZE = 16 * 1024 * 1024; // 16MB
 $ALLOWED_EXTENSIONS = ['jpg', 'jpeg', 'png', 'gif', 'bmp'];
 $PYTHON_SCRIPT = 'predict_single.py';
+// Persistent prediction daemon (python prediction_daemon.py); falls back to the script when it is not running.
+// Same setting as the daemon: 'host:port' or 'unix:/path/to/socket'
+$DAEMON_ADDRESS = getenv('PADDY_DAEMON_ADDRESS') ?: '127.0.0.1:8765';
+$DAEMON_TIMEOUT = 30;
 
 // Ensure upload directory exists
 if (!is_dir($UPLOAD_DIR)) {
     mkdir($UPLOAD_DIR, 0755, true);
 }
 
+/**
+ * Stream socket URI for a daemon address ('host:port' or 'unix:/path'), parsed like prediction_daemon.py
+ */
+function daemon_socket_uri($address) {
+    if (strpos($address, 'unix:') === 0) {
+        return 'unix://' . substr($address, strlen('unix:'));
+    }
+    $colon = strrpos($address, ':');
+    $host = $colon === false ? '' : substr($address, 0, $colon);
+    $port = (int)substr($address, $colon === false ? 0 : $colon + 1);
+    return 'tcp://' . ($host !== '' ? $host : '127.0.0.1') . ':' . $port;
+}
+
+/**
+ * Send one JSON request to the prediction daemon
+ * Returns the decoded response, or null if the daemon is not reachable
+ */
+function daemon_request($payload) {
+    global $DAEMON_ADDRESS, $DAEMON_TIMEOUT;
+    
+    $socket = @stream_socket_client(daemon_socket_uri($DAEMON_ADDRESS), $errno, $errstr, 0.5);
+    if (!$socket) {
+        return null;
+    }
+    stream_set_timeout($socket, $DAEMON_TIMEOUT);
+    fwrite($socket, json_encode($payload) . "\n");
+    $line = fgets($socket);
+    fclose($socket);
+    
+    if ($line === false) {
+        return null;
+    }
+    $result = json_decode($line, true);
+    return (json_last_error() === JSON_ERROR_NONE) ? $result : null;
+}
+
 /**
  * Handle health check
  */
@@ -41,6 +81,7 @@ if ($_SERVER['REQUEST_METHOD'] == 'GET' && isset($_GET['action']) && $_GET['acti
         'model_path' => $model_path,
         'model_size' => $model_exists ? filesize($model_path) : 0,
         'python_script' => $python_exists,
+        'daemon_running' => daemon_request(['action' => 'health']) !== null,
         'treatments_loaded' => $treatments_exist,
         'timestamp' => date('Y-m-d H:i:s')
     ]);
@@ -79,44 +120,42 @@ if ($_SERVER['REQUEST_METHOD'] == 'POST') {
             throw new Exception('Failed to save uploaded file');
         }
         
-        // Call Python prediction script
-        $python_command = "python $PYTHON_SCRIPT \"$filepath\"";
-        $output = shell_exec($python_command . ' 2>&1');
+        // Ask the persistent daemon first (model already loaded, no Python startup)
+        $result = daemon_request(['image_path' => realpath($filepath), 'top_k' => 5]);
+        
+        if ($result === null) {
+            // Fall back to spawning the Python prediction script
+            $python_command = "python $PYTHON_SCRIPT --no-daemon \"$filepath\"";
+            $output = shell_exec($python_command . ' 2>&1');
+        }
         
         // Clean up uploaded file
         if (file_exists($filepath)) {
             unlink($filepath);
         }
         
-        // Parse Python output
-        if (empty($output)) {
-            throw new Exception('Python script did not return any output');
-        }
-        
-        // Extract JSON from output (in case there are extra messages)
-        $json_start = strpos($output, '{');
-        if ($json_start !== false) {
-            $json_output = substr($output, $json_start);
-            // Find the end of the JSON object
-            $brace_count = 0;
-            $json_end = $json_start;
-            for ($i = $json_start; $i < strlen($output); $i++) {
-                if ($output[$i] === '{') $brace_count++;
-                if ($output[$i] === '}') $brace_count--;
-                if ($brace_count === 0) {
-                    $json_end = $i;
+        if ($result === null) {
+            // Parse Python output
+            if (empty($output)) {
+                throw new Exception('Python script did not return any output');
+            }
+            
+            // The script prints its JSON result as one line; take the last such line
+            $json_output = $output;
+            foreach (array_reverse(preg_split('/\r?\n/', trim($output))) as $line) {
+                if (strpos(ltrim($line), '{') === 0) {
+                    $json_output = $line;
                     break;
                 }
             }
-            $json_output = substr($output, $json_start, $json_end - $json_start + 1);
-        } else {
-            $json_output = $output;
+            $result = json_decode($json_output, true);
+            if (json_last_error() !== JSON_ERROR_NONE) {
+                throw new Exception('Invalid JSON response from Python script. Raw output: ' . $output);
+            }
         }
         
-        // Try to decode JSON output from Python
-        $result = json_decode($json_output, true);
-        if (json_last_error() !== JSON_ERROR_NONE) {
-            throw new Exception('Invalid JSON response from Python script. Raw output: ' . $output);
+        if (empty($result['success'])) {
+            throw new Exception(isset($result['error']) ? $result['error'] : 'Prediction failed');
         }
         
         // Add treatments data if disease detected
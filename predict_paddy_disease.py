@@ -5,29 +5,132 @@ Uses the trained model from results folder to predict paddy diseases
 """
 
 import os
+from cpu_tuning import apply_profile
 # Suppress TensorFlow logging BEFORE importing TensorFlow
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Suppress all TF logs
-os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'  # Disable oneDNN messages
+apply_profile()  # oneDNN and thread settings from "python cpu_tuning.py tune", if run
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')  # Disable oneDNN messages
 
 import numpy as np
 import tensorflow as tf
 from tensorflow import keras
-from PIL import Image
+from PIL import Image, ImageOps
 import json
 import argparse
 import sys
+import io
+import time
+import hashlib
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import timing_summary
+
+def configure_tf_threads(intra_op_threads=None, inter_op_threads=None):
+    """
+    Size TensorFlow's thread pools (must run before the first TF op)
+    
+    Args:
+        intra_op_threads (int): Threads used inside a single op (0/None = TF default)
+        inter_op_threads (int): Ops run in parallel (0/None = TF default)
+        
+    Returns:
+        bool: False if TensorFlow was already initialized
+    """
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(int(intra_op_threads))
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(int(inter_op_threads))
+        return True
+    except RuntimeError as e:
+        print(f"Could not set TensorFlow threads: {e}")
+        return False
+
+PREPROCESS_MODES = ('fast', 'legacy')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+MODEL_BACKENDS = ('keras', 'tflite')
+
+def normalize_batch(image_batch):
+    """
+    Scale a uint8 batch to float32 in [0, 1] (float batches are returned as is)
+    
+    For models that take float input, such as the TFLite variants
+    """
+    image_batch = np.asarray(image_batch)
+    if image_batch.dtype == np.uint8:
+        return np.divide(image_batch, np.float32(255.0), dtype=np.float32)
+    return image_batch
+
+def with_embedding_output(model):
+    """
+    Two-output model: (probabilities, penultimate-layer embedding) from one forward pass
+    
+    Args:
+        model: Keras classifier whose last layer produces the class probabilities
+        
+    Returns:
+        tf.keras.Model: Same inputs, outputs [probabilities, embedding (N, D)]
+    """
+    embedding = model.layers[-2].output
+    if len(embedding.shape) > 2:
+        embedding = tf.keras.layers.Flatten()(embedding)
+    return tf.keras.Model(inputs=model.inputs, outputs=[model.outputs[0], embedding])
 
 class PaddyDiseasePredictor:
-    def __init__(self, model_path="results/model.hdf5"):
+    def __init__(self, model_path="results/model.hdf5", preprocess_mode='fast',
+                 backend='keras', tflite_variant='float16', pool_size=None, version_label=None,
+                 use_compiled=True, fuse_normalization=True, embeddings=False, num_threads=None):
         """
         Initialize the paddy disease predictor
         
         Args:
             model_path (str): Path to the trained model file or directory
+            preprocess_mode (str): 'fast' (JPEG draft decode, reducing resize,
+                EXIF orientation) or 'legacy' (full decode, then resize)
+            backend (str): 'keras' or 'tflite'
+            tflite_variant (str): 'float16' or 'int8' (tflite backend only)
+            pool_size (int): TFLite interpreters for concurrent callers
+                (tflite backend only, default: 1)
+            num_threads (int): Threads per TFLite interpreter (default: the
+                usable cores split between the interpreters)
+            version_label (str): Registry version name, prefixed to model_version
+            use_compiled (bool): Load the frozen graph built by compiled_model.py
+                when one exists for this model file (keras backend only)
+            fuse_normalization (bool): Feed the Keras model uint8 pixels and
+                rescale to [0, 1] inside it; False keeps the float32 input
+                path, normalized in NumPy
+            embeddings (bool): Also compute the penultimate-layer embedding in
+                the same forward pass (see predict_with_embeddings; keras
+                backend only)
         """
+        if preprocess_mode not in PREPROCESS_MODES:
+            raise ValueError(f"Unknown preprocess mode: {preprocess_mode}")
+        if backend not in MODEL_BACKENDS:
+            raise ValueError(f"Unknown model backend: {backend}")
+        if embeddings and backend != 'keras':
+            raise ValueError("Embeddings need the keras backend")
+        
         self.model_path = model_path
         self.model = None
+        self.model_version = None
+        self.model_sha256 = None  # Content hash of the model file (embeddings only)
+        self.version_label = version_label
+        self.use_compiled = use_compiled
+        self.compiled = False  # True when serving the frozen graph
+        self.fuse_normalization = fuse_normalization
+        self.embeddings = embeddings
+        # What the loaded model takes: uint8 pixels (rescaled inside) or float32 in [0, 1]
+        self.input_dtype = np.float32
+        self._buffers = threading.local()
+        self.backend = backend
+        self.tflite_variant = tflite_variant
+        self.pool_size = pool_size
+        self.num_threads = num_threads
         self.input_size = 256  # Model expects 256x256 input
+        self.preprocess_mode = preprocess_mode
+        self.resize_reducing_gap = 3.0  # Reduce by whole factors first, then resample the rest
         
         # Disease class names (matches training order)
         self.class_names = [
@@ -62,28 +165,45 @@ class PaddyDiseasePredictor:
         try:
             # Loading model (quiet mode for PHP integration)
             
+            self.model_version = self.describe_model_version()
+            
+            if self.backend == 'tflite':
+                return self._load_tflite_model()
+            
             if not os.path.exists(self.model_path):
                 raise FileNotFoundError(f"Model file not found: {self.model_path}")
             
             # Load the model (try different formats)
+            if os.path.isdir(self.model_path) and self.embeddings:
+                raise ValueError("Embeddings need an HDF5 model, not a SavedModel directory")
+            if self.embeddings:
+                # Ties indexed embeddings to the model content, wherever the file was copied to
+                from compiled_model import source_hash
+                self.model_sha256 = source_hash(self.model_path)
             if os.path.isdir(self.model_path):
                 # Try SavedModel format with TFSMLayer for Keras 3
                 try:
                     self.model = tf.keras.layers.TFSMLayer(self.model_path, call_endpoint='serving_default')
                     print("Loaded as TFSMLayer (inference-only)")
                     # Wrap in a simple model for consistent interface
-                    inputs = tf.keras.Input(shape=(self.input_size, self.input_size, 3))
-                    outputs = self.model(inputs)
-                    self.model = tf.keras.Model(inputs=inputs, outputs=outputs)
+                    if self.fuse_normalization:
+                        self.model = self._fuse_normalization(self.model)
+                    else:
+                        inputs = tf.keras.Input(shape=(self.input_size, self.input_size, 3))
+                        self.model = tf.keras.Model(inputs=inputs, outputs=self.model(inputs))
                 except Exception as e:
                     print(f"TFSMLayer failed: {e}")
                     # Fallback to direct TensorFlow loading
                     import tensorflow.saved_model as saved_model
                     self.model = saved_model.load(self.model_path)
                     print("Loaded as TensorFlow SavedModel")
-            else:
-                # HDF5 format
+            elif not (self.use_compiled and self._load_compiled_model()):
+                # HDF5 format (the compiled artifact, when built, skips this parse)
                 self.model = tf.keras.models.load_model(self.model_path, compile=False)
+                if self.embeddings:
+                    self.model = with_embedding_output(self.model)
+                if self.fuse_normalization:
+                    self.model = self._fuse_normalization(self.model)
             
             # Model loaded successfully (quiet mode for PHP integration)
             
@@ -93,49 +213,179 @@ class PaddyDiseasePredictor:
             print(f"Error loading model: {e}")
             return False
     
-    def preprocess_image(self, image_path):
+    def describe_model_version(self):
         """
-        Preprocess image for model prediction
+        Identify the model artifact being served
+        
+        Returns:
+            str: File name, backend and a short fingerprint of size and mtime
+        """
+        fingerprint = ''
+        if os.path.exists(self.model_path):
+            stat = os.stat(self.model_path)
+            fingerprint = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+        backend = self.backend if self.backend == 'keras' else f"tflite-{self.tflite_variant}"
+        prefix = f"{self.version_label}/" if self.version_label else ''
+        return f"{prefix}{os.path.basename(self.model_path.rstrip(os.sep))}:{backend}:{fingerprint}"
+    
+    def _fuse_normalization(self, model):
+        """Wrap a model so it takes uint8 pixels and rescales them to [0, 1] itself"""
+        inputs = tf.keras.Input(shape=(self.input_size, self.input_size, 3), dtype='uint8')
+        scaled = tf.keras.layers.Rescaling(1.0 / 255)(inputs)
+        self.input_dtype = np.uint8
+        return tf.keras.Model(inputs=inputs, outputs=model(scaled))
+    
+    def _load_compiled_model(self):
+        """Serve the frozen, pre-optimized graph (no Keras parsing or tracing)"""
+        from compiled_model import FrozenGraphModel, find_artifact
+        
+        try:
+            artifact = find_artifact(self.model_path)
+            if artifact is None:
+                return False
+            self.model = FrozenGraphModel(artifact, embeddings=self.embeddings)
+            self.input_dtype = self.model.input_dtype
+        except Exception as e:
+            print(f"Compiled model unusable, loading Keras model instead: {e}")
+            return False
+        self.compiled = True
+        return True
+    
+    def _load_tflite_model(self):
+        """Serve a quantized TFLite variant from an interpreter pool"""
+        from tflite_backend import InterpreterPool, convert_model, variant_path
+        
+        if self.model_path.endswith('.tflite'):
+            tflite_path = self.model_path
+        else:
+            tflite_path = variant_path(self.model_path, self.tflite_variant)
+            if not os.path.exists(tflite_path):
+                if not os.path.exists(self.model_path):
+                    raise FileNotFoundError(f"Model file not found: {self.model_path}")
+                # One-time conversion from the Keras model
+                convert_model(self.model_path, variants=(self.tflite_variant,))
+        
+        self.model = InterpreterPool(tflite_path, pool_size=self.pool_size, num_threads=self.num_threads)
+        return True
+    
+    def open_image(self, image_source):
+        """
+        Open an image from any supported source without touching disk
         
         Args:
-            image_path (str): Path to the image file
+            image_source: File path, raw bytes, a binary file-like object,
+                or a uint8 numpy array of shape (H, W), (H, W, 3) or (H, W, 4)
             
         Returns:
-            np.ndarray: Preprocessed image tensor
+            PIL.Image.Image: Opened image
         """
-        try:
-            # Load and convert image
-            image = Image.open(image_path)
+        if isinstance(image_source, np.ndarray):
+            if image_source.dtype != np.uint8:
+                raise ValueError(f"Expected a uint8 image array, got {image_source.dtype}")
+            return Image.fromarray(image_source)
+        
+        if isinstance(image_source, (bytes, bytearray, memoryview)):
+            return Image.open(io.BytesIO(image_source))
+        
+        # Paths and file-like objects are handled by PIL directly
+        return Image.open(image_source)
+    
+    def load_resized_image(self, image_source, mode=None, presized=False):
+        """
+        Decode an image and scale it to the model input size
+        
+        Args:
+            image_source: Any source accepted by open_image()
+            mode (str): Preprocess mode override ('fast' or 'legacy')
+            presized (bool): The client already shrank the image to the input
+                size; if it really is that size, resizing is skipped
             
-            # Convert to RGB if needed
+        Returns:
+            PIL.Image.Image: RGB image of input_size x input_size
+        """
+        mode = mode or self.preprocess_mode
+        size = (self.input_size, self.input_size)
+        image = self.open_image(image_source)
+        
+        if presized and image.size == size:
+            # Still honour an orientation tag (cheap at this size), so the result does not
+            # depend on the client_resized flag, which the prediction cache key leaves out
+            if mode != 'legacy':
+                image = ImageOps.exif_transpose(image)
+            return image if image.mode == 'RGB' else image.convert('RGB')
+        
+        if mode == 'legacy':
             if image.mode != 'RGB':
                 image = image.convert('RGB')
+            return image.resize(size)
+        
+        # Let libjpeg do DCT-domain downscaling (1/2, 1/4, 1/8) while decoding;
+        # draft() never goes below the requested size
+        if image.format == 'JPEG':
+            image.draft('RGB', size)
+        
+        # Phone photos are often stored sideways with an orientation tag
+        image = ImageOps.exif_transpose(image)
+        
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        return image.resize(size, Image.BICUBIC, reducing_gap=self.resize_reducing_gap)
+    
+    def preprocess_image(self, image_source, out=None, mode=None, presized=False):
+        """
+        Preprocess image for model prediction
+        
+        Args:
+            image_source: Path to the image file, raw image bytes, a binary
+                file-like object or a uint8 numpy array
+            out (np.ndarray): Optional preallocated buffer of shape
+                (256, 256, 3) or (1, 256, 256, 3) to write into, e.g. one row
+                of batch_buffer(); uint8 (pixels as decoded) or float32
+                (normalized to [0, 1])
+            mode (str): Preprocess mode override ('fast' or 'legacy')
+            presized (bool): Skip resizing for images the client already
+                shrank to the input size
             
-            # Resize to model input size
-            image = image.resize((self.input_size, self.input_size))
+        Returns:
+            np.ndarray: uint8 image tensor of shape (1, 256, 256, 3) (out, when
+                given); the model rescales it to [0, 1]
+        """
+        try:
+            # Load, convert and resize image
+            image = self.load_resized_image(image_source, mode, presized)
             
             # Convert to numpy array
-            image_array = np.array(image)
+            image_array = np.asarray(image)
             
-            # Normalize pixel values to [0, 1]
-            image_array = image_array.astype(np.float32) / 255.0
+            if out is not None:
+                if not out.flags.c_contiguous:
+                    raise ValueError("Output buffer must be C-contiguous")
+                target = out.reshape(image_array.shape)
+                if out.dtype == np.uint8:
+                    np.copyto(target, image_array)
+                else:
+                    # Float buffers hold [0, 1] values, as the model input used to
+                    np.divide(image_array, np.float32(255.0), out=target)
+                return out
             
-            # Add batch dimension
-            image_batch = np.expand_dims(image_array, axis=0)
-            
-            return image_batch
+            # Add batch dimension (4x smaller than the float32 tensor it replaces)
+            return np.expand_dims(image_array, axis=0)
             
         except Exception as e:
             print(f"Error preprocessing image: {e}")
             return None
     
-    def predict(self, image_path, top_k=3):
+    def predict(self, image_source, top_k=3, image_name=None):
         """
         Predict paddy disease from image
         
         Args:
-            image_path (str): Path to the image file
+            image_source: Path to the image file, raw image bytes, a binary
+                file-like object or a uint8 numpy array
             top_k (int): Number of top predictions to return
+            image_name (str): Name reported in the results (defaults to the
+                path, or '<memory>' for in-memory sources)
             
         Returns:
             dict: Prediction results
@@ -144,49 +394,21 @@ class PaddyDiseasePredictor:
             print("Model not loaded. Call load_model() first.")
             return None
         
+        if image_name is None:
+            image_name = image_source if isinstance(image_source, (str, os.PathLike)) else '<memory>'
+        
         try:
             # Analyzing image (quiet mode for PHP integration)
             
             # Preprocess image
-            image_batch = self.preprocess_image(image_path)
+            image_batch = self.preprocess_image(image_source)
             if image_batch is None:
                 return None
             
             # Make prediction
-            predictions = self.model.predict(image_batch, verbose=0)
-            prediction_probs = predictions[0]  # Remove batch dimension
-            
-            # Get top predictions
-            top_indices = np.argsort(prediction_probs)[::-1][:top_k]
-            
-            results = {
-                'image_path': image_path,
-                'predictions': [],
-                'top_prediction': None,
-                'health_status': None,
-                'confidence': None
-            }
+            prediction_probs = self.predict_probabilities(image_batch)[0]  # Remove batch dimension
             
-            # Process predictions
-            for i, idx in enumerate(top_indices):
-                disease_name = self.class_names[idx]
-                confidence = float(prediction_probs[idx])
-                
-                prediction = {
-                    'rank': i + 1,
-                    'disease': disease_name,
-                    'confidence': confidence,
-                    'percentage': confidence * 100,
-                    'health_status': self.health_status[disease_name]
-                }
-                
-                results['predictions'].append(prediction)
-                
-                # Set top prediction
-                if i == 0:
-                    results['top_prediction'] = disease_name
-                    results['health_status'] = self.health_status[disease_name]
-                    results['confidence'] = confidence
+            results = self.format_results(prediction_probs, image_name, top_k)
             
             return results
             
@@ -194,6 +416,125 @@ class PaddyDiseasePredictor:
             print(f"Error during prediction: {e}")
             return None
     
+    def batch_buffer(self, batch_size):
+        """
+        This thread's reusable, contiguous uint8 batch array
+        
+        Grown when a larger batch is asked for and reused otherwise, so batch
+        paths do not allocate a new array per call.
+        
+        Returns:
+            np.ndarray: View of shape (batch_size, 256, 256, 3)
+        """
+        buffer = getattr(self._buffers, 'array', None)
+        if buffer is None or len(buffer) < batch_size:
+            buffer = np.empty((batch_size, self.input_size, self.input_size, 3), dtype=np.uint8)
+            self._buffers.array = buffer
+        return buffer[:batch_size]
+    
+    def prepare_batch(self, image_batch):
+        """Convert a batch to the dtype the loaded model takes"""
+        image_batch = np.asarray(image_batch)
+        if image_batch.dtype == self.input_dtype:
+            return image_batch
+        if self.input_dtype == np.uint8:
+            # A [0, 1] float batch from an older caller
+            return np.rint(image_batch * np.float32(255.0)).astype(np.uint8)
+        return normalize_batch(image_batch)
+    
+    def predict_probabilities(self, image_batch):
+        """
+        Run the model on an already preprocessed batch
+        
+        Args:
+            image_batch (np.ndarray): Batch tensor of shape (N, 256, 256, 3),
+                uint8 pixels or float32 in [0, 1]
+            
+        Returns:
+            np.ndarray: Class probabilities of shape (N, num_classes)
+        """
+        image_batch = self.prepare_batch(image_batch)
+        if self.backend == 'tflite':
+            # The interpreter pool hands each caller its own interpreter
+            return self.model.predict(image_batch)
+        
+        outputs = self.model.predict(image_batch, verbose=0)
+        if self.embeddings:
+            return np.asarray(outputs[0])
+        return np.asarray(outputs)
+    
+    def predict_with_embeddings(self, image_batch):
+        """
+        Class probabilities and penultimate-layer embeddings from one forward pass
+        
+        Args:
+            image_batch (np.ndarray): Batch tensor of shape (N, 256, 256, 3)
+            
+        Returns:
+            tuple: (probabilities (N, num_classes), embeddings (N, D) float32)
+        """
+        if not self.embeddings:
+            raise RuntimeError("Create the predictor with embeddings=True")
+        probabilities, embeddings = self.model.predict(self.prepare_batch(image_batch), verbose=0)
+        return np.asarray(probabilities), np.asarray(embeddings, dtype=np.float32)
+    
+    def warmup(self, batch_sizes=(1,)):
+        """
+        Run dummy inferences so graph tracing happens before the first real request
+        
+        Args:
+            batch_sizes (iterable): Batch shapes to trace
+        """
+        for batch_size in batch_sizes:
+            dummy = np.zeros((batch_size, self.input_size, self.input_size, 3), dtype=self.input_dtype)
+            self.predict_probabilities(dummy)
+    
+    def format_results(self, prediction_probs, image_path, top_k=3):
+        """
+        Build the prediction result dict for a single image
+        
+        Args:
+            prediction_probs (np.ndarray): Class probabilities for one image
+            image_path (str): Path or name reported back in the results
+            top_k (int): Number of top predictions to return
+            
+        Returns:
+            dict: Prediction results
+        """
+        # Get top predictions
+        top_indices = np.argsort(prediction_probs)[::-1][:top_k]
+        
+        results = {
+            'image_path': image_path,
+            'predictions': [],
+            'top_prediction': None,
+            'health_status': None,
+            'confidence': None
+        }
+        
+        # Process predictions
+        for i, idx in enumerate(top_indices):
+            disease_name = self.class_names[idx]
+            confidence = float(prediction_probs[idx])
+            
+            prediction = {
+                'rank': i + 1,
+                'disease': disease_name,
+                'confidence': confidence,
+                'percentage': confidence * 100,
+                'health_status': self.health_status[disease_name]
+            }
+            
+            results['predictions'].append(prediction)
+            
+            # Set top prediction
+            if i == 0:
+                results['top_prediction'] = disease_name
+                results['health_status'] = self.health_status[disease_name]
+                results['confidence'] = confidence
+        
+        return results
+    
     def print_results(self, results):
         """Print prediction results in a formatted way"""
         if results is None:
@@ -248,9 +589,8 @@ class PaddyDiseasePredictor:
             return
         
         # Get all image files
-        image_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
         image_files = [f for f in os.listdir(image_folder) 
-                      if f.lower().endswith(image_extensions)]
+                      if f.lower().endswith(IMAGE_EXTENSIONS)]
         
         if not image_files:
             print(f"No image files found in: {image_folder}")
@@ -279,31 +619,270 @@ class PaddyDiseasePredictor:
                 print(f"Error saving results: {e}")
         
         # Print summary
+        self.print_batch_summary(self.summarize_results(batch_results))
+    
+    def summarize_results(self, batch_results, summary=None):
+        """
+        Count healthy/diseased plants and predictions per disease
+        
+        Args:
+            batch_results (iterable): Prediction result dicts
+            summary (dict): Optional running summary to update in place
+            
+        Returns:
+            dict: Totals, healthy/diseased counts and per-disease breakdown
+        """
+        if summary is None:
+            summary = {'total': 0, 'healthy': 0, 'diseased': 0, 'disease_counts': {}}
+        
+        for result in batch_results:
+            disease = result['top_prediction']
+            summary['total'] += 1
+            summary['disease_counts'][disease] = summary['disease_counts'].get(disease, 0) + 1
+            
+            if result['health_status'] == 'healthy':
+                summary['healthy'] += 1
+            else:
+                summary['diseased'] += 1
+        
+        return summary
+    
+    def print_batch_summary(self, summary):
+        """Print the summary produced by summarize_results()"""
         print(f"\n{'='*60}")
         print("BATCH PREDICTION SUMMARY")
         print(f"{'='*60}")
-        print(f"Total images processed: {len(batch_results)}")
+        print(f"Total images processed: {summary['total']}")
         
-        if batch_results:
-            # Count by disease
-            disease_counts = {}
-            healthy_count = 0
-            diseased_count = 0
-            
-            for result in batch_results:
-                disease = result['top_prediction']
-                disease_counts[disease] = disease_counts.get(disease, 0) + 1
-                
-                if result['health_status'] == 'healthy':
-                    healthy_count += 1
-                else:
-                    diseased_count += 1
-            
-            print(f"Healthy plants: {healthy_count}")
-            print(f"Diseased plants: {diseased_count}")
+        if summary['total']:
+            print(f"Healthy plants: {summary['healthy']}")
+            print(f"Diseased plants: {summary['diseased']}")
             print("\nDisease breakdown:")
-            for disease, count in sorted(disease_counts.items()):
+            for disease, count in sorted(summary['disease_counts'].items()):
                 print(f"  {disease}: {count}")
+    
+    def iter_image_files(self, image_folder, recursive=True):
+        """
+        Walk a folder with os.scandir, yielding image paths as they are found
+        
+        Args:
+            image_folder (str): Folder to walk
+            recursive (bool): Descend into subfolders
+        """
+        pending = [image_folder]
+        while pending:
+            folder = pending.pop()
+            try:
+                entries = sorted(os.scandir(folder), key=lambda entry: entry.name)
+            except OSError as e:
+                print(f"Skipping unreadable folder {folder}: {e}")
+                continue
+            
+            subfolders = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        subfolders.append(entry.path)
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield entry.path
+            # Keep a stable depth-first, name-ordered walk
+            pending.extend(reversed(subfolders))
+    
+    def predict_folder_stream(self, image_folder, output_file, batch_size=32, workers=4,
+                              resume=False, top_k=3, recursive=True, progress_every=10.0, index=None):
+        """
+        Pipeline batch mode: parallel decode, batched inference, JSONL output
+        
+        Images are decoded by a thread pool while the previous batch runs
+        through the model. Each result is appended to output_file as one JSON
+        line as soon as its batch finishes, so an interrupted run keeps
+        everything written so far and can be continued with resume=True.
+        With an index, each batch's embeddings are also appended to it for
+        similar-case search (the predictor needs embeddings=True).
+        
+        Args:
+            image_folder (str): Folder to walk (recursively by default)
+            output_file (str): JSONL file to append results to
+            batch_size (int): Images per model call
+            workers (int): Decode threads
+            resume (bool): Skip images already present in output_file
+            top_k (int): Number of top predictions per image
+            recursive (bool): Descend into subfolders
+            progress_every (float): Seconds between progress lines
+            index (VectorIndex): Optional similar-case index to add images to
+            
+        Returns:
+            dict: Summary from summarize_results() plus failure count and rate
+        """
+        if not os.path.isdir(image_folder):
+            print(f"Folder not found: {image_folder}")
+            return None
+        
+        if self.model is None:
+            print("Model not loaded. Call load_model() first.")
+            return None
+        
+        if index is not None and not self.embeddings:
+            raise ValueError("Adding to an index needs a predictor created with embeddings=True")
+        
+        done = set()
+        if resume and os.path.exists(output_file):
+            with open(output_file, 'rb+') as f:
+                complete = 0  # Bytes up to the end of the last complete line
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Partially written last line from a crash
+                    complete += len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    # Images that failed before are tried again
+                    if 'error' not in record and 'image_path' in record:
+                        done.add(record['image_path'])
+                # Drop the partial line so the first appended record starts on a line of its own
+                f.truncate(complete)
+            print(f"Resuming: {len(done)} images already in {output_file}")
+        
+        batch_size = max(1, int(batch_size))
+        shape = (batch_size, self.input_size, self.input_size, 3)
+        # Two reusable batch buffers: one being filled while the other is inferred
+        buffers = [np.empty(shape, dtype=np.uint8), np.empty(shape, dtype=np.uint8)]
+        
+        summary = self.summarize_results([])
+        summary['failed'] = 0
+        summary['indexed'] = 0
+        skipped = 0
+        start_time = time.perf_counter()
+        last_report = start_time
+        
+        def chunks():
+            nonlocal skipped
+            chunk = []
+            for image_path in self.iter_image_files(image_folder, recursive):
+                if image_path in done:
+                    skipped += 1
+                    continue
+                chunk.append(image_path)
+                if len(chunk) == batch_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        
+        # Per-stage timings (seconds) for the summary; decode overlaps inference,
+        # decode_wait is the part the model loop actually waited for
+        timings = {'decode_image': [], 'decode_batch': [], 'decode_wait': [], 'inference': [], 'write': []}
+        if index is not None:
+            from prediction_log import image_digest
+            timings['index'] = []
+        
+        def decode_one(buffer, row, image_path):
+            stage_start = time.perf_counter()
+            ok = self.preprocess_image(image_path, out=buffer[row]) is not None
+            if ok and index is not None:
+                # Content hash so re-runs and copies of a photo are indexed once
+                with open(image_path, 'rb') as f:
+                    ok = image_digest(f.read())
+            timings['decode_image'].append(time.perf_counter() - stage_start)
+            return ok
+        
+        def decode(buffer, paths):
+            stage_start = time.perf_counter()
+            ok = list(executor.map(lambda item: decode_one(buffer, *item), enumerate(paths)))
+            timings['decode_batch'].append(time.perf_counter() - stage_start)
+            return ok
+        
+        mode = 'a' if resume else 'w'
+        with open(output_file, mode) as out, \
+                ThreadPoolExecutor(max_workers=max(1, workers)) as executor, \
+                ThreadPoolExecutor(max_workers=1) as decode_pool:
+            pending = None
+            flip = 0
+            
+            for paths in itertools.chain(chunks(), [None]):
+                # Start decoding the next chunk before running the current one
+                next_pending = None
+                if paths is not None:
+                    buffer = buffers[flip]
+                    flip ^= 1
+                    next_pending = (paths, buffer, decode_pool.submit(decode, buffer, paths))
+                
+                if pending is not None:
+                    current_paths, buffer, decoded = pending
+                    stage_start = time.perf_counter()
+                    ok = decoded.result()
+                    timings['decode_wait'].append(time.perf_counter() - stage_start)
+                    rows = [i for i, good in enumerate(ok) if good]
+                    
+                    probabilities = []
+                    if rows:
+                        batch = buffer[:len(current_paths)]
+                        if len(rows) != len(current_paths):
+                            batch = batch[rows]
+                        stage_start = time.perf_counter()
+                        if index is not None:
+                            probabilities, embeddings = self.predict_with_embeddings(batch)
+                        else:
+                            probabilities = self.predict_probabilities(batch)
+                        timings['inference'].append(time.perf_counter() - stage_start)
+                    
+                    stage_start = time.perf_counter()
+                    batch_results = []
+                    for row, probs in zip(rows, probabilities):
+                        result = self.format_results(probs, current_paths[row], top_k)
+                        batch_results.append(result)
+                        out.write(json.dumps(result) + '\n')
+                    for i, good in enumerate(ok):
+                        if not good:
+                            summary['failed'] += 1
+                            out.write(json.dumps({'image_path': current_paths[i],
+                                                  'error': 'Could not decode image'}) + '\n')
+                    out.flush()
+                    timings['write'].append(time.perf_counter() - stage_start)
+                    
+                    if index is not None and batch_results:
+                        stage_start = time.perf_counter()
+                        summary['indexed'] += index.add(
+                            embeddings,
+                            [{'image': result['image_path'], 'label': result['top_prediction'],
+                              'confidence': result['confidence'], 'health_status': result['health_status'],
+                              'model_version': self.model_version} for result in batch_results],
+                            digests=[ok[row] for row in rows], model_version=self.model_version,
+                            model_sha256=self.model_sha256)
+                        timings['index'].append(time.perf_counter() - stage_start)
+                    
+                    self.summarize_results(batch_results, summary)
+                    
+                    now = time.perf_counter()
+                    if now - last_report >= progress_every:
+                        last_report = now
+                        processed = summary['total'] + summary['failed']
+                        print(f"Processed {processed} images ({processed / (now - start_time):.1f} images/sec)")
+                
+                pending = next_pending
+        
+        elapsed = time.perf_counter() - start_time
+        processed = summary['total'] + summary['failed']
+        summary['skipped'] = skipped
+        summary['elapsed_seconds'] = elapsed
+        summary['images_per_second'] = processed / elapsed if elapsed > 0 else 0.0
+        
+        print(f"\nResults streamed to: {output_file}")
+        self.print_batch_summary(summary)
+        print(f"Failed images: {summary['failed']}")
+        if skipped:
+            print(f"Skipped (already done): {skipped}")
+        if index is not None:
+            print(f"Added to index {index.directory}: {summary['indexed']} (total {index.count})")
+        print(f"Throughput: {summary['images_per_second']:.1f} images/sec")
+        
+        print("\nTiming summary:")
+        for line in timing_summary(timings):
+            print(f"  {line}")
+        summary['timings'] = {stage: sum(values) for stage, values in timings.items()}
+        
+        return summary
 
 
 def main():
@@ -315,29 +894,88 @@ def main():
     parser.add_argument('--batch', action='store_true', 
                        help='Process all images in a folder')
     parser.add_argument('--output', help='Output file for batch results (JSON)')
+    parser.add_argument('--jsonl', help='Pipeline batch mode: stream results to this JSONL file')
+    parser.add_argument('--batch-size', type=int, default=(apply_profile() or {}).get('batch_size') or 32,
+                       help='Images per model call in pipeline mode (default: tuned profile, else 32)')
+    parser.add_argument('--workers', type=int, default=4,
+                       help='Decode threads in pipeline mode (default: 4)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Skip images already present in the --jsonl file')
+    parser.add_argument('--no-recursive', action='store_true',
+                       help='Do not descend into subfolders in pipeline mode')
     parser.add_argument('--top-k', type=int, default=3, 
                        help='Number of top predictions to show (default: 3)')
+    parser.add_argument('--preprocess', choices=PREPROCESS_MODES, default='fast',
+                       help='Image decode/resize path (default: fast)')
+    parser.add_argument('--backend', choices=MODEL_BACKENDS, default='keras',
+                       help='Inference backend (default: keras)')
+    parser.add_argument('--tflite-variant', choices=('float16', 'int8'), default='float16',
+                       help='Quantized TFLite variant for --backend tflite (default: float16)')
+    parser.add_argument('--no-compiled', action='store_true',
+                       help='Ignore the frozen graph from compiled_model.py and parse the Keras model')
+    parser.add_argument('--profile', nargs='?', const=os.environ.get('PROFILE_DIR') or 'profiles', metavar='DIR',
+                       help='Save a cProfile of the run to DIR (default: profiles); see request_profiler.py')
+    parser.add_argument('--profile-tf', action='store_true',
+                       help='With --profile, also record a TensorFlow profiler trace')
+    parser.add_argument('--index', metavar='DIR',
+                       help='With --batch --jsonl, add image embeddings to this similar-case index')
     
     args = parser.parse_args()
+    if args.index and not (args.batch and args.jsonl):
+        parser.error('--index needs --batch --jsonl')
+    
+    configure_tf_threads(int(os.environ.get('TF_INTRA_OP_THREADS', 0)),
+                         int(os.environ.get('TF_INTER_OP_THREADS', 0)))
     
     # Initialize predictor
-    predictor = PaddyDiseasePredictor(args.model)
+    predictor = PaddyDiseasePredictor(args.model, preprocess_mode=args.preprocess,
+                                      backend=args.backend, tflite_variant=args.tflite_variant,
+                                      use_compiled=not args.no_compiled, embeddings=bool(args.index))
     
     # Load model
     if not predictor.load_model():
         sys.exit(1)
     
+    session = None
+    if args.profile:
+        from request_profiler import RequestProfiler
+        mode = 'pipeline' if args.batch and args.jsonl else 'batch' if args.batch else 'single'
+        session = RequestProfiler(args.profile).start(f"cli:{mode}", 'cli', tf_trace=args.profile_tf,
+                                                      input=args.input, model_version=predictor.model_version)
+    
     # Process input
-    if args.batch:
-        predictor.predict_batch(args.input, args.output)
-    else:
-        if not os.path.exists(args.input):
-            print(f"File not found: {args.input}")
-            sys.exit(1)
-        
-        results = predictor.predict(args.input, args.top_k)
-        if results:
-            predictor.print_results(results)
+    try:
+        if args.batch and args.jsonl:
+            index = None
+            if args.index:
+                from vector_index import VectorIndex
+                index = VectorIndex(args.index)
+                if index.refresh() and not index.built_with(predictor.model_sha256, predictor.model_version):
+                    print(f"{args.index} was built with model {index.meta.get('model_version')}; "
+                          f"use a new directory for {predictor.model_version}")
+                    sys.exit(1)
+            predictor.predict_folder_stream(args.input, args.jsonl, batch_size=args.batch_size,
+                                            workers=args.workers, resume=args.resume,
+                                            top_k=args.top_k, recursive=not args.no_recursive,
+                                            index=index)
+            if index is not None and index.needs_training():
+                print(f"Training inverted lists for {index.count} images...")
+                index.train()
+        elif args.batch:
+            predictor.predict_batch(args.input, args.output)
+        else:
+            if not os.path.exists(args.input):
+                print(f"File not found: {args.input}")
+                sys.exit(1)
+            
+            results = predictor.predict(args.input, args.top_k)
+            if results:
+                predictor.print_results(results)
+    finally:
+        if session is not None:
+            meta = session.stop()
+            print(f"\nProfile saved: {meta['id']} "
+                  f"(python request_profiler.py --dir {args.profile} show {meta['id']})")
 
 
 if __name__ == "__main__":
@@ -2,70 +2,112 @@
 """
 Single Image Prediction Script for XAMPP Integration
 Outputs JSON result for PHP to consume
+
+If prediction_daemon.py is running, the image is sent to it and the model is
+not loaded here at all. Otherwise the model is loaded in-process as before.
+
+Usage:
+    python predict_single.py <image_path>              # daemon if available, else local
+    python predict_single.py --client <image_path>     # daemon only
+    python predict_single.py --no-daemon <image_path>  # always load locally
 """
 
 import os
 import sys
 import json
 
+from cpu_tuning import apply_profile
+
 # Suppress TensorFlow logging BEFORE importing TensorFlow
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Suppress all TF logs
-os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'  # Disable oneDNN messages
+apply_profile()  # Tuned oneDNN and thread settings, if any
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')  # Disable oneDNN messages
 
 # Redirect stderr to suppress any remaining verbose output
 import io
 import contextlib
 
-from predict_paddy_disease import PaddyDiseasePredictor
+from prediction_daemon import DEFAULT_ADDRESS, request_prediction
+
+def predict_with_daemon(image_path):
+    """Ask a running prediction daemon (no TensorFlow import needed)"""
+    return request_prediction({'image_path': os.path.abspath(image_path), 'top_k': 5},
+                              address=DEFAULT_ADDRESS)
+
+def predict_locally(image_path):
+    """Load the model in this process and predict"""
+    # Suppress stderr during model loading to prevent TF messages
+    with contextlib.redirect_stderr(io.StringIO()):
+        from predict_paddy_disease import PaddyDiseasePredictor, configure_tf_threads
+
+        configure_tf_threads(int(os.environ.get('TF_INTRA_OP_THREADS', 0)),
+                             int(os.environ.get('TF_INTER_OP_THREADS', 0)))
+
+        # Initialize predictor - ALWAYS use results/model.hdf5
+        model_path = "results/model.hdf5"
+        predictor = PaddyDiseasePredictor(model_path)
+
+        # Load model (suppress verbose output)
+        if not predictor.load_model():
+            return {
+                'error': 'Failed to load AI model',
+                'success': False
+            }
+
+        # Make prediction
+        results = predictor.predict(image_path, top_k=5)
+
+    if results is None:
+        return {
+            'error': 'Prediction failed',
+            'success': False
+        }
+
+    # Format output for PHP
+    return {
+        'success': True,
+        'health_status': results['health_status'],
+        'top_prediction': results['top_prediction'],
+        'confidence': results['confidence'],
+        'predictions': results['predictions'],
+        'image_name': os.path.basename(image_path)
+    }
 
 def main():
-    if len(sys.argv) != 2:
+    args = sys.argv[1:]
+    client_only = '--client' in args
+    no_daemon = '--no-daemon' in args
+    args = [arg for arg in args if arg not in ('--client', '--no-daemon')]
+
+    if len(args) != 1 or (client_only and no_daemon):
         print(json.dumps({
-            'error': 'Usage: python predict_single.py <image_path>',
+            'error': 'Usage: python predict_single.py [--client | --no-daemon] <image_path>',
             'success': False
         }))
         sys.exit(1)
-    
-    image_path = sys.argv[1]
-    
+
+    image_path = args[0]
+
     try:
-        # Suppress stderr during model loading to prevent TF messages
-        with contextlib.redirect_stderr(io.StringIO()):
-            # Initialize predictor - ALWAYS use results/model.hdf5
-            model_path = "results/model.hdf5"
-            predictor = PaddyDiseasePredictor(model_path)
-            
-            # Load model (suppress verbose output)
-            if not predictor.load_model():
-                print(json.dumps({
-                    'error': 'Failed to load AI model',
-                    'success': False
-                }))
-                sys.exit(1)
-            
-            # Make prediction
-            results = predictor.predict(image_path, top_k=5)
-        
-        if results is None:
-            print(json.dumps({
-                'error': 'Prediction failed',
-                'success': False
-            }))
-            sys.exit(1)
-        
-        # Format output for PHP
-        output = {
-            'success': True,
-            'health_status': results['health_status'],
-            'top_prediction': results['top_prediction'],
-            'confidence': results['confidence'],
-            'predictions': results['predictions'],
-            'image_name': os.path.basename(image_path)
-        }
-        
+        output = None
+        if not no_daemon:
+            try:
+                output = predict_with_daemon(image_path)
+            except OSError as e:
+                if client_only:
+                    output = {
+                        'error': f'Prediction daemon not reachable at {DEFAULT_ADDRESS}: {str(e)}',
+                        'success': False
+                    }
+
+        if output is None:
+            output = predict_locally(image_path)
+
         # Output JSON (this is what PHP will capture)
         print(json.dumps(output))
-        
+        if not output.get('success'):
+            sys.exit(1)
+
     except Exception as e:
         print(json.dumps({
             'error': f'Prediction error: {str(e)}',
@@ -0,0 +1,226 @@
+"""
+Prediction Cache
+Content-hash keyed LRU cache with TTL and an optional disk-backed tier
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def make_cache_key(image_bytes, model_version, top_k):
+    """
+    Build a cache key from the raw image bytes, model version and top_k
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    digest = hashlib.sha256(image_bytes)
+    digest.update(f"|{model_version}|{top_k}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, max_entries=1024, ttl_seconds=3600, disk_dir=None, prune_every=500,
+                 max_disk_entries=100000):
+        """
+        Initialize the prediction cache
+
+        Args:
+            max_entries (int): Entries kept in memory before LRU eviction
+            ttl_seconds (float): Entry lifetime (0 = never expire)
+            disk_dir (str): Optional directory for a tier that survives restarts
+            prune_every (int): Prune the disk tier in the background after this many writes
+            max_disk_entries (int): Disk entries kept, oldest removed first, even
+                when entries never expire (0 = no limit)
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.disk_dir = disk_dir
+        self.prune_every = prune_every
+        self.max_disk_entries = max(0, int(max_disk_entries or 0))
+
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self._pruning = False
+
+        # Counters
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _expired(self, stored_at, now):
+        return self.ttl > 0 and now - stored_at > self.ttl
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """
+        Look up a cached prediction
+
+        Returns:
+            dict or None: The cached value, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if not self._expired(stored_at, now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store a prediction in memory (and on disk when enabled)"""
+        now = time.time()
+        with self._lock:
+            self._insert(key, now, value)
+        self._disk_put(key, now, value)
+
+    def _insert(self, key, stored_at, value):
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r') as f:
+                record = json.load(f)
+            stored_at, value = float(record['stored_at']), record['value']
+        except (OSError, ValueError, KeyError, TypeError):
+            # Unreadable, truncated or foreign files are treated as a miss
+            return None
+
+        if self._expired(stored_at, now):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        # Promote to the memory tier
+        with self._lock:
+            self._insert(key, stored_at, value)
+        return value
+
+    def _disk_put(self, key, stored_at, value):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'stored_at': stored_at, 'value': value}, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing prediction cache entry: {e}")
+            return
+
+        with self._lock:
+            self._writes_since_prune += 1
+            prune = (bool(self.prune_every) and self._writes_since_prune >= self.prune_every
+                     and not self._pruning)
+            if prune:
+                self._writes_since_prune = 0
+                self._pruning = True
+        if prune:
+            # Walking the whole tier takes time proportional to its size; keep it off the request
+            threading.Thread(target=self._prune_in_background, name='cache-prune', daemon=True).start()
+
+    def _prune_in_background(self):
+        try:
+            self.prune_disk()
+        except Exception as e:
+            print(f"Error pruning prediction cache: {e}")
+        finally:
+            with self._lock:
+                self._pruning = False
+
+    def prune_disk(self):
+        """
+        Delete expired entries from the disk tier, then the oldest beyond max_disk_entries
+
+        Returns:
+            int: Files removed
+        """
+        if not self.disk_dir:
+            return 0
+        cutoff = time.time() - self.ttl if self.ttl > 0 else None
+        removed = 0
+        kept = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stored_at = os.path.getmtime(path)
+                    if cutoff is not None and stored_at < cutoff:
+                        os.remove(path)
+                        removed += 1
+                    elif name.endswith('.json'):
+                        kept.append((stored_at, path))
+                except OSError:
+                    pass
+
+        if self.max_disk_entries and len(kept) > self.max_disk_entries:
+            kept.sort()
+            for _, path in kept[:len(kept) - self.max_disk_entries]:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def clear(self):
+        """Drop all in-memory entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Snapshot of cache counters
+
+        Returns:
+            dict: Hit/miss counters and sizes
+        """
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'disk_tier': bool(self.disk_dir),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+            }
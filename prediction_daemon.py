@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Persistent Prediction Daemon for XAMPP Integration
+Loads the model once and answers predictions over a local socket
+
+Protocol: one JSON object per line in each direction.
+    {"image_path": "uploads/paddy_123.jpg", "top_k": 5}
+    {"image_b64": "<base64 image bytes>", "image_name": "leaf.jpg"}
+    {"action": "health"}
+Responses use the same JSON shape predict_single.py prints.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import base64
+import argparse
+import threading
+import socketserver
+
+from cpu_tuning import apply_profile
+
+DEFAULT_ADDRESS = os.environ.get('PADDY_DAEMON_ADDRESS', '127.0.0.1:8765')
+MAX_REQUEST_BYTES = 24 * 1024 * 1024  # 16MB image, base64 encoded, plus JSON
+
+
+def parse_address(address):
+    """
+    Parse 'host:port' or 'unix:/path/to/socket'
+
+    Returns:
+        tuple: (socket family, address)
+    """
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+
+def request_prediction(payload, address=DEFAULT_ADDRESS, timeout=30.0):
+    """
+    Send one request to a running daemon (client side, no TensorFlow import)
+
+    Args:
+        payload (dict): Request object (see module docstring)
+        address (str): Daemon address
+        timeout (float): Socket timeout in seconds
+
+    Returns:
+        dict: Decoded JSON response
+
+    Raises:
+        OSError: If the daemon is not reachable
+    """
+    family, target = parse_address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(target)
+        with sock.makefile('rwb') as stream:
+            stream.write(json.dumps(payload).encode('utf-8') + b'\n')
+            stream.flush()
+            line = stream.readline()
+    if not line:
+        raise ConnectionError('Daemon closed the connection without a response')
+    return json.loads(line)
+
+
+class PredictionHandler(socketserver.StreamRequestHandler):
+    """Serve newline-delimited JSON requests until the client disconnects"""
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_REQUEST_BYTES + 1)
+            if not line:
+                return
+            if len(line) > MAX_REQUEST_BYTES:
+                self.respond({'success': False, 'error': 'Request too large'})
+                return
+            try:
+                request = json.loads(line)
+            except ValueError:
+                self.respond({'success': False, 'error': 'Invalid JSON request'})
+                continue
+            try:
+                response = self.server.prediction_daemon.handle_request(request)
+            except Exception as e:
+                response = {'success': False, 'error': f'Prediction error: {str(e)}'}
+            self.respond(response)
+
+    def respond(self, response):
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+        self.wfile.flush()
+
+
+class ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class ThreadingUnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class PredictionDaemon:
+    def __init__(self, model_path="results/model.hdf5", max_batch_size=8, max_wait_ms=5.0, **predictor_options):
+        """
+        Initialize the daemon (the model is loaded by start())
+
+        Args:
+            model_path (str): Path to the trained model
+            max_batch_size (int): Micro-batch size for concurrent requests
+            max_wait_ms (float): Micro-batch wait limit
+            **predictor_options: Passed to PaddyDiseasePredictor
+        """
+        self.model_path = model_path
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.predictor_options = predictor_options
+        self.predictor = None
+        self.scheduler = None
+        self.started_at = None
+        self.requests_served = 0
+        self._count_lock = threading.Lock()
+
+    def start(self):
+        """Load the model and prepare the batch scheduler"""
+        # Heavy imports only happen in the server process
+        from predict_paddy_disease import PaddyDiseasePredictor, configure_tf_threads
+        from batch_scheduler import MicroBatchScheduler
+
+        configure_tf_threads(int(os.environ.get('TF_INTRA_OP_THREADS', 0)),
+                             int(os.environ.get('TF_INTER_OP_THREADS', 0)))
+        self.predictor = PaddyDiseasePredictor(self.model_path, **self.predictor_options)
+        if not self.predictor.load_model():
+            return False
+        self.predictor.warmup(batch_sizes=sorted({1, self.max_batch_size}))
+
+        model_lock = threading.Lock()
+
+        def run_model_batch(image_batch):
+            with model_lock:
+                return self.predictor.predict_probabilities(image_batch)
+
+        self.scheduler = MicroBatchScheduler(run_model_batch,
+                                             max_batch_size=self.max_batch_size,
+                                             max_wait_ms=self.max_wait_ms)
+        self.started_at = time.time()
+        return True
+
+    def handle_request(self, request):
+        """
+        Answer one decoded request
+
+        Returns:
+            dict: JSON-serializable response
+        """
+        if request.get('action') == 'health':
+            return {
+                'success': True,
+                'status': 'healthy',
+                'model_loaded': self.predictor is not None and self.predictor.model is not None,
+                'model_path': self.model_path,
+                'model_version': self.predictor.model_version if self.predictor else None,
+                'uptime_seconds': round(time.time() - self.started_at, 1) if self.started_at else 0,
+                'requests_served': self.requests_served,
+                'batching': self.scheduler.stats() if self.scheduler else None
+            }
+
+        top_k = int(request.get('top_k', 5))
+        if 'image_b64' in request:
+            image_source = base64.b64decode(request['image_b64'])
+            image_name = request.get('image_name', 'upload')
+        elif 'image_path' in request:
+            image_source = request['image_path']
+            image_name = os.path.basename(image_source)
+        else:
+            return {'success': False, 'error': 'Request needs image_path or image_b64'}
+
+        image_batch = self.predictor.preprocess_image(image_source)
+        if image_batch is None:
+            return {'success': False, 'error': 'Prediction failed'}
+
+        prediction_probs = self.scheduler.submit(image_batch)
+        results = self.predictor.format_results(prediction_probs, image_name, top_k)
+
+        with self._count_lock:
+            self.requests_served += 1
+
+        # Same shape as predict_single.py output
+        return {
+            'success': True,
+            'health_status': results['health_status'],
+            'top_prediction': results['top_prediction'],
+            'confidence': results['confidence'],
+            'predictions': results['predictions'],
+            'image_name': image_name
+        }
+
+    def serve_forever(self, address=DEFAULT_ADDRESS):
+        """Listen on a TCP or Unix socket until interrupted"""
+        family, target = parse_address(address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(target):
+                os.remove(target)
+            server = ThreadingUnixServer(target, PredictionHandler)
+        else:
+            server = ThreadingTCPServer(target, PredictionHandler)
+        server.prediction_daemon = self
+
+        print(f"Prediction daemon listening on {address}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if family == socket.AF_UNIX and os.path.exists(target):
+                os.remove(target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the persistent paddy disease prediction daemon')
+    parser.add_argument('--address', default=DEFAULT_ADDRESS,
+                       help=f'host:port or unix:/path (default: {DEFAULT_ADDRESS})')
+    parser.add_argument('--model', default='results/model.hdf5', help='Path to model file')
+    parser.add_argument('--batch-size', type=int, default=8, help='Max micro-batch size (default: 8)')
+    parser.add_argument('--batch-wait-ms', type=float, default=5.0,
+                       help='Micro-batch wait limit in ms (default: 5)')
+    args = parser.parse_args()
+
+    # Suppress TensorFlow logging BEFORE importing TensorFlow
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+    apply_profile()
+    os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+
+    daemon = PredictionDaemon(args.model, max_batch_size=args.batch_size, max_wait_ms=args.batch_wait_ms)
+    print("Loading AI model...")
+    if not daemon.start():
+        print("Failed to load model")
+        sys.exit(1)
+    daemon.serve_forever(args.address)
+
+
+if __name__ == "__main__":
+    main()
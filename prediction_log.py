@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Prediction Log
+Optional audit log of served predictions. Requests only put a compact
+record on an in-memory queue; a background thread writes the records to
+SQLite (WAL mode) in batched transactions. Indexed aggregate queries give
+disease counts per day and confidence distributions.
+
+Usage:
+    python prediction_log.py daily --db predictions.db --days 30
+    python prediction_log.py confidence --db predictions.db --disease blast
+    python prediction_log.py stats --db predictions.db
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    day TEXT NOT NULL,
+    image_hash TEXT,
+    top_prediction TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    health_status TEXT,
+    top_k TEXT,
+    model_version TEXT,
+    latency_ms REAL,
+    region TEXT,
+    lat REAL,
+    lon REAL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_day_disease ON predictions (day, top_prediction);
+CREATE INDEX IF NOT EXISTS idx_predictions_region_day ON predictions (region, day);
+CREATE INDEX IF NOT EXISTS idx_predictions_disease_confidence ON predictions (top_prediction, confidence);
+"""
+
+INSERT = """
+INSERT INTO predictions (created_at, day, image_hash, top_prediction, confidence, health_status,
+                         top_k, model_version, latency_ms, region, lat, lon, source)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# One decimal degree is roughly 11 km: enough for regional trends, not a farm's position
+LOCATION_DECIMALS = 1
+
+
+def image_digest(image_bytes):
+    """Short, fast content hash for spotting repeated uploads"""
+    return hashlib.blake2b(image_bytes, digest_size=8).hexdigest()
+
+
+def coarse_location(lat, lon):
+    """
+    Round a client-supplied position, dropping anything invalid
+
+    Returns:
+        tuple: (lat, lon) rounded to LOCATION_DECIMALS, or (None, None)
+    """
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None, None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, None
+    return round(lat, LOCATION_DECIMALS), round(lon, LOCATION_DECIMALS)
+
+
+class PredictionLog:
+    def __init__(self, db_path, max_queue=10000, batch_size=256, flush_interval=1.0):
+        """
+        Initialize the prediction log
+
+        Args:
+            db_path (str): SQLite database file
+            max_queue (int): Records buffered in memory; when full, new
+                records are dropped (and counted) rather than blocking a request
+            batch_size (int): Most records written per transaction
+            flush_interval (float): Seconds the writer waits for more records
+        """
+        self.db_path = db_path
+        self.max_queue = max(1, int(max_queue))
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.01, float(flush_interval))
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._worker = None
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+
+        # Counters
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def _ensure_worker(self):
+        """Start the writer thread lazily (and again after a fork)"""
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+                return
+            if self._worker_pid != pid:
+                # Threads and queued records do not survive a fork
+                self._queue = queue.Queue(maxsize=self.max_queue)
+            self._worker = threading.Thread(target=self._run, name='prediction-log-writer', daemon=True)
+            self._worker_pid = pid
+            self._worker.start()
+
+    def record(self, results, image_hash=None, model_version=None, latency_ms=None,
+               region=None, lat=None, lon=None, source='single'):
+        """
+        Queue one prediction (never blocks)
+
+        Args:
+            results (dict): Output of PaddyDiseasePredictor.format_results()
+            image_hash (str): image_digest() of the upload
+            model_version (str): Model that served the prediction
+            latency_ms (float): Server-side request latency so far
+            region (str): Optional free-text region from the client
+            lat, lon (float): Optional client position (stored rounded)
+            source (str): 'single' or 'batch'
+
+        Returns:
+            bool: False if the queue was full and the record was dropped
+        """
+        now = time.time()
+        lat, lon = coarse_location(lat, lon)
+        top_k = [[p['disease'], round(p['confidence'], 4)] for p in results['predictions']]
+        row = (now, time.strftime('%Y-%m-%d', time.gmtime(now)), image_hash,
+               results['top_prediction'], float(results['confidence']), results['health_status'],
+               json.dumps(top_k, separators=(',', ':')), model_version,
+               None if latency_ms is None else round(latency_ms, 2),
+               region[:64] if region else None, lat, lon, source)
+
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        connection = self._connect()
+        while True:
+            rows = [self._queue.get()]
+            # Give a burst a moment to accumulate so it lands in one transaction
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    rows.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with connection:
+                    connection.executemany(INSERT, rows)
+                self.written += len(rows)
+                self.batches += 1
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"Error writing prediction log: {e}")
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued record has been written"""
+        if self._worker is not None and self._worker_pid == os.getpid():
+            self._queue.join()
+
+    def stats(self):
+        """
+        Snapshot of writer state
+
+        Returns:
+            dict: Queue depth and write counters
+        """
+        return {
+            'enabled': True,
+            'db_path': self.db_path,
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'errors': self.errors
+        }
+
+    def _query(self, sql, params=()):
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            connection.row_factory = sqlite3.Row
+            return [dict(row) for row in connection.execute(sql, params)]
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _filters(days=None, region=None, disease=None):
+        clauses, params = [], []
+        if days:
+            since = time.strftime('%Y-%m-%d', time.gmtime(time.time() - (int(days) - 1) * 86400))
+            clauses.append('day >= ?')
+            params.append(since)
+        if region:
+            clauses.append('region = ?')
+            params.append(region)
+        if disease:
+            clauses.append('top_prediction = ?')
+            params.append(disease)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def daily_counts(self, days=30, region=None, disease=None):
+        """
+        Predictions per disease per day (UTC)
+
+        Returns:
+            list: {'day', 'disease', 'count', 'mean_confidence'} rows, oldest first
+        """
+        where, params = self._filters(days, region, disease)
+        return self._query(
+            f"SELECT day, top_prediction AS disease, COUNT(*) AS count, "
+            f"ROUND(AVG(confidence), 4) AS mean_confidence "
+            f"FROM predictions{where} GROUP BY day, top_prediction ORDER BY day, top_prediction", params)
+
+    def confidence_distribution(self, days=None, region=None, disease=None, bins=10):
+        """
+        Histogram of top-1 confidence
+
+        Returns:
+            dict: Total, mean and a list of {'low', 'high', 'count'} bins
+        """
+        bins = max(1, int(bins))
+        where, params = self._filters(days, region, disease)
+        rows = self._query(
+            f"SELECT MIN(CAST(confidence * ? AS INTEGER), ? - 1) AS bucket, COUNT(*) AS count, "
+            f"SUM(confidence) AS total FROM predictions{where} GROUP BY bucket", [bins, bins] + params)
+
+        counts = {row['bucket']: row for row in rows}
+        total = sum(row['count'] for row in rows)
+        return {
+            'total': total,
+            'mean_confidence': round(sum(row['total'] for row in rows) / total, 4) if total else None,
+            'bins': [{'low': round(i / bins, 4), 'high': round((i + 1) / bins, 4),
+                      'count': counts[i]['count'] if i in counts else 0} for i in range(bins)]
+        }
+
+    def totals(self, days=None, region=None):
+        """
+        Overall counts
+
+        Returns:
+            dict: Total, healthy/diseased counts, per-disease counts, mean latency
+        """
+        where, params = self._filters(days, region)
+        rows = self._query(
+            f"SELECT top_prediction AS disease, health_status, COUNT(*) AS count, "
+            f"AVG(latency_ms) AS latency FROM predictions{where} GROUP BY top_prediction, health_status", params)
+        total = sum(row['count'] for row in rows)
+        latency = [(row['latency'], row['count']) for row in rows if row['latency'] is not None]
+        return {
+            'total': total,
+            'healthy': sum(row['count'] for row in rows if row['health_status'] == 'healthy'),
+            'diseased': sum(row['count'] for row in rows if row['health_status'] == 'diseased'),
+            'disease_counts': {row['disease']: row['count'] for row in rows},
+            'mean_latency_ms': round(sum(l * c for l, c in latency) / sum(c for _, c in latency), 2)
+                               if latency else None
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the prediction log')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(sub):
+        sub.add_argument('--db', default=os.environ.get('PREDICTION_LOG_DB', 'predictions.db'),
+                         help='SQLite database (default: $PREDICTION_LOG_DB or predictions.db)')
+        sub.add_argument('--days', type=int, help='Only the last N days')
+        sub.add_argument('--region', help='Only this region')
+        sub.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+
+    daily_parser = subparsers.add_parser('daily', help='Predictions per disease per day')
+    add_common(daily_parser)
+    daily_parser.add_argument('--disease', help='Only this disease')
+    daily_parser.set_defaults(days=30)
+
+    confidence_parser = subparsers.add_parser('confidence', help='Top-1 confidence distribution')
+    add_common(confidence_parser)
+    confidence_parser.add_argument('--disease', help='Only this disease')
+    confidence_parser.add_argument('--bins', type=int, default=10)
+
+    stats_parser = subparsers.add_parser('stats', help='Totals per disease')
+    add_common(stats_parser)
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Prediction log not found: {args.db}")
+        sys.exit(1)
+    log = PredictionLog(args.db)
+
+    if args.command == 'daily':
+        report = log.daily_counts(args.days, args.region, args.disease)
+    elif args.command == 'confidence':
+        report = log.confidence_distribution(args.days, args.region, args.disease, args.bins)
+    else:
+        report = log.totals(args.days, args.region)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    elif args.command == 'daily':
+        print(f"{'Day':<12}{'Disease':<28}{'Count':>8}{'Mean conf':>11}")
+        for row in report:
+            print(f"{row['day']:<12}{row['disease']:<28}{row['count']:>8}{row['mean_confidence']:>11.2%}")
+    elif args.command == 'confidence':
+        print(f"Predictions: {report['total']}  mean confidence: {report['mean_confidence']}")
+        peak = max((b['count'] for b in report['bins']), default=0) or 1
+        for b in report['bins']:
+            print(f"  {b['low']:.2f}-{b['high']:.2f} {b['count']:>7} {'#' * round(40 * b['count'] / peak)}")
+    else:
+        print(f"Total: {report['total']} (healthy {report['healthy']}, diseased {report['diseased']})")
+        for disease, count in sorted(report['disease_counts'].items(), key=lambda item: -item[1]):
+            print(f"  {disease:<28}{count:>8}")
+        if report['mean_latency_ms'] is not None:
+            print(f"Mean latency: {report['mean_latency_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Request Profiler
+Opt-in cProfile (and optionally TensorFlow profiler) captures of single
+requests or CLI runs, saved to a directory with a bounded retention policy.
+
+Each capture writes <id>.prof (pstats format, readable with
+"python -m pstats" or snakeviz), <id>.json (metadata, the hottest
+functions and own time split into decode / resize / inference /
+serialization) and, with a TensorFlow trace, <id>.tf/ for TensorBoard.
+
+Only one capture runs at a time per process: from Python 3.12 cProfile
+hooks are process-wide, and so is the TensorFlow profiler.
+
+Usage:
+    python request_profiler.py list
+    python request_profiler.py show <id>
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import pstats
+import random
+import shutil
+import cProfile
+import argparse
+import itertools
+import threading
+
+DEFAULT_DIR = 'profiles'
+META_SUFFIX = '.json'
+PROFILE_SUFFIX = '.prof'
+TF_TRACE_SUFFIX = '.tf'
+PROFILE_ID_PATTERN = re.compile(r'^\d{8}-\d{6}-\d+-\d+$')
+TOP_FUNCTIONS = 25
+
+# Own (exclusive) time is attributed to a stage by where the function lives;
+# the first matching stage wins and everything else is 'other'
+STAGE_PATTERNS = (
+    ('inference', ('tensorflow', 'keras', 'tflite', 'predict_probabilities')),
+    ('decode', ('ImagingDecoder', 'ImageFile.py', 'ImagePlugin.py', 'Image.py:open')),
+    ('resize', ("'resize'", "'reduce'", "'convert'", "'transpose'", 'Image.py:resize', 'Image.py:convert',
+                'Image.py:reduce', 'ImageOps.py')),
+    ('serialization', ('json', 'jsonify', '_json')),
+)
+
+_capture_lock = threading.Lock()
+_counter = itertools.count(1)
+
+
+def function_label(func):
+    """pstats key (file, line, name) -> 'file.py:line(name)'"""
+    filename, line, name = func
+    if filename == '~':
+        return name  # Built-in: "{method 'resize' of 'ImagingCore' objects}"
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def classify(func):
+    filename, _, name = func
+    text = f"{filename}:{name}" if filename != '~' else name
+    for stage, patterns in STAGE_PATTERNS:
+        if any(pattern in text for pattern in patterns):
+            return stage
+    return 'other'
+
+
+def summarize(profile):
+    """
+    Hot spots of a finished cProfile run
+
+    Returns:
+        dict: 'stages' (own seconds per stage) and 'top_functions' (by own time)
+    """
+    stats = pstats.Stats(profile).stats
+    stages = {stage: 0.0 for stage, _ in STAGE_PATTERNS}
+    stages['other'] = 0.0
+    for func, (_, _, own_time, _, _) in stats.items():
+        stages[classify(func)] += own_time
+
+    hottest = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_FUNCTIONS]
+    top_functions = [{
+        'function': function_label(func),
+        'stage': classify(func),
+        'calls': calls,
+        'own_seconds': round(own_time, 6),
+        'cumulative_seconds': round(cumulative, 6)
+    } for func, (_, calls, own_time, cumulative, _) in hottest]
+    return {'stages': {stage: round(seconds, 6) for stage, seconds in stages.items()},
+            'top_functions': top_functions}
+
+
+def directory_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ProfileSession:
+    def __init__(self, profiler, profile_id, label, trigger, tf_trace, metadata):
+        """One running capture (see RequestProfiler.start)"""
+        self.profiler = profiler
+        self.id = profile_id
+        self.label = label
+        self.trigger = trigger
+        self.metadata = metadata
+        self.tf_logdir = os.path.join(profiler.directory, profile_id + TF_TRACE_SUFFIX) if tf_trace else None
+        self.tf_error = None
+        self._profile = cProfile.Profile()
+        self._started = None
+        self._stopped = False
+
+    def _start(self):
+        if self.tf_logdir:
+            try:
+                import tensorflow as tf
+                tf.profiler.experimental.start(self.tf_logdir)
+            except Exception as e:
+                self.tf_error = str(e)
+                self.tf_logdir = None
+        self._started = time.perf_counter()
+        self._profile.enable()
+
+    def stop(self, **metadata):
+        """
+        End the capture and save it (safe to call more than once)
+
+        Returns:
+            dict or None: Saved metadata (None if already stopped)
+        """
+        if self._stopped:
+            return None
+        self._stopped = True
+        try:
+            self._profile.disable()
+            duration = time.perf_counter() - self._started
+            if self.tf_logdir:
+                try:
+                    import tensorflow as tf
+                    tf.profiler.experimental.stop()
+                except Exception as e:
+                    self.tf_error = str(e)
+        finally:
+            _capture_lock.release()
+        return self.profiler.save(self, duration, {**self.metadata, **metadata})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop(error=str(exc) if exc else None)
+        return False
+
+
+class RequestProfiler:
+    def __init__(self, directory=DEFAULT_DIR, sample_rate=0.0, max_profiles=50, max_bytes=200 * 1024 * 1024):
+        """
+        Initialize the profiler
+
+        Args:
+            directory (str): Where captures are written (shared by all workers)
+            sample_rate (float): Fraction of requests captured without being asked
+            max_profiles (int): Captures kept; the oldest are deleted first
+            max_bytes (int): Total size kept on disk
+        """
+        self.directory = directory
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self.max_profiles = max(1, int(max_profiles))
+        self.max_bytes = int(max_bytes)
+        self.skipped_busy = 0
+        self._prune_lock = threading.Lock()
+
+    def sampled(self):
+        """Roll the dice for a request nobody asked to profile"""
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, label, trigger, tf_trace=False, **metadata):
+        """
+        Begin a capture on the calling thread
+
+        Args:
+            label (str): What is being profiled (e.g. the request path)
+            trigger (str): 'header', 'query', 'sampled' or 'cli'
+            tf_trace (bool): Also record a TensorFlow profiler trace
+            **metadata: Stored with the capture
+
+        Returns:
+            ProfileSession or None: None while another capture is running
+        """
+        if not _capture_lock.acquire(blocking=False):
+            self.skipped_busy += 1
+            return None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_counter)}"
+            session = ProfileSession(self, profile_id, label, trigger, tf_trace, metadata)
+            session._start()
+            return session
+        except Exception:
+            _capture_lock.release()
+            raise
+
+    def save(self, session, duration, metadata):
+        """Write a finished capture and apply the retention policy"""
+        base = os.path.join(self.directory, session.id)
+        session._profile.dump_stats(base + PROFILE_SUFFIX)
+        size = os.path.getsize(base + PROFILE_SUFFIX)
+        if session.tf_logdir and os.path.isdir(session.tf_logdir):
+            size += directory_size(session.tf_logdir)
+
+        meta = {
+            'id': session.id,
+            'label': session.label,
+            'trigger': session.trigger,
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'created': time.time(),
+            'pid': os.getpid(),
+            'duration_ms': round(duration * 1000, 2),
+            'bytes': size,
+            'tf_trace': session.tf_logdir is not None,
+            **({'tf_error': session.tf_error} if session.tf_error else {}),
+            **{key: value for key, value in metadata.items() if value is not None},
+            **summarize(session._profile)
+        }
+        temp_path = f"{base}{META_SUFFIX}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(temp_path, base + META_SUFFIX)
+
+        self.prune()
+        return meta
+
+    def list(self):
+        """
+        Saved captures, newest first
+
+        Returns:
+            list: Metadata dicts without the function tables
+        """
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        for name in names:
+            if not name.endswith(META_SUFFIX):
+                continue
+            meta = self.get(name[:-len(META_SUFFIX)])
+            if meta is not None:
+                meta.pop('top_functions', None)
+                entries.append(meta)
+        entries.sort(key=lambda meta: meta.get('created', 0), reverse=True)
+        return entries
+
+    def get(self, profile_id):
+        """
+        Metadata of one capture
+
+        Returns:
+            dict or None: None for unknown (or malformed) ids
+        """
+        if not PROFILE_ID_PATTERN.match(profile_id or ''):
+            return None
+        try:
+            with open(os.path.join(self.directory, profile_id + META_SUFFIX), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def profile_path(self, profile_id):
+        """The .prof file of a capture, or None"""
+        if self.get(profile_id) is None:
+            return None
+        path = os.path.join(self.directory, profile_id + PROFILE_SUFFIX)
+        return path if os.path.exists(path) else None
+
+    def report(self, profile_id, sort='cumulative', limit=50):
+        """
+        pstats text report of a capture
+
+        Returns:
+            str or None: None for unknown ids
+
+        Raises:
+            ValueError: sort is not a pstats sort key
+        """
+        if sort not in pstats.Stats.sort_arg_dict_default:
+            raise ValueError(f"Unknown sort key: {sort}. Use one of: "
+                             f"{', '.join(sorted(pstats.Stats.sort_arg_dict_default))}")
+        path = self.profile_path(profile_id)
+        if path is None:
+            return None
+        output = io.StringIO()
+        try:
+            stats = pstats.Stats(path, stream=output)
+        except OSError:
+            return None  # Pruned since profile_path() found it
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def delete(self, profile_id):
+        base = os.path.join(self.directory, profile_id)
+        for suffix in (META_SUFFIX, PROFILE_SUFFIX):
+            try:
+                os.remove(base + suffix)
+            except OSError:
+                pass
+        shutil.rmtree(base + TF_TRACE_SUFFIX, ignore_errors=True)
+
+    def prune(self):
+        """Delete the oldest captures beyond max_profiles or max_bytes"""
+        with self._prune_lock:
+            entries = self.list()
+            total = sum(meta.get('bytes', 0) for meta in entries)
+            while entries and (len(entries) > self.max_profiles or total > self.max_bytes):
+                oldest = entries.pop()
+                total -= oldest.get('bytes', 0)
+                self.delete(oldest['id'])
+
+    def stats(self):
+        entries = self.list()
+        return {
+            'enabled': True,
+            'sample_rate': self.sample_rate,
+            'profiles': len(entries),
+            'bytes': sum(meta.get('bytes', 0) for meta in entries),
+            'max_profiles': self.max_profiles,
+            'max_bytes': self.max_bytes,
+            'skipped_busy': self.skipped_busy
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect saved request profiles')
+    parser.add_argument('--dir', default=os.environ.get('PROFILE_DIR') or DEFAULT_DIR,
+                        help='Profile directory (default: $PROFILE_DIR or profiles)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help='List captures, newest first')
+
+    show_parser = subparsers.add_parser('show', help='Print the stage split and a pstats report')
+    show_parser.add_argument('id')
+    show_parser.add_argument('--sort', default='cumulative', choices=sorted(pstats.Stats.sort_arg_dict_default),
+                             help='pstats sort key (default: cumulative)')
+    show_parser.add_argument('--limit', type=int, default=40)
+
+    args = parser.parse_args()
+    profiler = RequestProfiler(args.dir)
+
+    if args.command == 'list':
+        entries = profiler.list()
+        if not entries:
+            print(f"No profiles in {args.dir}")
+        for meta in entries:
+            stages = sorted(meta['stages'].items(), key=lambda item: item[1], reverse=True)
+            hottest = ', '.join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in stages[:2])
+            print(f"{meta['id']:<28}{meta['trigger']:<9}{meta['duration_ms']:>9.1f}ms  "
+                  f"{meta['label']:<24}{hottest}")
+        return
+
+    meta = profiler.get(args.id)
+    if meta is None:
+        print(f"Unknown profile: {args.id}")
+        sys.exit(1)
+    print(f"{meta['label']} ({meta['trigger']}, {meta['duration_ms']:.1f}ms, {meta['created_at']})")
+    for stage, seconds in sorted(meta['stages'].items(), key=lambda item: item[1], reverse=True):
+        print(f"  {stage:<14}{seconds * 1000:>9.1f}ms")
+    if meta.get('tf_trace'):
+        print(f"TensorFlow trace: tensorboard --logdir {os.path.join(args.dir, args.id + TF_TRACE_SUFFIX)}")
+    print()
+    print(profiler.report(args.id, args.sort, args.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -17,9 +17,10 @@ python setup_xampp.py
 echo.
 echo 📁 To use with XAMPP:
 echo 1. Copy this entire folder to: C:\xampp\htdocs\
-echo 2. Start XAMPP Control Panel
-echo 3. Start Apache service
-echo 4. Open: http://localhost/PaddyDisease
+echo 2. Start the prediction daemon: python prediction_daemon.py
+echo 3. Start XAMPP Control Panel
+echo 4. Start Apache service
+echo 5. Open: http://localhost/PaddyDisease
 echo.
 
 pause
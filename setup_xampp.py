@@ -38,6 +38,7 @@ def check_files():
         'results/model.hdf5',
         'data/treatments.json',
         'predict_single.py',
+        'prediction_daemon.py',
         'predict_api.php',
         'index.html'
     ]
@@ -159,9 +160,11 @@ def main():
         print("Setup completed successfully!")
         print("\nNext steps:")
         print("1. Copy this folder to your XAMPP htdocs directory")
-        print("2. Start XAMPP (Apache with PHP)")
-        print("3. Open http://localhost/PaddyDisease in your browser")
-        print("4. Upload a paddy leaf image to test!")
+        print("2. Start the prediction daemon: python prediction_daemon.py")
+        print("   (optional, but predictions drop from seconds to milliseconds)")
+        print("3. Start XAMPP (Apache with PHP)")
+        print("4. Open http://localhost/PaddyDisease in your browser")
+        print("5. Upload a paddy leaf image to test!")
     else:
         print("Setup failed. Please fix the issues above.")
         sys.exit(1)
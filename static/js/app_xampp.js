@@ -94,6 +94,12 @@ async function initializeApp() {
         return;
     }
     
+    // Start downloading the on-device model in the background
+    loadClientModel();
+    
+    // Photos saved while offline
+    setupUploadQueue();
+    
     // Try to check backend health (optional)
     try {
         const response = await fetch('predict_api.php?action=health');
@@ -107,6 +113,354 @@ async function initializeApp() {
     }
 }
 
+/**
+ * On-device inference (TF.js)
+ * Loads the converted model from static/models and reproduces the server's
+ * preprocessing (EXIF-oriented RGB, 256x256, /255) and result format
+ */
+const clientModel = {
+    model: null,
+    metadata: null,
+    loading: null,
+    failed: false
+};
+
+function loadScript(src) {
+    return new Promise((resolve, reject) => {
+        const script = document.createElement('script');
+        script.src = src;
+        script.async = true;
+        script.onload = resolve;
+        script.onerror = () => reject(new Error(`Failed to load ${src}`));
+        document.head.appendChild(script);
+    });
+}
+
+async function loadClientModel() {
+    if (clientModel.model) return clientModel.model;
+    if (clientModel.failed || typeof CONFIG === 'undefined' || !CONFIG.CLIENT_INFERENCE) return null;
+    
+    if (!clientModel.loading) {
+        clientModel.loading = (async () => {
+            if (typeof tf === 'undefined') {
+                await loadScript(CONFIG.TFJS_LIB_PATH);
+            }
+            
+            // metadata.json says whether model.json is a graph or a layers model
+            try {
+                const response = await fetch(CONFIG.MODEL_METADATA_PATH);
+                if (response.ok) clientModel.metadata = await response.json();
+            } catch (error) {
+                console.log('⚠️ Model metadata not available, using defaults');
+            }
+            const format = clientModel.metadata?.model_info?.format || 'layers-model';
+            const model = format === 'graph-model'
+                ? await tf.loadGraphModel(CONFIG.MODEL_PATH)
+                : await tf.loadLayersModel(CONFIG.MODEL_PATH);
+            
+            // Compile kernels now so the first diagnosis is fast
+            const size = getClientInputSize();
+            tf.tidy(() => { model.predict(tf.zeros([1, size, size, 3])); });
+            
+            clientModel.model = model;
+            console.log(`✅ On-device model ready (${format}, ${tf.getBackend()} backend)`);
+            return model;
+        })().catch(error => {
+            clientModel.failed = true;
+            console.warn('⚠️ On-device model unavailable, using server inference:', error);
+            return null;
+        });
+    }
+    return clientModel.loading;
+}
+
+function getClientInputSize() {
+    return clientModel.metadata?.model_info?.input_size || CONFIG.MODEL_INPUT_SIZE;
+}
+
+/**
+ * Decode the upload at model size, honouring the EXIF orientation like the server does
+ */
+async function decodeForModel(file, size) {
+    if (typeof createImageBitmap === 'function') {
+        try {
+            return await createImageBitmap(file, {
+                imageOrientation: 'from-image',
+                resizeWidth: size,
+                resizeHeight: size,
+                resizeQuality: 'high'
+            });
+        } catch (error) {
+            // Older browsers reject the options bag; fall through to a canvas resize
+        }
+    }
+    
+    const url = URL.createObjectURL(file);
+    try {
+        const img = new Image();
+        img.src = url;
+        await img.decode();
+        const canvas = document.createElement('canvas');
+        canvas.width = size;
+        canvas.height = size;
+        const ctx = canvas.getContext('2d');
+        ctx.imageSmoothingEnabled = true;
+        ctx.imageSmoothingQuality = 'high';
+        ctx.drawImage(img, 0, 0, size, size);
+        return canvas;
+    } finally {
+        URL.revokeObjectURL(url);
+    }
+}
+
+/**
+ * Same shape as PaddyDiseasePredictor.format_results() / predict_api.php
+ */
+function formatClientResults(probabilities, imageName) {
+    const classNames = clientModel.metadata?.classes?.names || CONFIG.CLASS_NAMES;
+    const healthy = clientModel.metadata?.health_categories?.healthy || CONFIG.HEALTH_CATEGORIES.healthy;
+    const topK = CONFIG.TOP_K || 5;
+    
+    const ranked = Array.from(probabilities, (confidence, index) => ({ confidence, index }))
+        .sort((a, b) => b.confidence - a.confidence)
+        .slice(0, topK);
+    
+    const predictions = ranked.map((entry, i) => {
+        const disease = classNames[entry.index];
+        return {
+            rank: i + 1,
+            disease: disease,
+            confidence: entry.confidence,
+            percentage: entry.confidence * 100,
+            health_status: healthy.includes(disease) ? 'healthy' : 'diseased'
+        };
+    });
+    
+    return {
+        success: true,
+        health_status: predictions[0].health_status,
+        top_prediction: predictions[0].disease,
+        confidence: predictions[0].confidence,
+        predictions: predictions,
+        image_name: imageName,
+        source: 'device'
+    };
+}
+
+/**
+ * Diagnose on the device
+ * @returns {Promise<Object|null>} Results, or null when the server should be used
+ */
+async function predictOnDevice(file) {
+    const model = await loadClientModel();
+    if (!model) return null;
+    
+    try {
+        const size = getClientInputSize();
+        const pixels = await decodeForModel(file, size);
+        const output = tf.tidy(() => {
+            const input = tf.browser.fromPixels(pixels).toFloat().div(255).expandDims(0);
+            return model.predict(input);
+        });
+        if (pixels.close) pixels.close();
+        
+        const probabilities = await output.data();
+        output.dispose();
+        console.log('📱 Diagnosed on device');
+        return formatClientResults(probabilities, file.name || 'capture.jpg');
+    } catch (error) {
+        console.warn('⚠️ On-device inference failed, using server:', error);
+        return null;
+    }
+}
+
+/**
+ * Client-side resize before upload
+ * Shrinks the photo to the model input size (in a worker when OffscreenCanvas
+ * is available) so slow networks carry ~30 KB instead of several MB, and the
+ * server can skip its own resize
+ */
+let resizeWorker = null;
+let resizeRequestId = 0;
+const pendingResizes = new Map();
+
+function getResizeWorker() {
+    if (resizeWorker !== null) return resizeWorker;
+    resizeWorker = false;
+    if (typeof Worker === 'undefined' || typeof OffscreenCanvas === 'undefined') return resizeWorker;
+    
+    try {
+        resizeWorker = new Worker(CONFIG.RESIZE_WORKER_PATH);
+        resizeWorker.onmessage = (event) => {
+            const { id, blob, error } = event.data;
+            const pending = pendingResizes.get(id);
+            if (!pending) return;
+            pendingResizes.delete(id);
+            if (error) {
+                pending.reject(new Error(error));
+            } else {
+                pending.resolve(blob);
+            }
+        };
+        resizeWorker.onerror = (event) => {
+            // A broken worker is not retried; later uploads resize on the main thread
+            pendingResizes.forEach(pending => pending.reject(new Error(event.message || 'Resize worker failed')));
+            pendingResizes.clear();
+            resizeWorker = false;
+        };
+    } catch (error) {
+        resizeWorker = false;
+    }
+    return resizeWorker;
+}
+
+function resizeInWorker(worker, file, size) {
+    return new Promise((resolve, reject) => {
+        const id = ++resizeRequestId;
+        pendingResizes.set(id, { resolve, reject });
+        worker.postMessage({
+            id,
+            file,
+            size,
+            type: CONFIG.UPLOAD_IMAGE_TYPE,
+            quality: CONFIG.UPLOAD_QUALITY
+        });
+    });
+}
+
+async function resizeOnMainThread(file, size) {
+    let canvas = await decodeForModel(file, size);
+    if (!(canvas instanceof HTMLCanvasElement)) {
+        const bitmap = canvas;
+        canvas = document.createElement('canvas');
+        canvas.width = size;
+        canvas.height = size;
+        canvas.getContext('2d').drawImage(bitmap, 0, 0);
+        bitmap.close();
+    }
+    return new Promise(resolve => canvas.toBlob(resolve, CONFIG.UPLOAD_IMAGE_TYPE, CONFIG.UPLOAD_QUALITY));
+}
+
+/**
+ * @returns {Promise<{file: File, resized: boolean}>} The file to upload
+ */
+async function shrinkForUpload(file) {
+    if (typeof CONFIG === 'undefined' || !CONFIG.UPLOAD_RESIZE) return { file, resized: false };
+    
+    const size = CONFIG.MODEL_INPUT_SIZE;
+    try {
+        const worker = getResizeWorker();
+        const blob = worker ? await resizeInWorker(worker, file, size) : await resizeOnMainThread(file, size);
+        if (!blob) return { file, resized: false };
+        
+        const name = (file.name || 'capture').replace(/\.[^.]+$/, '') + '.jpg';
+        console.log(`📉 Upload shrunk from ${Math.round(file.size / 1024)} KB to ${Math.round(blob.size / 1024)} KB`);
+        return { file: new File([blob], name, { type: blob.type }), resized: true };
+    } catch (error) {
+        console.warn('⚠️ Client-side resize failed, uploading the original:', error);
+        return { file, resized: false };
+    }
+}
+
+/**
+ * Offline upload queue
+ * Photos that cannot reach the server are kept in IndexedDB (upload_queue.js)
+ * and replayed in batches by the service worker (Background Sync) or, where
+ * that is unsupported, by this page when the connection returns
+ */
+function notify(message, type = 'info') {
+    if (typeof showToast === 'function') {
+        showToast(message, type);
+    } else {
+        console.log(message);
+    }
+}
+
+async function queueUploadForLater(upload) {
+    if (typeof UploadQueue === 'undefined' || !('indexedDB' in window)) return false;
+    
+    try {
+        await UploadQueue.enqueue({
+            file: upload.file,
+            lang: getCurrentLanguage(),
+            resized: upload.resized ? `${CONFIG.MODEL_INPUT_SIZE}x${CONFIG.MODEL_INPUT_SIZE}` : ''
+        });
+        await requestUploadReplay();
+        console.log('💾 Upload queued for when the connection returns');
+        return true;
+    } catch (error) {
+        console.warn('⚠️ Could not queue the upload:', error);
+        return false;
+    }
+}
+
+async function getSyncRegistration() {
+    if (!('serviceWorker' in navigator)) return null;
+    const registration = await navigator.serviceWorker.getRegistration();
+    return registration && registration.active && registration.sync ? registration : null;
+}
+
+async function requestUploadReplay() {
+    const registration = await getSyncRegistration();
+    if (registration) {
+        // Replayed by the service worker, even if the app is closed by then
+        await registration.sync.register(UploadQueue.SYNC_TAG);
+    } else if (navigator.onLine) {
+        await replayQueuedUploads();
+    }
+}
+
+async function replayQueuedUploads() {
+    if (typeof UploadQueue === 'undefined') return;
+    try {
+        const { completed } = await UploadQueue.replay();
+        if (completed) await showQueuedResults();
+    } catch (error) {
+        console.log('⚠️ Still offline, uploads stay queued');
+    }
+}
+
+async function showQueuedResults() {
+    const finished = await UploadQueue.takeResults();
+    if (!finished.length) return;
+    
+    const diagnosed = finished.filter(item => item.result && item.result.success);
+    notify(`${diagnosed.length} ${t('queuedDiagnosed')}`, 'success');
+    
+    // Show the most recent diagnosis; the others were announced above
+    const latest = diagnosed[diagnosed.length - 1];
+    if (latest) {
+        detectionResults = latest.result;
+        displayResults(latest.result);
+    }
+}
+
+async function setupUploadQueue() {
+    if (typeof UploadQueue === 'undefined' || !('indexedDB' in window)) return;
+    
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.addEventListener('message', event => {
+            if (event.data && event.data.type === 'queued-results') {
+                showQueuedResults();
+            }
+        });
+    }
+    
+    window.addEventListener('online', async () => {
+        if (!(await getSyncRegistration())) replayQueuedUploads();
+    });
+    
+    try {
+        // Results finished while the app was closed, then anything still waiting
+        await showQueuedResults();
+        if (navigator.onLine && await UploadQueue.count()) {
+            await requestUploadReplay();
+        }
+    } catch (error) {
+        console.warn('⚠️ Upload queue unavailable:', error);
+    }
+}
+
 /**
  * Setup Event Listeners
  */
@@ -447,25 +801,48 @@ async function analyzeImage() {
             return;
         }
         
-        // Real analysis - send to PHP backend
-        console.log('🚀 Using REAL backend - sending to predict_api.php');
-        console.log('📡 Making API request to predict_api.php...');
+        // Diagnose on the device when the TF.js model is available
+        let results = await predictOnDevice(uploadedImage);
         
-        const formData = new FormData();
-        formData.append('image', uploadedImage);
-        
-        // Make API call
-        const response = await fetch('predict_api.php', {
-            method: 'POST',
-            body: formData
-        });
-        
-        console.log('📊 Backend response received');
-        const results = await response.json();
-        console.log('📊 Backend response:', results);
-        
-        if (!results.success) {
-            throw new Error(results.error || 'Prediction failed');
+        if (!results) {
+            // Fallback - send to PHP backend
+            console.log('🚀 Using REAL backend - sending to predict_api.php');
+            console.log('📡 Making API request to predict_api.php...');
+            
+            const upload = await shrinkForUpload(uploadedImage);
+            const formData = new FormData();
+            formData.append('image', upload.file);
+            if (upload.resized) {
+                // Already oriented and at model size; the server skips its resize
+                formData.append('client_resized', `${CONFIG.MODEL_INPUT_SIZE}x${CONFIG.MODEL_INPUT_SIZE}`);
+            }
+            // Ask the server to embed the treatment entry for the current language
+            formData.append('lang', getCurrentLanguage());
+            
+            // Make API call
+            let response;
+            try {
+                response = await fetch('predict_api.php', {
+                    method: 'POST',
+                    body: formData
+                });
+            } catch (networkError) {
+                // Offline: keep the photo and diagnose it when the connection returns
+                if (await queueUploadForLater(upload)) {
+                    hideLoadingScreen();
+                    notify(t('savedForLater'), 'info');
+                    return;
+                }
+                throw networkError;
+            }
+            
+            console.log('📊 Backend response received');
+            results = await response.json();
+            console.log('📊 Backend response:', results);
+            
+            if (!results.success) {
+                throw new Error(results.error || 'Prediction failed');
+            }
         }
         
         // Calculate remaining time to ensure minimum 3 seconds loading
@@ -593,8 +970,12 @@ function displayResults(results) {
     
     // Show treatments if disease detected
     if (results.health_status === 'diseased') {
-        // Load treatments based on current language
-        loadTreatments(results.top_prediction).then(treatments => {
+        // Use the treatment entry embedded by the server when it matches the current language,
+        // otherwise load it based on current language
+        const embeddedTreatments = results.treatments && results.treatments_lang
+            ? Promise.resolve(rememberTreatments(results.top_prediction, results.treatments))
+            : loadTreatments(results.top_prediction);
+        embeddedTreatments.then(treatments => {
             if (treatments) {
                 displayTreatments(treatments);
                 
@@ -1186,6 +1567,16 @@ function setupLanguageSelector() {
 async function loadTreatments(disease, language = null) {
     const lang = language || getCurrentLanguage();
     
+    // Single entry from the Flask server (fallbacks already resolved, ETag-cached)
+    try {
+        const response = await fetch(`api/treatments/${encodeURIComponent(lang)}/${encodeURIComponent(disease)}`);
+        if (response.ok) {
+            return rememberTreatments(disease, await response.json());
+        }
+    } catch (error) {
+        console.log('⚠️ Treatment endpoint unavailable, loading treatment file');
+    }
+    
     try {
         // Determine which treatments file to load
         const treatmentFile = lang === 'en' ? 'data/treatments.json' : `data/treatments_${lang}.json`;
@@ -1198,13 +1589,7 @@ async function loadTreatments(disease, language = null) {
         const treatments = await response.json();
         const diseaseTreatment = treatments[disease] || treatments['default'];
         
-        // Store current treatments
-        currentTreatments = {
-            disease: disease,
-            data: diseaseTreatment
-        };
-        
-        return diseaseTreatment;
+        return rememberTreatments(disease, diseaseTreatment);
     } catch (error) {
         console.error('❌ Failed to load treatments:', error);
         // Fallback to English
@@ -1216,6 +1601,18 @@ async function loadTreatments(disease, language = null) {
     }
 }
 
+/**
+ * Store current treatments (used when switching language)
+ */
+function rememberTreatments(disease, diseaseTreatment) {
+    currentTreatments = {
+        disease: disease,
+        data: diseaseTreatment
+    };
+    
+    return diseaseTreatment;
+}
+
 /**
  * Setup Tutorial
  */
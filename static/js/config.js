@@ -10,7 +10,11 @@ const CONFIG = {
     
     // Health Detection Model Configuration
     MODEL_PATH: 'static/models/model.json',
+    MODEL_METADATA_PATH: 'static/models/metadata.json',
     MODEL_INPUT_SIZE: 256,
+    TFJS_LIB_PATH: 'static/libs/tf.min.js',
+    CLIENT_INFERENCE: true, // Diagnose on the device with TF.js; the server is the fallback
+    TOP_K: 5, // Same number of predictions as the server returns
     MODEL_ARCHITECTURE: 'Custom ResNet-style CNN',
     
     // Disease Classes (matches training order)
@@ -45,6 +49,10 @@ const CONFIG = {
     
     // File Upload Settings
     MAX_FILE_SIZE: 10 * 1024 * 1024, // 10MB
+    UPLOAD_RESIZE: true, // Shrink photos to MODEL_INPUT_SIZE on the device before uploading
+    UPLOAD_IMAGE_TYPE: 'image/jpeg',
+    UPLOAD_QUALITY: 0.92,
+    RESIZE_WORKER_PATH: 'static/js/resize_worker.js',
     ALLOWED_EXTENSIONS: ['image/jpeg', 'image/jpg', 'image/png', 'image/webp'],
     
     // UI Settings
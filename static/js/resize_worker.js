@@ -0,0 +1,25 @@
+/**
+ * MyPadiCare - Upload Resize Worker
+ * Decodes, orients and shrinks a photo off the main thread, then re-encodes it
+ * so the upload is a few tens of KB instead of several MB
+ */
+
+self.addEventListener('message', async (event) => {
+    const { id, file, size, type, quality } = event.data;
+    try {
+        const bitmap = await createImageBitmap(file, {
+            imageOrientation: 'from-image',
+            resizeWidth: size,
+            resizeHeight: size,
+            resizeQuality: 'high'
+        });
+        const canvas = new OffscreenCanvas(size, size);
+        canvas.getContext('2d').drawImage(bitmap, 0, 0);
+        bitmap.close();
+        
+        const blob = await canvas.convertToBlob({ type, quality });
+        self.postMessage({ id, blob });
+    } catch (error) {
+        self.postMessage({ id, error: error.message || String(error) });
+    }
+});
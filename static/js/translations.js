@@ -28,6 +28,8 @@ const translations = {
         // Results Screen
         analyzing: "Analyzing...",
         analyzingImage: "Analyzing image...",
+        savedForLater: "No connection. Photo saved - it will be diagnosed when you are back online.",
+        queuedDiagnosed: "saved photo(s) diagnosed",
         analyzedImage: "Analyzed Image",
         detectionResults: "Detection Results",
         confidenceLevel: "Confidence Level",
@@ -173,6 +175,8 @@ const translations = {
         // Results Screen
         analyzing: "Menganalisis...",
         analyzingImage: "Menganalisis gambar...",
+        savedForLater: "Tiada sambungan. Foto disimpan - ia akan didiagnosis apabila anda kembali dalam talian.",
+        queuedDiagnosed: "foto tersimpan telah didiagnosis",
         analyzedImage: "Gambar Dianalisis",
         detectionResults: "Keputusan Pengesanan",
         confidenceLevel: "Tahap Keyakinan",
@@ -318,6 +322,8 @@ const translations = {
         // Results Screen
         analyzing: "分析中...",
         analyzingImage: "画像を分析中...",
+        savedForLater: "接続がありません。写真を保存しました。オンラインに戻ると診断されます。",
+        queuedDiagnosed: "枚の保存済み写真を診断しました",
         analyzedImage: "分析された画像",
         detectionResults: "検出結果",
         confidenceLevel: "信頼度レベル",
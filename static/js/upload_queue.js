@@ -0,0 +1,181 @@
+/**
+ * MyPadiCare - Offline Upload Queue
+ * Shared by the page and the service worker: photos that could not reach the
+ * server are kept in IndexedDB and replayed in batches when the connection
+ * returns. Finished diagnoses wait in IndexedDB until the page shows them.
+ */
+
+const UploadQueue = (() => {
+    const DB_NAME = 'mypadicare';
+    const DB_VERSION = 1;
+    const UPLOADS = 'uploads';
+    const RESULTS = 'results';
+    const SYNC_TAG = 'replay-uploads';
+    const BATCH_SIZE = 8;
+    const BATCH_ENDPOINT = 'api/predict_batch';
+    const SINGLE_ENDPOINT = 'predict_api.php';
+
+    let dbPromise = null;
+    let replaying = null;
+
+    function openDb() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve, reject) => {
+                const request = indexedDB.open(DB_NAME, DB_VERSION);
+                request.onupgradeneeded = () => {
+                    const db = request.result;
+                    if (!db.objectStoreNames.contains(UPLOADS)) {
+                        db.createObjectStore(UPLOADS, { keyPath: 'id', autoIncrement: true });
+                    }
+                    if (!db.objectStoreNames.contains(RESULTS)) {
+                        db.createObjectStore(RESULTS, { keyPath: 'id' });
+                    }
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => {
+                    dbPromise = null;
+                    reject(request.error);
+                };
+            });
+        }
+        return dbPromise;
+    }
+
+    async function withStore(storeName, mode, operation) {
+        const db = await openDb();
+        return new Promise((resolve, reject) => {
+            const transaction = db.transaction(storeName, mode);
+            const request = operation(transaction.objectStore(storeName));
+            transaction.oncomplete = () => resolve(request ? request.result : undefined);
+            transaction.onerror = () => reject(transaction.error);
+            transaction.onabort = () => reject(transaction.error);
+        });
+    }
+
+    /**
+     * Keep a photo for later
+     * @returns {Promise<number>} Queue id
+     */
+    function enqueue({ file, lang, resized }) {
+        return withStore(UPLOADS, 'readwrite', store => store.add({
+            file: file,
+            name: file.name || 'capture.jpg',
+            lang: lang || 'en',
+            resized: resized || '', // e.g. '256x256' when the client already shrank it
+            queuedAt: Date.now()
+        }));
+    }
+
+    function count() {
+        return withStore(UPLOADS, 'readonly', store => store.count());
+    }
+
+    /**
+     * Diagnoses finished since the last call (removed once taken)
+     */
+    async function takeResults() {
+        const results = await withStore(RESULTS, 'readonly', store => store.getAll());
+        if (results.length) {
+            await withStore(RESULTS, 'readwrite', store => store.clear());
+        }
+        return results.sort((a, b) => a.queuedAt - b.queuedAt);
+    }
+
+    async function complete(item, result) {
+        await withStore(RESULTS, 'readwrite', store => store.put({
+            id: item.id,
+            name: item.name,
+            queuedAt: item.queuedAt,
+            completedAt: Date.now(),
+            result: result
+        }));
+        await withStore(UPLOADS, 'readwrite', store => store.delete(item.id));
+    }
+
+    async function sendBatch(items) {
+        const formData = new FormData();
+        items.forEach(item => formData.append('images', item.file, item.name));
+        formData.append('lang', items[0].lang);
+        if (items[0].resized) {
+            formData.append('client_resized', items[0].resized);
+        }
+
+        const response = await fetch(BATCH_ENDPOINT, { method: 'POST', body: formData });
+        if (response.status === 404 || response.status === 405) {
+            return null; // No batch endpoint (e.g. PHP backend)
+        }
+        if (!response.ok) {
+            return items.map(() => ({ success: false, retryable: true, error: `HTTP ${response.status}` }));
+        }
+        const body = await response.json();
+        return items.map((item, index) => body.results.find(result => result.index === index) ||
+            { success: false, retryable: true, error: 'Missing result' });
+    }
+
+    async function sendSingle(item) {
+        const formData = new FormData();
+        formData.append('image', item.file, item.name);
+        formData.append('lang', item.lang);
+        if (item.resized) {
+            formData.append('client_resized', item.resized);
+        }
+
+        const response = await fetch(SINGLE_ENDPOINT, { method: 'POST', body: formData });
+        const result = await response.json().catch(() => ({ success: false, error: `HTTP ${response.status}` }));
+        if (response.status === 503 || response.status === 504) {
+            result.retryable = true;
+        }
+        return result;
+    }
+
+    async function replayOnce() {
+        const items = await withStore(UPLOADS, 'readonly', store => store.getAll());
+
+        // One batch request per language / resize setting
+        const groups = new Map();
+        items.forEach(item => {
+            const key = `${item.lang}|${item.resized}`;
+            if (!groups.has(key)) groups.set(key, []);
+            groups.get(key).push(item);
+        });
+
+        let completed = 0;
+        let batchSupported = true;
+        for (const group of groups.values()) {
+            for (let start = 0; start < group.length; start += BATCH_SIZE) {
+                const chunk = group.slice(start, start + BATCH_SIZE);
+                let results = batchSupported ? await sendBatch(chunk) : null;
+                if (results === null) {
+                    batchSupported = false;
+                    results = [];
+                    for (const item of chunk) {
+                        results.push(await sendSingle(item));
+                    }
+                }
+
+                for (let i = 0; i < chunk.length; i++) {
+                    // Busy/timed-out uploads stay queued; anything else is final
+                    if (results[i].retryable) continue;
+                    await complete(chunk[i], results[i]);
+                    completed++;
+                }
+            }
+        }
+
+        return { completed, remaining: await count() };
+    }
+
+    /**
+     * Send every queued photo; a network failure rejects and leaves the rest queued
+     * @returns {Promise<{completed: number, remaining: number}>}
+     */
+    function replay() {
+        // Overlapping calls in one context (e.g. startup plus an 'online' event) share a single run
+        if (!replaying) {
+            replaying = replayOnce().finally(() => { replaying = null; });
+        }
+        return replaying;
+    }
+
+    return { SYNC_TAG, enqueue, count, replay, takeResults };
+})();
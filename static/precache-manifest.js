@@ -0,0 +1,28 @@
+// Generated by build_precache.py - do not edit by hand
+self.PRECACHE_VERSION = '117663ded94e';
+self.PRECACHE_MANIFEST = [
+  {"url": "data/treatments.json", "revision": "e7abc411bfee65cb"},
+  {"url": "data/treatments_ja.json", "revision": "9051028fab2314c5"},
+  {"url": "data/treatments_ms.json", "revision": "77c9a1a43659265c"},
+  {"url": "index.html", "revision": "53a0b79333ef9a4b"},
+  {"url": "static/css/main.css", "revision": "b3194b7aea4389f8"},
+  {"url": "static/icons/icon-128x128.png", "revision": "b33b93eaa0148ee7"},
+  {"url": "static/icons/icon-144x144.png", "revision": "2fabe1850cccf13e"},
+  {"url": "static/icons/icon-152x152.png", "revision": "b74d3164722426e9"},
+  {"url": "static/icons/icon-192x192.png", "revision": "7f68ae55a863594c"},
+  {"url": "static/icons/icon-384x384.png", "revision": "2456eed50a3f9438"},
+  {"url": "static/icons/icon-512x512.png", "revision": "61d4c09eff76f59b"},
+  {"url": "static/icons/icon-72x72.png", "revision": "433d9779667339fa"},
+  {"url": "static/icons/icon-96x96.png", "revision": "79f009b3dccb312e"},
+  {"url": "static/js/app_xampp.js", "revision": "1ae88215170ddcc7"},
+  {"url": "static/js/config.js", "revision": "d6bd60f2921a3e33"},
+  {"url": "static/js/gemini.js", "revision": "12699636669f53c8"},
+  {"url": "static/js/resize_worker.js", "revision": "537582c9242217bb"},
+  {"url": "static/js/translations.js", "revision": "4681d6047ac760e8"},
+  {"url": "static/js/upload_queue.js", "revision": "ac5d44473ef3c6c3"},
+  {"url": "static/libs/tf.min.js", "revision": "10473436a3c630d5"},
+  {"url": "static/manifest.json", "revision": "866eac6fef444ebc"},
+  {"url": "static/models/group1-shard1of1_trained.bin", "revision": "8a1ed48ae95d388e"},
+  {"url": "static/models/metadata.json", "revision": "36eb8a3ebc6505bd"},
+  {"url": "static/models/model.json", "revision": "dd9a1c97a5bfec5d"}
+];
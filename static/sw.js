@@ -1,58 +1,147 @@
 /**
  * Service Worker for MyPadiCare PWA
- * Enables offline functionality and caching
+ * Precaches the app shell, model and treatment files under content-hashed
+ * keys and replays photos queued offline when the connection returns.
+ *
+ * Loaded by /sw.js (after static/precache-manifest.js and
+ * static/js/upload_queue.js) so that its scope covers the whole app.
  */
 
-const CACHE_NAME = 'mypadicare-v2.0.0';
-const urlsToCache = [
-  '/',
-  '/index.html',
-  '/static/css/style.css',
-  '/static/css/camera-modal.css',
-  '/static/css/error-notifications.css',
-  '/static/css/mobile-app.css',
-  '/static/js/config.js',
-  '/static/js/app_xampp.js',
-  '/static/js/gemini.js',
-  '/static/manifest.json',
-  '/static/libs/tf.min.js'
-];
-
-// Install event - cache resources
-self.addEventListener('install', event => {
-  event.waitUntil(
-    caches.open(CACHE_NAME)
-      .then(cache => {
-        console.log('Cache opened');
-        return cache.addAll(urlsToCache);
-      })
-  );
-});
-
-// Fetch event - serve from cache when offline
-self.addEventListener('fetch', event => {
-  event.respondWith(
-    caches.match(event.request)
-      .then(response => {
-        // Return cached version or fetch from network
-        return response || fetch(event.request);
-      })
-  );
-});
-
-// Activate event - clean up old caches
-self.addEventListener('activate', event => {
-  event.waitUntil(
-    caches.keys().then(cacheNames => {
-      return Promise.all(
-        cacheNames.map(cacheName => {
-          if (cacheName !== CACHE_NAME) {
-            console.log('Deleting old cache:', cacheName);
-            return caches.delete(cacheName);
-          }
+const PRECACHE_PREFIX = 'mypadicare-precache-';
+const PRECACHE_NAME = `${PRECACHE_PREFIX}${self.PRECACHE_VERSION}`;
+const RUNTIME_NAME = 'mypadicare-runtime-v1';
+
+// Fonts and icon CSS from CDNs, cached after first use
+const RUNTIME_HOSTS = ['fonts.googleapis.com', 'fonts.gstatic.com', 'cdnjs.cloudflare.com'];
+
+if (!self.PRECACHE_MANIFEST) {
+    // Started directly from static/ by an old registration: hand over to /sw.js
+    self.addEventListener('install', () => self.skipWaiting());
+    self.addEventListener('activate', event => {
+        event.waitUntil(self.registration.unregister());
+    });
+} else {
+    // Absolute URL (query-free) -> cache key carrying the content revision
+    const scope = self.registration.scope;
+    const precacheKeys = new Map();
+    self.PRECACHE_MANIFEST.forEach(entry => {
+        const url = new URL(entry.url, scope).href;
+        precacheKeys.set(url, `${url}?__rev=${entry.revision}`);
+    });
+    const indexKey = precacheKeys.get(new URL('index.html', scope).href);
+    if (indexKey) precacheKeys.set(scope, indexKey);
+
+    // Install event - cache every manifest entry (unchanged files are copied, not downloaded)
+    self.addEventListener('install', event => {
+        event.waitUntil((async () => {
+            const cache = await caches.open(PRECACHE_NAME);
+            await Promise.all(self.PRECACHE_MANIFEST.map(async entry => {
+                const url = new URL(entry.url, scope).href;
+                const key = precacheKeys.get(url);
+                if (await cache.match(key)) return;
+
+                const previous = await caches.match(key);
+                if (previous) return cache.put(key, previous);
+
+                const response = await fetch(url, { cache: 'reload' });
+                if (!response.ok) {
+                    throw new Error(`Precache failed for ${entry.url}: ${response.status}`);
+                }
+                await cache.put(key, response);
+            }));
+            console.log(`Precached ${self.PRECACHE_MANIFEST.length} files (${self.PRECACHE_VERSION})`);
+        })());
+    });
+
+    // Activate event - clean up old caches
+    self.addEventListener('activate', event => {
+        event.waitUntil((async () => {
+            const cacheNames = await caches.keys();
+            await Promise.all(cacheNames
+                .filter(name => name.startsWith('mypadicare-') && name !== PRECACHE_NAME && name !== RUNTIME_NAME)
+                .map(name => {
+                    console.log('Deleting old cache:', name);
+                    return caches.delete(name);
+                }));
+            await self.clients.claim();
+        })());
+    });
+
+    // Fetch event - precache first, network for everything dynamic
+    self.addEventListener('fetch', event => {
+        const request = event.request;
+        if (request.method !== 'GET') return; // Uploads are queued by the page, not here
+
+        const url = new URL(request.url);
+        if (url.origin !== self.location.origin) {
+            if (RUNTIME_HOSTS.includes(url.hostname)) {
+                event.respondWith(staleWhileRevalidate(request));
+            }
+            return;
+        }
+
+        // Ignore cache-busting queries like ?v=4; the revision key already versions the file
+        const key = precacheKeys.get(url.origin + url.pathname);
+        if (key) {
+            event.respondWith(caches.match(key).then(cached => cached || fetch(request)));
+            return;
+        }
+
+        if (request.mode === 'navigate' && indexKey) {
+            event.respondWith(fetch(request).catch(() => caches.match(indexKey)));
+            return;
+        }
+
+        if (url.pathname.includes('/api/treatments/')) {
+            event.respondWith(staleWhileRevalidate(request));
+        }
+        // Health checks, metrics and everything else go straight to the network
+    });
+
+    // Background sync - replay photos captured while offline
+    self.addEventListener('sync', event => {
+        if (event.tag === UploadQueue.SYNC_TAG) {
+            event.waitUntil(replayQueuedUploads());
+        }
+    });
+}
+
+async function staleWhileRevalidate(request) {
+    const cache = await caches.open(RUNTIME_NAME);
+    const cached = await cache.match(request);
+    const network = fetch(request)
+        .then(response => {
+            if (response.ok || response.type === 'opaque') {
+                cache.put(request, response.clone());
+            }
+            return response;
         })
-      );
-    })
-  );
-});
+        .catch(error => {
+            if (cached) return cached;
+            throw error;
+        });
+    return cached || network;
+}
+
+async function replayQueuedUploads() {
+    // A network failure rejects, so the browser schedules another sync
+    const { completed, remaining } = await UploadQueue.replay();
+
+    if (completed) {
+        const windows = await self.clients.matchAll({ type: 'window' });
+        windows.forEach(client => client.postMessage({ type: 'queued-results', count: completed }));
+
+        if (!windows.length && self.Notification && Notification.permission === 'granted') {
+            await self.registration.showNotification('MyPadiCare', {
+                body: `${completed} saved photo(s) diagnosed. Open the app to see the results.`,
+                icon: 'static/icons/icon-192x192.png',
+                tag: 'queued-results'
+            });
+        }
+    }
 
+    if (remaining) {
+        // Shed or timed out by a busy server; try again on the next sync
+        throw new Error(`${remaining} upload(s) still queued`);
+    }
+}
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Static Asset Pipeline
+Builds a deploy directory of the frontend files with content hashes,
+gzip/brotli variants and asset URLs in index.html fingerprinted as
+"path?v=<hash>", and serves it: only files listed in the asset manifest
+are reachable, the best pre-compressed variant is chosen by
+Accept-Encoding, fingerprinted URLs are cached as immutable and
+everything else (HTML included) revalidates with a strong ETag.
+
+Usage:
+    python static_assets.py build            # write dist/
+    python static_assets.py build --out dist --no-brotli
+"""
+
+import os
+import re
+import sys
+import glob
+import gzip
+import json
+import shutil
+import hashlib
+import argparse
+import mimetypes
+import threading
+
+from flask import send_file
+
+MANIFEST_FILE = 'asset-manifest.json'
+VERSION_LENGTH = 12
+
+# Everything the browser may request; nothing else is served
+ASSET_PATTERNS = [
+    'index.html',
+    'sw.js',
+    'static/manifest.json',
+    'static/sw.js',
+    'static/precache-manifest.js',
+    'static/css/*.css',
+    'static/js/*.js',
+    'static/libs/*.js',
+    'static/icons/*.png',
+    'static/models/*.json',
+    'static/models/*.bin',
+    'data/treatments*.json'
+]
+
+# Files whose asset URLs are rewritten to fingerprinted ones, in dependency order
+# (config.js names the TF.js library and the resize worker; index.html names config.js)
+REWRITE_FILES = ['static/js/config.js', 'index.html']
+REFERENCE_PATTERN = re.compile(r'''(["'])((?:static|data)/[A-Za-z0-9_./-]+?)(\?v=[^"']*)?\1''')
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/manifest+json',
+                      'image/svg+xml')
+MIN_COMPRESS_SIZE = 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Extension -> Content-Encoding, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+mimetypes.add_type('application/javascript', '.js')
+mimetypes.add_type('application/manifest+json', '.webmanifest')
+
+
+def content_version(data):
+    """Short SHA-256 of a file's content"""
+    return hashlib.sha256(data).hexdigest()[:VERSION_LENGTH]
+
+
+def guess_type(path):
+    if path.endswith('manifest.json') and path.startswith('static/'):
+        return 'application/manifest+json'
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def collect_assets(root='.'):
+    """
+    List the asset files under root
+
+    Returns:
+        list: Relative '/'-separated paths, sorted
+    """
+    paths = set()
+    for pattern in ASSET_PATTERNS:
+        for path in glob.glob(os.path.join(root, pattern)):
+            if os.path.isfile(path):
+                paths.add(os.path.relpath(path, root).replace(os.sep, '/'))
+    return sorted(paths)
+
+
+def rewrite_references(text, versions):
+    """Point quoted asset paths at their fingerprinted URL (unknown paths are left alone)"""
+    def replace(match):
+        quote, path, _ = match.groups()
+        if path not in versions:
+            return match.group(0)
+        return f"{quote}{path}?v={versions[path]}{quote}"
+    return REFERENCE_PATTERN.sub(replace, text)
+
+
+def compress_variants(data, use_brotli=True):
+    """
+    Pre-compressed bodies that are actually smaller than the original
+
+    Returns:
+        dict: Content-Encoding -> bytes
+    """
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if use_brotli:
+        try:
+            import brotli
+            variants['br'] = brotli.compress(data, quality=11)
+        except ImportError:
+            pass
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data) * 0.95}
+
+
+def build(root='.', out_dir='dist', use_brotli=True):
+    """
+    Write the deploy directory
+
+    Args:
+        root (str): Source tree
+        out_dir (str): Output directory (replaced atomically)
+        use_brotli (bool): Also write .br variants (needs the brotli package)
+
+    Returns:
+        dict: The asset manifest
+    """
+    if use_brotli:
+        try:
+            import brotli  # noqa: F401
+        except ImportError:
+            print("brotli is not installed; writing gzip variants only (pip install brotli)")
+            use_brotli = False
+
+    contents = {}
+    for path in collect_assets(root):
+        with open(os.path.join(root, path), 'rb') as f:
+            contents[path] = f.read()
+
+    versions = {path: content_version(data) for path, data in contents.items()}
+    for path in REWRITE_FILES:
+        if path in contents:
+            contents[path] = rewrite_references(contents[path].decode('utf-8'), versions).encode('utf-8')
+            versions[path] = content_version(contents[path])
+
+    staging_dir = f"{out_dir.rstrip(os.sep)}.staging"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    manifest = {}
+    total = compressed_total = 0
+    for path, data in contents.items():
+        target = os.path.join(staging_dir, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+
+        content_type = guess_type(path)
+        encodings = {}
+        if len(data) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            for encoding, body in compress_variants(data, use_brotli).items():
+                suffix = dict(ENCODINGS)[encoding]
+                with open(target + suffix, 'wb') as f:
+                    f.write(body)
+                encodings[encoding] = len(body)
+
+        manifest[path] = {'version': versions[path], 'type': content_type, 'size': len(data),
+                          'encodings': encodings}
+        total += len(data)
+        compressed_total += min([len(data)] + list(encodings.values()))
+
+    with open(os.path.join(staging_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(staging_dir, out_dir)
+    print(f"Wrote {out_dir}: {len(manifest)} files, {total / 1024 / 1024:.2f} MB "
+          f"({compressed_total / 1024 / 1024:.2f} MB compressed)")
+    return manifest
+
+
+class AssetStore:
+    def __init__(self, root):
+        """
+        Serve the files of a built asset directory, or (without an asset
+        manifest) the ASSET_PATTERNS files of a source tree
+
+        Args:
+            root (str): Output of build(), or the repository root
+        """
+        self.root = root
+        self.built = os.path.exists(os.path.join(root, MANIFEST_FILE))
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Read the asset manifest (or hash the source files)
+
+        Returns:
+            int: Number of servable files
+        """
+        if self.built:
+            with open(os.path.join(self.root, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        else:
+            entries = {path: self._describe(path) for path in collect_assets(self.root)}
+        with self._lock:
+            self._entries = entries
+        return len(entries)
+
+    def _describe(self, path):
+        full_path = os.path.join(self.root, path)
+        with open(full_path, 'rb') as f:
+            data = f.read()
+        return {'version': content_version(data), 'type': guess_type(path), 'size': len(data),
+                'encodings': {}, 'mtime': os.stat(full_path).st_mtime_ns}
+
+    def lookup(self, path):
+        """
+        Manifest entry for a request path
+
+        Returns:
+            dict or None: None for anything outside the asset set
+        """
+        entry = self._entries.get(path)
+        if entry is None or self.built:
+            return entry
+        # Source-tree mode: pick up edits without a restart
+        try:
+            mtime = os.stat(os.path.join(self.root, path)).st_mtime_ns
+        except OSError:
+            return None
+        if mtime != entry['mtime']:
+            entry = self._describe(path)
+            with self._lock:
+                self._entries[path] = entry
+        return entry
+
+    def version(self, path):
+        entry = self.lookup(path)
+        return entry['version'] if entry else None
+
+    def response(self, path, request):
+        """
+        Build the response for an asset
+
+        Args:
+            path (str): Request path relative to the site root
+            request: The current Flask request
+
+        Returns:
+            flask.Response or None: None if the path is not an asset
+        """
+        entry = self.lookup(path)
+        if entry is None:
+            return None
+
+        full_path = os.path.join(self.root, path)
+        encoding = None
+        for candidate, suffix in ENCODINGS:
+            if candidate in entry['encodings'] and request.accept_encodings[candidate]:
+                encoding, full_path = candidate, full_path + suffix
+                break
+
+        # Fingerprinted URL: this exact content never changes. HTML, the service
+        # worker and unversioned URLs are revalidated instead (a cheap 304)
+        immutable = request.args.get('v') == entry['version']
+
+        # Strong validator per representation (each encoding is a different body)
+        etag = entry['version'] + (f'-{encoding}' if encoding else '')
+        response = send_file(full_path, mimetype=entry['type'], etag=etag, conditional=True,
+                             max_age=IMMUTABLE_MAX_AGE if immutable else None)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if entry['encodings']:
+            response.vary.add('Accept-Encoding')
+
+        if immutable:
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the static asset directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Fingerprint and pre-compress the frontend files')
+    build_parser.add_argument('--root', default='.', help='Source tree (default: .)')
+    build_parser.add_argument('--out', default='dist', help='Output directory (default: dist)')
+    build_parser.add_argument('--no-brotli', action='store_true', help='Only write gzip variants')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.root, 'index.html')):
+        print(f"index.html not found in {args.root}")
+        sys.exit(1)
+    build(args.root, args.out, use_brotli=not args.no_brotli)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+/**
+ * MyPadiCare service worker entry point
+ * Served from the site root because a worker only controls pages inside its
+ * own folder; the implementation lives in static/sw.js
+ */
+
+importScripts('static/precache-manifest.js', 'static/js/upload_queue.js', 'static/sw.js');
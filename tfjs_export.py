@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+TF.js Model Export
+Converts the Keras model to a sharded TF.js graph model for in-browser
+inference (static/models), with optional float16/uint8 weight quantization
+
+Requires the converter package (not needed by the server):
+    pip install tensorflowjs
+
+Usage:
+    python tfjs_export.py                                 # uint8 weights into static/models
+    python tfjs_export.py --quantization float16 --shard-size-mb 2
+"""
+
+import os
+# Suppress TensorFlow logging BEFORE importing TensorFlow
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+import tensorflow as tf
+
+QUANTIZATION_DTYPES = ('none', 'float16', 'uint8')
+
+
+def export_saved_model(keras_path, saved_model_dir):
+    """Load the Keras model and write it as a SavedModel for the graph converter"""
+    model = tf.keras.models.load_model(keras_path, compile=False)
+    if hasattr(model, 'export'):
+        model.export(saved_model_dir)  # Keras 3
+    else:
+        tf.saved_model.save(model, saved_model_dir)
+
+
+def remove_previous_export(output_dir):
+    """Delete the model.json and weight shards of an earlier export so no stale shard is served"""
+    model_json = os.path.join(output_dir, 'model.json')
+    if not os.path.exists(model_json):
+        return
+    with open(model_json, 'r') as f:
+        manifest = json.load(f)
+    for group in manifest.get('weightsManifest', []):
+        for shard in group.get('paths', []):
+            shard_path = os.path.join(output_dir, shard)
+            if os.path.exists(shard_path):
+                os.remove(shard_path)
+    os.remove(model_json)
+
+
+def write_metadata(output_dir, keras_path, quantization):
+    """
+    Write metadata.json for the browser: class names, preprocessing and format
+
+    The class order and health mapping come from PaddyDiseasePredictor, so
+    the client formats results exactly like the server.
+    """
+    from predict_paddy_disease import PaddyDiseasePredictor
+    predictor = PaddyDiseasePredictor(keras_path)
+
+    with open(os.path.join(output_dir, 'model.json'), 'rb') as f:
+        manifest_bytes = f.read()
+    manifest = json.loads(manifest_bytes)
+    shards = [path for group in manifest['weightsManifest'] for path in group['paths']]
+    digest = hashlib.sha1(manifest_bytes)
+    for shard in shards:
+        with open(os.path.join(output_dir, shard), 'rb') as f:
+            digest.update(f.read())
+
+    healthy = [name for name in predictor.class_names if predictor.health_status[name] == 'healthy']
+    diseased = [name for name in predictor.class_names if predictor.health_status[name] == 'diseased']
+    metadata = {
+        'model_info': {
+            'format': manifest.get('format', 'graph-model'),
+            'quantization': quantization,
+            'input_shape': [None, predictor.input_size, predictor.input_size, 3],
+            'output_shape': [None, len(predictor.class_names)],
+            'num_classes': len(predictor.class_names),
+            'input_size': predictor.input_size,
+            'preprocessing': {
+                'rescale': '1.0/255.0',
+                'resize': [predictor.input_size, predictor.input_size]
+            },
+            'note': f'Converted from {os.path.basename(keras_path)}'
+        },
+        'classes': {
+            'names': predictor.class_names,
+            'mapping': {name: i for i, name in enumerate(predictor.class_names)}
+        },
+        'health_categories': {'healthy': healthy, 'diseased': diseased},
+        'model_version': digest.hexdigest()[:12],
+        'weight_shards': shards
+    }
+    with open(os.path.join(output_dir, 'metadata.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def convert_model(keras_path='results/model.hdf5', output_dir='static/models', quantization='uint8',
+                  shard_size_mb=4):
+    """
+    Convert the Keras model to a TF.js graph model
+
+    Args:
+        keras_path (str): Path to the Keras HDF5 model
+        output_dir (str): Folder served to the browser
+        quantization (str): 'none', 'float16' or 'uint8' weight quantization
+        shard_size_mb (float): Maximum weight shard size; small shards cache
+            and resume better on phones
+
+    Returns:
+        dict: The metadata written next to model.json
+    """
+    if quantization not in QUANTIZATION_DTYPES:
+        raise ValueError(f"Unknown quantization: {quantization}")
+    if not os.path.exists(keras_path):
+        raise FileNotFoundError(f"Model file not found: {keras_path}")
+
+    try:
+        from tensorflowjs.converters import convert_tf_saved_model
+    except ImportError:
+        raise ImportError("The TF.js converter is not installed. Run: pip install tensorflowjs")
+
+    os.makedirs(output_dir, exist_ok=True)
+    saved_model_dir = tempfile.mkdtemp(prefix='paddy_savedmodel_')
+    # Convert next to the live files and swap them in only once conversion succeeded
+    staging_dir = tempfile.mkdtemp(prefix='.tfjs_', dir=output_dir)
+    try:
+        print(f"Exporting SavedModel from {keras_path}...")
+        export_saved_model(keras_path, saved_model_dir)
+
+        print(f"Converting to TF.js graph model ({quantization} weights)...")
+        convert_tf_saved_model(
+            saved_model_dir, staging_dir,
+            quantization_dtype_map={quantization: '*'} if quantization != 'none' else None,
+            weight_shard_size_bytes=int(shard_size_mb * 1024 * 1024))
+
+        remove_previous_export(output_dir)
+        for name in os.listdir(staging_dir):
+            os.replace(os.path.join(staging_dir, name), os.path.join(output_dir, name))
+    finally:
+        shutil.rmtree(saved_model_dir, ignore_errors=True)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    metadata = write_metadata(output_dir, keras_path, quantization)
+    total = sum(os.path.getsize(os.path.join(output_dir, shard)) for shard in metadata['weight_shards'])
+    print(f"Wrote {output_dir}/model.json with {len(metadata['weight_shards'])} weight shard(s), "
+          f"{total / 1024 / 1024:.2f} MB (version {metadata['model_version']})")
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the Keras model for in-browser TF.js inference')
+    parser.add_argument('--model', default='results/model.hdf5', help='Keras HDF5 model')
+    parser.add_argument('--output', default='static/models', help='Output folder (served to the browser)')
+    parser.add_argument('--quantization', choices=QUANTIZATION_DTYPES, default='uint8',
+                        help='Weight quantization (default: uint8, about 4x smaller than float32)')
+    parser.add_argument('--shard-size-mb', type=float, default=4, help='Maximum weight shard size in MB')
+    args = parser.parse_args()
+
+    try:
+        convert_model(args.model, args.output, args.quantization, args.shard_size_mb)
+    except (ImportError, FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+TFLite Inference Backend
+Converts the Keras model to quantized TFLite variants once and serves them
+from one multi-threaded interpreter (or a pool, one per concurrent caller)
+"""
+
+import os
+# Suppress TensorFlow logging BEFORE importing TensorFlow
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+
+import sys
+import queue
+import argparse
+import contextlib
+from collections import OrderedDict
+
+import numpy as np
+import tensorflow as tf
+
+from cpu_tuning import available_cpus
+
+TFLITE_VARIANTS = ('float16', 'int8')
+
+
+def variant_path(keras_path, variant):
+    """results/model.hdf5 -> results/model_float16.tflite"""
+    base, _ = os.path.splitext(keras_path)
+    return f"{base}_{variant}.tflite"
+
+
+def convert_model(keras_path, variants=TFLITE_VARIANTS, representative_images=None,
+                  input_size=256, force=False):
+    """
+    Convert a Keras model to TFLite variants (skipped when already up to date)
+
+    Args:
+        keras_path (str): Path to the Keras HDF5 model
+        variants (tuple): Any of 'float16' and 'int8'
+        representative_images (list): Image paths used to calibrate full int8
+            quantization; without them int8 uses dynamic-range quantization
+            (int8 weights, float activations)
+        input_size (int): Model input size used when calibrating
+        force (bool): Reconvert even if the output is newer than the source
+
+    Returns:
+        dict: variant -> output path
+    """
+    outputs = {}
+    model = None
+
+    for variant in variants:
+        if variant not in TFLITE_VARIANTS:
+            raise ValueError(f"Unknown TFLite variant: {variant}")
+
+        output_path = variant_path(keras_path, variant)
+        outputs[variant] = output_path
+        if (not force and os.path.exists(output_path)
+                and os.path.getmtime(output_path) >= os.path.getmtime(keras_path)):
+            print(f"Up to date: {output_path}")
+            continue
+
+        if model is None:
+            model = tf.keras.models.load_model(keras_path, compile=False)
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        if variant == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        elif representative_images:
+            # Full integer quantization; inputs/outputs stay float32 (the
+            # predictor normalizes its uint8 batches for these models)
+            from predict_paddy_disease import PaddyDiseasePredictor, normalize_batch
+            preprocessor = PaddyDiseasePredictor(keras_path)
+
+            def representative_dataset():
+                for image_path in representative_images:
+                    image_batch = preprocessor.preprocess_image(image_path)
+                    if image_batch is not None:
+                        yield [normalize_batch(image_batch)]
+
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+        tflite_model = converter.convert()
+        with open(output_path, 'wb') as f:
+            f.write(tflite_model)
+        print(f"Wrote {output_path} ({len(tflite_model) / 1024 / 1024:.1f}MB)")
+
+    return outputs
+
+
+class InterpreterPool:
+    def __init__(self, model_path, pool_size=1, num_threads=None, max_shapes=8):
+        """
+        Pool of TFLite interpreters over one memory-mapped model file
+
+        Args:
+            model_path (str): Path to the .tflite file
+            pool_size (int): Callers served at once (default: 1); only pool
+                when predict() is really called from several threads
+            num_threads (int): Threads per interpreter (default: the usable
+                cores split between the pool slots)
+            max_shapes (int): Batch shapes kept allocated per pool slot
+        """
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"TFLite model not found: {model_path}")
+
+        self.model_path = model_path
+        self.pool_size = max(1, int(pool_size or 1))
+        self.num_threads = int(num_threads or max(1, available_cpus() // self.pool_size))
+        self.max_shapes = max(1, int(max_shapes))
+
+        # Each slot keeps one interpreter per batch shape, so varying micro-batch
+        # sizes do not resize and reallocate the tensors on every call
+        self._pool = queue.Queue()
+        for _ in range(self.pool_size):
+            interpreter = self._create_interpreter()
+            shape = tuple(int(d) for d in interpreter.get_input_details()[0]['shape'])
+            self._pool.put(OrderedDict([(shape, interpreter)]))
+        self.input_dtype = interpreter.get_input_details()[0]['dtype']
+
+    def _create_interpreter(self, shape=None):
+        interpreter = tf.lite.Interpreter(model_path=self.model_path, num_threads=self.num_threads)
+        if shape is not None:
+            interpreter.resize_tensor_input(interpreter.get_input_details()[0]['index'], shape)
+        interpreter.allocate_tensors()
+        return interpreter
+
+    def _interpreter_for(self, slot, shape):
+        interpreter = slot.get(shape)
+        if interpreter is not None:
+            slot.move_to_end(shape)
+            return interpreter
+
+        interpreter = self._create_interpreter(shape)
+        slot[shape] = interpreter
+        while len(slot) > self.max_shapes:
+            slot.popitem(last=False)
+        return interpreter
+
+    @contextlib.contextmanager
+    def acquire(self, shape):
+        """Borrow an interpreter allocated for the given input shape"""
+        slot = self._pool.get()
+        try:
+            yield self._interpreter_for(slot, tuple(int(d) for d in shape))
+        finally:
+            self._pool.put(slot)
+
+    def predict(self, image_batch, verbose=0):
+        """
+        Run a batch through a pooled interpreter
+
+        Args:
+            image_batch (np.ndarray): Batch tensor of shape (N, H, W, C)
+
+        Returns:
+            np.ndarray: Output of shape (N, num_classes)
+        """
+        batch = np.asarray(image_batch, dtype=self.input_dtype)
+        with self.acquire(batch.shape) as interpreter:
+            interpreter.set_tensor(interpreter.get_input_details()[0]['index'], batch)
+            interpreter.invoke()
+            return interpreter.get_tensor(interpreter.get_output_details()[0]['index']).copy()
+
+
+def check_agreement(keras_path, tflite_path, image_paths, batch_size=16):
+    """
+    Compare top-1 predictions of a TFLite variant against the Keras model
+
+    Returns:
+        dict: Image count, top-1 agreement and max probability difference
+    """
+    from predict_paddy_disease import PaddyDiseasePredictor, normalize_batch
+
+    reference = PaddyDiseasePredictor(keras_path)
+    if not reference.load_model():
+        raise RuntimeError(f"Could not load Keras model: {keras_path}")
+    pool = InterpreterPool(tflite_path, pool_size=1)
+
+    total = 0
+    agree = 0
+    max_diff = 0.0
+    for start in range(0, len(image_paths), batch_size):
+        batches = [reference.preprocess_image(p) for p in image_paths[start:start + batch_size]]
+        batches = [b for b in batches if b is not None]
+        if not batches:
+            continue
+        batch = np.concatenate(batches)
+        expected = reference.predict_probabilities(batch)
+        actual = pool.predict(normalize_batch(batch))
+        agree += int(np.sum(np.argmax(expected, axis=1) == np.argmax(actual, axis=1)))
+        max_diff = max(max_diff, float(np.max(np.abs(expected - actual))))
+        total += len(batch)
+
+    return {
+        'images': total,
+        'top1_agreement': (agree / total) if total else None,
+        'max_probability_diff': max_diff
+    }
+
+
+def list_images(image_folder, limit=None):
+    image_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+    paths = sorted(os.path.join(image_folder, f) for f in os.listdir(image_folder)
+                   if f.lower().endswith(image_extensions))
+    return paths[:limit] if limit else paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert and verify TFLite model variants')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert_parser = subparsers.add_parser('convert', help='Convert the Keras model to TFLite')
+    convert_parser.add_argument('--model', default='results/model.hdf5', help='Keras HDF5 model')
+    convert_parser.add_argument('--variants', nargs='+', choices=TFLITE_VARIANTS,
+                                default=list(TFLITE_VARIANTS))
+    convert_parser.add_argument('--calibration-images',
+                                help='Folder of images for full int8 calibration')
+    convert_parser.add_argument('--calibration-count', type=int, default=200)
+    convert_parser.add_argument('--force', action='store_true', help='Reconvert even if up to date')
+
+    check_parser = subparsers.add_parser('check', help='Top-1 agreement against the Keras model')
+    check_parser.add_argument('images', help='Folder of labelled or field images')
+    check_parser.add_argument('--model', default='results/model.hdf5', help='Keras HDF5 model')
+    check_parser.add_argument('--variants', nargs='+', choices=TFLITE_VARIANTS,
+                              default=list(TFLITE_VARIANTS))
+    check_parser.add_argument('--limit', type=int, help='Only check the first N images')
+    check_parser.add_argument('--min-agreement', type=float, default=0.98,
+                              help='Exit non-zero below this top-1 agreement (default: 0.98)')
+
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        calibration = None
+        if args.calibration_images:
+            calibration = list_images(args.calibration_images, args.calibration_count)
+        convert_model(args.model, args.variants, calibration, force=args.force)
+        return
+
+    image_paths = list_images(args.images, args.limit)
+    if not image_paths:
+        print(f"No image files found in: {args.images}")
+        sys.exit(1)
+
+    failed = False
+    for variant in args.variants:
+        report = check_agreement(args.model, variant_path(args.model, variant), image_paths)
+        if report['top1_agreement'] is None:
+            print(f"{variant}: no images could be decoded")
+            failed = True
+            continue
+        print(f"{variant}: top-1 agreement {report['top1_agreement']:.2%} over {report['images']} images "
+              f"(max prob diff {report['max_probability_diff']:.4f})")
+        if report['top1_agreement'] < args.min_agreement:
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
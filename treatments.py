@@ -0,0 +1,117 @@
+"""
+Treatment Index
+Loads every treatment file once and precomputes per (language, disease)
+entries with the fallback chain already resolved
+"""
+
+import os
+import json
+import hashlib
+
+DEFAULT_LANGUAGE = 'en'
+
+# Language -> treatment file (English is the fallback for everything else)
+TREATMENT_FILES = {
+    'en': 'data/treatments.json',
+    'ms': 'data/treatments_ms.json',
+    'ja': 'data/treatments_ja.json'
+}
+
+
+class TreatmentIndex:
+    def __init__(self, treatment_files=None):
+        """
+        Initialize the treatment index
+
+        Args:
+            treatment_files (dict): Language -> JSON file path
+        """
+        self.treatment_files = treatment_files or TREATMENT_FILES
+        self.languages = []
+        self.diseases = []
+        # (language, disease) -> {'data': dict, 'body': bytes, 'etag': str, 'language': str}
+        self._entries = {}
+
+    def load(self):
+        """
+        Read all treatment files and build the resolved index
+
+        Returns:
+            bool: True if at least the default language loaded
+        """
+        raw = {}
+        for language, path in self.treatment_files.items():
+            if not os.path.exists(path):
+                print(f"Treatment file not found: {path}")
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    raw[language] = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error loading treatments from {path}: {e}")
+
+        if DEFAULT_LANGUAGE not in raw:
+            return False
+
+        diseases = set()
+        for treatments in raw.values():
+            diseases.update(treatments.keys())
+
+        entries = {}
+        for language in raw:
+            for disease in diseases:
+                resolved = self._resolve(raw, language, disease)
+                if resolved is None:
+                    continue
+                source_language, data = resolved
+                body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                entries[(language, disease)] = {
+                    'data': data,
+                    'body': body,
+                    'etag': hashlib.sha1(body).hexdigest(),
+                    'language': source_language
+                }
+
+        self._entries = entries
+        self.languages = sorted(raw)
+        self.diseases = sorted(diseases)
+        return True
+
+    @staticmethod
+    def _resolve(raw, language, disease):
+        """Fallback chain: language entry, English entry, language default, English default"""
+        chain = [(language, disease), (DEFAULT_LANGUAGE, disease),
+                 (language, 'default'), (DEFAULT_LANGUAGE, 'default')]
+        for source_language, key in chain:
+            data = raw.get(source_language, {}).get(key)
+            if data is not None:
+                return source_language, data
+        return None
+
+    @property
+    def loaded(self):
+        return bool(self._entries)
+
+    def get_entry(self, language, disease):
+        """
+        Look up a resolved entry
+
+        Returns:
+            dict or None: {'data', 'body', 'etag', 'language'}
+        """
+        if language not in self.languages:
+            language = DEFAULT_LANGUAGE
+        entry = self._entries.get((language, disease))
+        if entry is None:
+            entry = self._entries.get((language, 'default'))
+        return entry
+
+    def get(self, language, disease):
+        """
+        Treatment data for a disease in a language (with fallbacks applied)
+
+        Returns:
+            dict or None: Treatment entry
+        """
+        entry = self.get_entry(language, disease)
+        return entry['data'] if entry else None
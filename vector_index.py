@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+"""
+Similar-Case Vector Index
+Memory-mapped store of image embeddings (the classifier's penultimate
+layer) for "earlier cases that look like this photo" and near-duplicate
+detection.
+
+Vectors are L2-normalized and stored as int8 (per-row scale) or float16
+rows in flat files that are only ever appended to, so the index grows
+incrementally from batch prediction runs while servers keep reading it.
+Once trained, an inverted file (spherical k-means lists) limits each query
+to a few lists, which keeps top-k search in milliseconds at hundreds of
+thousands of images; before that, every row is scanned.
+
+Layout:
+    vector_index/
+        index.json          count, dim, dtype, labels, training state
+        vectors.bin         (count, dim) int8 or float16
+        scales.bin          (count,) float32 (int8 only)
+        labels.bin          (count,) int16 index into index.json labels
+        digests.bin         (count,) uint64 content hash, for exact duplicates
+        lists.bin           (count,) int32 inverted list (-1 before training)
+        centroids.npy       (nlist, dim) float32
+        metadata.jsonl      one JSON object per row
+        metadata.idx        (count,) uint64 byte offset of each metadata line
+
+Usage:
+    python predict_paddy_disease.py field_photos/ --batch --jsonl out.jsonl --index vector_index
+    python vector_index.py stats
+    python vector_index.py train
+    python vector_index.py search leaf.jpg -k 10
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single writer at a time is up to the operator
+    fcntl = None
+
+META_FILE = 'index.json'
+DTYPES = {'int8': np.int8, 'float16': np.float16}
+ROW_FILES = {
+    'scales': ('scales.bin', np.float32),
+    'labels': ('labels.bin', np.int16),
+    'digests': ('digests.bin', np.uint64),
+    'lists': ('lists.bin', np.int32),
+    'offsets': ('metadata.idx', np.uint64)
+}
+VECTORS_FILE = 'vectors.bin'
+CENTROIDS_FILE = 'centroids.npy'
+METADATA_FILE = 'metadata.jsonl'
+LOCK_FILE = 'index.lock'
+
+SCAN_CHUNK = 32768
+TRAIN_MIN_VECTORS = 20000  # Below this a full scan is already fast
+RETRAIN_GROWTH = 4  # Retrain once the index has grown this much since training
+DEFAULT_NPROBE = 16
+REFRESH_SECONDS = 2.0
+
+
+def normalize_rows(vectors):
+    """L2-normalize float32 rows (zero rows stay zero)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def digest_to_int(digest):
+    """Hex content hash (prediction_log.image_digest) -> uint64, 0 when unknown"""
+    return int(digest[:16], 16) if digest else 0
+
+
+class VectorIndex:
+    def __init__(self, directory='vector_index', dtype='int8'):
+        """
+        Open (or prepare to create) an index
+
+        Args:
+            directory (str): Index directory
+            dtype (str): Row storage for a new index: 'int8' (dim bytes per
+                image) or 'float16' (2 * dim bytes); existing indexes keep theirs
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown vector dtype: {dtype}")
+        self.directory = directory
+        self.default_dtype = dtype
+        # Everything a search reads, replaced as one object so concurrent readers see one version
+        self._view = None
+        self._meta_mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # Reading
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def exists(self):
+        return os.path.exists(self._path(META_FILE))
+
+    def refresh(self, force=False):
+        """
+        Re-open the files if another process added or retrained (checked every REFRESH_SECONDS)
+
+        Returns:
+            bool: True if the index exists
+        """
+        now = time.monotonic()
+        if not force and self._view is not None and now - self._checked_at < REFRESH_SECONDS:
+            return True
+        self._checked_at = now
+        try:
+            mtime = os.stat(self._path(META_FILE)).st_mtime_ns
+        except OSError:
+            return False
+        if force or mtime != self._meta_mtime:
+            with self._lock:
+                self._open()
+                self._meta_mtime = mtime
+        return True
+
+    def _open(self):
+        with open(self._path(META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        count, dim = meta['count'], meta['dim']
+        arrays = {}
+        if count:
+            # Files may hold rows past `count` from an interrupted add; they are ignored
+            arrays['vectors'] = np.memmap(self._path(VECTORS_FILE), dtype=DTYPES[meta['dtype']], mode='r',
+                                          shape=(count, dim))
+            for key, (name, dtype) in ROW_FILES.items():
+                if key == 'scales' and meta['dtype'] != 'int8':
+                    continue
+                arrays[key] = np.memmap(self._path(name), dtype=dtype, mode='r', shape=(count,))
+        centroids = None
+        if meta.get('nlist'):
+            centroids = np.load(self._path(CENTROIDS_FILE))
+
+        inverted = None
+        if centroids is not None and count:
+            # Inverted lists: row ids grouped by list, plus where each list starts
+            order = np.argsort(arrays['lists'], kind='stable')
+            bounds = np.searchsorted(arrays['lists'][order], np.arange(len(centroids) + 1))
+            inverted = (order, bounds)
+
+        self._view = {'meta': meta, 'arrays': arrays, 'centroids': centroids, 'inverted': inverted}
+
+    @property
+    def meta(self):
+        return self._view['meta'] if self._view else None
+
+    @property
+    def count(self):
+        return self._view['meta']['count'] if self._view else 0
+
+    def contains_digest(self, digest):
+        """True if an image with this content hash is already indexed"""
+        if not self.refresh() or not self.count:
+            return False
+        view = self._view
+        if 'digest_set' not in view:
+            view['digest_set'] = set(np.asarray(view['arrays']['digests']).tolist())
+        return digest_to_int(digest) in view['digest_set']
+
+    def built_with(self, model_sha256=None, model_version=None):
+        """
+        False if the index records a different model than the one given
+
+        Embeddings from different models are not comparable. The model file's
+        content hash decides; indexes without one compare model_version, minus
+        the registry label
+        """
+        meta = self.meta or {}
+        if meta.get('model_sha256') and model_sha256:
+            return meta['model_sha256'] == model_sha256
+        recorded = meta.get('model_version')
+        if not recorded or not model_version:
+            return True
+        return recorded.split('/')[-1] == model_version.split('/')[-1]
+
+    @staticmethod
+    def _rows_as_float(view, ids):
+        """Stored rows (ids: slice or sorted index array) as float32 unit vectors"""
+        rows = np.asarray(view['arrays']['vectors'][ids], dtype=np.float32)
+        if view['meta']['dtype'] == 'int8':
+            rows *= view['arrays']['scales'][ids][:, None]
+        return rows
+
+    @staticmethod
+    def _scores(view, ids, query):
+        """Cosine similarity of the query with the given rows"""
+        scores = np.asarray(view['arrays']['vectors'][ids], dtype=np.float32) @ query
+        if view['meta']['dtype'] == 'int8':
+            # Scaling the dot products per row avoids rescaling every stored component
+            scores *= view['arrays']['scales'][ids]
+        return scores
+
+    def search(self, embedding, k=10, nprobe=DEFAULT_NPROBE, label=None, min_similarity=None):
+        """
+        Nearest stored images by cosine similarity
+
+        Args:
+            embedding (np.ndarray): Query embedding of shape (D,)
+            k (int): Results to return
+            nprobe (int): Inverted lists to scan once trained (more = slower, more exact)
+            label (str): Only return images with this predicted/confirmed label
+            min_similarity (float): Drop results below this similarity
+
+        Returns:
+            list: Metadata dicts with 'id' and 'similarity', most similar first
+        """
+        if not self.refresh() or not self.count:
+            return []
+        view = self._view
+        meta, arrays = view['meta'], view['arrays']
+        if len(embedding) != meta['dim']:
+            raise ValueError(f"Embedding has {len(embedding)} dimensions, the index {meta['dim']}")
+        query = normalize_rows(embedding)[0]
+
+        label_id = None
+        if label is not None:
+            if label not in meta['labels']:
+                return []
+            label_id = meta['labels'].index(label)
+
+        count = meta['count']
+        centroids = view['centroids']
+        if view['inverted'] is not None and nprobe < len(centroids):
+            order, bounds = view['inverted']
+            probe = np.argpartition(centroids @ query, -nprobe)[-nprobe:]
+            ids = np.sort(np.concatenate([order[bounds[l]:bounds[l + 1]] for l in probe]))
+            if label_id is not None:
+                ids = ids[arrays['labels'][ids] == label_id]
+            scores = self._scores(view, ids, query) if len(ids) else np.empty(0, dtype=np.float32)
+        else:
+            ids = np.arange(count)
+            scores = np.empty(count, dtype=np.float32)
+            for start in range(0, count, SCAN_CHUNK):
+                window = slice(start, min(start + SCAN_CHUNK, count))
+                scores[window] = self._scores(view, window, query)
+            if label_id is not None:
+                keep = np.asarray(arrays['labels']) == label_id
+                ids, scores = ids[keep], scores[keep]
+
+        if min_similarity is not None:
+            keep = scores >= min_similarity
+            ids, scores = ids[keep], scores[keep]
+        if not len(ids):
+            return []
+        k = min(k, len(ids))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [dict(self.metadata(int(ids[i]), view), id=int(ids[i]), similarity=round(min(float(scores[i]), 1.0), 4))
+                for i in top]
+
+    def metadata(self, row_id, view=None):
+        """Stored metadata of one row"""
+        view = view or self._view
+        with open(self._path(METADATA_FILE), 'rb') as f:
+            f.seek(int(view['arrays']['offsets'][row_id]))
+            return json.loads(f.readline())
+
+    def stats(self):
+        if not self.refresh():
+            return {'enabled': True, 'count': 0}
+        size = sum(os.path.getsize(self._path(name)) for name in os.listdir(self.directory)
+                   if os.path.isfile(self._path(name)))
+        return {
+            'enabled': True,
+            'count': self.count,
+            'dim': self.meta['dim'],
+            'dtype': self.meta['dtype'],
+            'lists': self.meta.get('nlist') or 0,
+            'trained_count': self.meta.get('trained_count') or 0,
+            'model_version': self.meta.get('model_version'),
+            'model_sha256': self.meta.get('model_sha256'),
+            'bytes': size,
+            'updated_at': self.meta.get('updated_at')
+        }
+
+    # Writing (one writer at a time, guarded by a file lock)
+
+    def _write_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        handle = open(self._path(LOCK_FILE), 'w')
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def _write_meta(self, meta):
+        meta['updated_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        temp_path = f"{self._path(META_FILE)}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(temp_path, self._path(META_FILE))
+
+    def _append(self, name, data, committed_bytes):
+        with open(self._path(name), 'ab') as f:
+            # Drop rows an interrupted add wrote past the committed count
+            if f.tell() != committed_bytes:
+                f.truncate(committed_bytes)
+            f.write(np.ascontiguousarray(data).tobytes())
+
+    def add(self, embeddings, metadata, digests=None, model_version=None, model_sha256=None):
+        """
+        Append images to the index
+
+        Args:
+            embeddings (np.ndarray): (N, D) penultimate-layer embeddings
+            metadata (list): N JSON-serializable dicts; 'label' (predicted or
+                confirmed disease) is also stored for filtering
+            digests (list): Optional N content hashes; images already in the
+                index (or repeated in this call) are skipped
+            model_version (str): Model that produced the embeddings
+            model_sha256 (str): Content hash of that model file; an index
+                built with another model refuses the rows
+
+        Returns:
+            int: Rows added
+        """
+        vectors = normalize_rows(embeddings)
+        if len(vectors) != len(metadata):
+            raise ValueError("Need one metadata entry per embedding")
+        digests = [digest_to_int(d) for d in digests] if digests is not None else [0] * len(vectors)
+
+        handle = self._write_lock()
+        try:
+            if self.exists():
+                self.refresh(force=True)
+                view = self._view
+            else:
+                view = {'meta': {'version': 1, 'count': 0, 'dim': vectors.shape[1], 'dtype': self.default_dtype,
+                                 'labels': [], 'nlist': 0, 'trained_count': 0,
+                                 'created_at': time.strftime('%Y-%m-%d %H:%M:%S')},
+                        'arrays': {}, 'centroids': None}
+            meta = dict(view['meta'])
+            count = meta['count']
+            if vectors.shape[1] != meta['dim']:
+                raise ValueError(f"Embeddings have {vectors.shape[1]} dimensions, the index {meta['dim']}")
+            if count and not self.built_with(model_sha256, model_version):
+                raise ValueError(f"The index was built with model {meta.get('model_version')}; "
+                                 f"use a new directory for {model_version}")
+
+            # Exact duplicates (same file content) are stored once
+            seen = set(np.asarray(view['arrays']['digests']).tolist()) if count else set()
+            keep = []
+            for row, digest in enumerate(digests):
+                if digest and digest in seen:
+                    continue
+                seen.add(digest)
+                keep.append(row)
+            if not keep:
+                return 0
+            vectors = vectors[keep]
+            metadata = [metadata[row] for row in keep]
+            digests = np.asarray([digests[row] for row in keep], dtype=np.uint64)
+
+            labels = meta['labels'] = list(meta['labels'])
+            label_ids = []
+            for entry in metadata:
+                label = entry.get('label')
+                if label is not None and label not in labels:
+                    labels.append(label)
+                label_ids.append(labels.index(label) if label is not None else -1)
+
+            if meta['dtype'] == 'int8':
+                scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+                rows = np.rint(vectors / scales[:, None]).astype(np.int8)
+            else:
+                rows = vectors.astype(np.float16)
+            lists = np.full(len(rows), -1, dtype=np.int32)
+            if meta.get('nlist'):
+                lists = np.argmax(vectors @ view['centroids'].T, axis=1).astype(np.int32)
+
+            metadata_path = self._path(METADATA_FILE)
+            committed = int(view['arrays']['offsets'][-1]) if count else 0
+            if count:
+                with open(metadata_path, 'rb') as f:
+                    f.seek(committed)
+                    committed += len(f.readline())
+            offsets = []
+            lines = []
+            position = committed
+            added_at = time.strftime('%Y-%m-%d %H:%M:%S')
+            for entry in metadata:
+                line = (json.dumps(dict(entry, added_at=entry.get('added_at', added_at))) + '\n').encode('utf-8')
+                offsets.append(position)
+                position += len(line)
+                lines.append(line)
+
+            row_bytes = meta['dim'] * np.dtype(DTYPES[meta['dtype']]).itemsize
+            self._append(VECTORS_FILE, rows, count * row_bytes)
+            if meta['dtype'] == 'int8':
+                self._append(ROW_FILES['scales'][0], scales.astype(np.float32), count * 4)
+            self._append(ROW_FILES['labels'][0], np.asarray(label_ids, dtype=np.int16), count * 2)
+            self._append(ROW_FILES['digests'][0], digests, count * 8)
+            self._append(ROW_FILES['lists'][0], lists, count * 4)
+            self._append(ROW_FILES['offsets'][0], np.asarray(offsets, dtype=np.uint64), count * 8)
+            with open(metadata_path, 'ab') as f:
+                if f.tell() != committed:
+                    f.truncate(committed)
+                f.write(b''.join(lines))
+
+            # The count is what commits the rows
+            meta['count'] = count + len(rows)
+            if model_version:
+                meta['model_version'] = model_version
+            if model_sha256:
+                meta['model_sha256'] = model_sha256
+            self._write_meta(meta)
+            self.refresh(force=True)
+            return len(rows)
+        finally:
+            handle.close()
+
+    def needs_training(self):
+        """Large enough for inverted lists and untrained, or grown a lot since training"""
+        if not self.refresh() or self.count < TRAIN_MIN_VECTORS:
+            return False
+        trained = self.meta.get('trained_count') or 0
+        return trained == 0 or self.count >= trained * RETRAIN_GROWTH
+
+    def train(self, nlist=None, sample_size=None, iterations=10, seed=0):
+        """
+        Cluster the vectors (spherical k-means) and assign every row to a list
+
+        Args:
+            nlist (int): Number of lists (default: sqrt(count))
+            sample_size (int): Rows used to fit the centroids (default: 64 per list)
+            iterations (int): k-means iterations
+
+        Returns:
+            int: Number of lists
+        """
+        handle = self._write_lock()
+        try:
+            if not self.refresh(force=True) or not self.count:
+                raise ValueError("Index is empty")
+            view = self._view
+            count = view['meta']['count']
+            nlist = max(1, min(int(nlist or math.sqrt(count)), count))
+            sample_size = min(count, int(sample_size or nlist * 64))
+            rng = np.random.default_rng(seed)
+
+            sample = self._rows_as_float(view, np.sort(rng.choice(count, sample_size, replace=False)))
+            centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, sample)
+                sizes = np.bincount(assignment, minlength=nlist)
+                empty = sizes == 0
+                # Re-seed empty lists with random sample rows
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+                centroids = normalize_rows(sums)
+
+            lists = np.empty(count, dtype=np.int32)
+            for start in range(0, count, SCAN_CHUNK):
+                window = slice(start, min(start + SCAN_CHUNK, count))
+                lists[window] = np.argmax(self._rows_as_float(view, window) @ centroids.T, axis=1)
+
+            # New files are renamed into place; readers keep their old maps until they refresh
+            for name, data in ((ROW_FILES['lists'][0], lists), (CENTROIDS_FILE, centroids)):
+                temp_path = f"{self._path(name)}.{os.getpid()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    if name == CENTROIDS_FILE:
+                        np.save(f, centroids.astype(np.float32))
+                    else:
+                        f.write(data.tobytes())
+                os.replace(temp_path, self._path(name))
+
+            meta = dict(view['meta'], nlist=nlist, trained_count=count)
+            self._write_meta(meta)
+            self.refresh(force=True)
+            return nlist
+        finally:
+            handle.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect, train and query the similar-case index')
+    parser.add_argument('--index', default=os.environ.get('VECTOR_INDEX_DIR') or 'vector_index',
+                        help='Index directory (default: $VECTOR_INDEX_DIR or vector_index)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('stats', help='Size and training state')
+
+    train_parser = subparsers.add_parser('train', help='Build the inverted lists for fast search')
+    train_parser.add_argument('--lists', type=int, help='Number of lists (default: sqrt(count))')
+    train_parser.add_argument('--iterations', type=int, default=10)
+
+    search_parser = subparsers.add_parser('search', help='Images most similar to a photo')
+    search_parser.add_argument('image')
+    search_parser.add_argument('-k', type=int, default=10)
+    search_parser.add_argument('--label', help='Only images with this disease label')
+    search_parser.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE)
+    search_parser.add_argument('--model', default='results/model.hdf5', help='Model that built the index')
+
+    args = parser.parse_args()
+    index = VectorIndex(args.index)
+    if not index.exists():
+        print(f"No index at {args.index}; build one with: "
+              f"python predict_paddy_disease.py <folder> --batch --index {args.index}")
+        sys.exit(1)
+
+    if args.command == 'stats':
+        for key, value in index.stats().items():
+            print(f"{key + ':':<16}{value}")
+        return
+
+    if args.command == 'train':
+        start = time.perf_counter()
+        nlist = index.train(args.lists, iterations=args.iterations)
+        print(f"Trained {nlist} lists over {index.count} images in {time.perf_counter() - start:.1f}s")
+        return
+
+    from predict_paddy_disease import PaddyDiseasePredictor
+
+    predictor = PaddyDiseasePredictor(args.model, embeddings=True)
+    if not predictor.load_model():
+        sys.exit(1)
+    image_batch = predictor.preprocess_image(args.image)
+    if image_batch is None:
+        sys.exit(1)
+    probabilities, embeddings = predictor.predict_with_embeddings(image_batch)
+    results = predictor.format_results(probabilities[0], args.image, top_k=1)
+    print(f"{args.image}: {results['top_prediction']} ({results['confidence']:.2%})")
+    if index.refresh() and not index.built_with(predictor.model_sha256, predictor.model_version):
+        print(f"Warning: the index was built with model {index.meta.get('model_version')}, "
+              f"not {predictor.model_version}; similarities are not meaningful")
+
+    start = time.perf_counter()
+    matches = index.search(embeddings[0], k=args.k, nprobe=args.nprobe, label=args.label)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for match in matches:
+        print(f"  {match['similarity']:.4f}  {match.get('label', '-'):<26}{match.get('image', '')}")
+    print(f"{len(matches)} matches from {index.count} images in {elapsed_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()